@@ -46,6 +46,7 @@ public class RobotWorld : MonoBehaviour
     {
         public string decision;
         public Target target;
+        public List<Target> waypoints; // camino planeado en Python, el primero es el siguiente punto
 
     }
 
@@ -131,6 +132,16 @@ public class RobotWorld : MonoBehaviour
         yield return new WaitForSeconds(3f); // Aumentado desde 1f a 3f
         }
     }
+    Target NextWaypoint(Decision decision)
+    {
+        // Sin waypoints (controlador viejo) se va directo al target
+        if (decision.waypoints != null && decision.waypoints.Count > 0)
+        {
+            return decision.waypoints[0];
+        }
+        return decision.target;
+    }
+
     void ExecuteDecisions(List<Decision> decisions)
     {
         for (int i = 0; i < decisions.Count && i < robots.Count; i++)
@@ -143,14 +154,12 @@ public class RobotWorld : MonoBehaviour
                 case "explore":
                     robot.Explore();
                     break;
+                case "explore_waypoint":
                 case "move_to_target":
-                    if (decision.target != null)
+                    Target next = NextWaypoint(decision);
+                    if (next != null)
                     {
-                        Vector3 targetPosition = new Vector3(
-                            decision.target.x,
-                            decision.target.y,
-                            decision.target.z
-                        );
+                        Vector3 targetPosition = new Vector3(next.x, next.y, next.z);
                         robot.MoveToTarget(targetPosition);
                     }
                     break;
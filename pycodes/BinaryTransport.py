@@ -0,0 +1,77 @@
+import numpy as np
+from flask import Response
+#this code is called BinaryTransport.py and is in the folder pycodes
+#it lets the flask simulation servers exchange agent arrays with unity as raw little-endian buffers
+#instead of python literal strings, json stays as the default when the client does not ask for binary
+
+BINARY_MIMETYPE = 'application/octet-stream'
+
+# Acciones de Controller.py en formato columnar (un registro por acción)
+ACTION_TYPES = {'move': 0, 'pick': 1, 'drop': 2}
+ACTION_DTYPE = np.dtype([
+    ('type', '<u1'),
+    ('agent_id', '<i4'),
+    ('cube_id', '<i4'),
+    ('target', '<f4', (3,))
+])
+
+# Cubos de Controller.py para /setup
+CUBE_DTYPE = np.dtype([
+    ('id', '<i4'),
+    ('position', '<f4', (3,)),
+    ('being_carried', '<u1')
+])
+
+
+def is_binary_request(request):
+    """El cliente mandó el cuerpo como buffer binario"""
+    return request.mimetype == BINARY_MIMETYPE
+
+
+def wants_binary(request):
+    """El cliente acepta (o mandó) binario; JSON sigue siendo el formato por defecto"""
+    if is_binary_request(request):
+        return True
+    return request.accept_mimetypes.best_match(['application/json', BINARY_MIMETYPE]) == BINARY_MIMETYPE
+
+
+def read_array(request, dtype, columns=None):
+    """
+    Lee el cuerpo del request como un array little-endian sin copiarlo.
+    El array resultante es de solo lectura.
+    """
+    data = request.get_data(cache=False)
+    dtype = np.dtype(dtype)
+    if len(data) % dtype.itemsize:
+        raise ValueError(f"Body size {len(data)} is not a multiple of {dtype.itemsize} bytes")
+    array = np.frombuffer(data, dtype=dtype)
+    if columns is not None:
+        if len(array) % columns:
+            raise ValueError(f"Body has {len(array)} values, not a multiple of {columns}")
+        array = array.reshape(-1, columns)
+    return array
+
+
+def array_response(array, dtype):
+    """Responde con el array como buffer little-endian"""
+    body = np.ascontiguousarray(array, dtype=np.dtype(dtype)).tobytes()
+    return Response(body, mimetype=BINARY_MIMETYPE)
+
+
+def encode_actions(actions):
+    """Convierte la lista de acciones de Controller.py (dicts) a registros ACTION_DTYPE"""
+    records = np.zeros(len(actions), dtype=ACTION_DTYPE)
+    for i, action in enumerate(actions):
+        records[i]['type'] = ACTION_TYPES[action['type']]
+        records[i]['agent_id'] = action['agent_id']
+        records[i]['cube_id'] = action.get('cube_id', -1)
+        if action.get('target') is not None:
+            records[i]['target'] = action['target']
+    return records
+
+
+def encode_cubes(cubes):
+    records = np.zeros(len(cubes), dtype=CUBE_DTYPE)
+    for i, cube in enumerate(cubes):
+        records[i] = (cube['id'], cube['position'], cube['being_carried'])
+    return records
@@ -1,111 +1,186 @@
 import torch
 import cv2
 import numpy as np
+import pandas as pd
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image
 import matplotlib.pyplot as plt
 
-def preprocess_and_test(image_path):
-    """
-    Prueba múltiples preprocesamientos de la imagen con configuración mejorada
-    """
-    # Cargar el modelo con configuración modificada
-    model = torch.hub.load('ultralytics/yolov5', 'yolov5s')
-    
-    # Expandir clases relevantes para incluir más objetos similares
-    relevant_classes = [39, 41, 44, 75]  # bottle, cup, bowl, vase
-    
-    # Ajustar la confianza mínima
-    model.conf = 0.25  # Reducir el umbral de confianza
-    
-    # Leer la imagen original
-    img_original = cv2.imread(image_path)
-    img_rgb = cv2.cvtColor(img_original, cv2.COLOR_BGR2RGB)
-    
-    # Crear visualización de debug
-    plt.figure(figsize=(20, 15))
-    
-    # Preparar diferentes versiones de la imagen
-    preprocessed_images = {
+# Expandir clases relevantes para incluir más objetos similares
+RELEVANT_CLASSES = [39, 41, 44, 75]  # bottle, cup, bowl, vase
+SCALES = [1.0, 1.5, 0.75]  # Probar diferentes escalas
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+
+def preprocess_variants(img_rgb):
+    """Diferentes versiones de la imagen (RGB, uint8)"""
+    variants = {
         'Original': img_rgb,
         'Contraste': cv2.convertScaleAbs(img_rgb, alpha=1.8, beta=10),  # Aumentado contraste
         'Histograma': cv2.cvtColor(
             cv2.equalizeHist(cv2.cvtColor(img_rgb, cv2.COLOR_RGB2GRAY)),
             cv2.COLOR_GRAY2RGB
         ),
-        'Gamma': np.power(img_rgb/255.0, 1.8).clip(0, 1) * 255.0,  # Gamma más alto
+        'Gamma': (np.power(img_rgb/255.0, 1.8).clip(0, 1) * 255.0).astype(np.uint8),  # Gamma más alto
         'Sharpen': cv2.filter2D(img_rgb, -1, np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])),
         'Red Enhanced': img_rgb.copy()
     }
-    
+
     # Mejorar canal rojo para Coca-Cola
-    preprocessed_images['Red Enhanced'][:,:,0] = cv2.convertScaleAbs(
-        preprocessed_images['Red Enhanced'][:,:,0], 
-        alpha=1.5, 
+    variants['Red Enhanced'][:,:,0] = cv2.convertScaleAbs(
+        variants['Red Enhanced'][:,:,0],
+        alpha=1.5,
         beta=10
     )
-    
+    return variants
+
+
+def prepare_image(image_path, scales=SCALES):
+    """
+    Corre en el pool de procesos: lee la imagen y genera todas las
+    combinaciones (versión, escala). Devuelve [(image_path, version, scale, img)].
+    """
+    img_original = cv2.imread(image_path)
+    if img_original is None:
+        return []
+    img_rgb = cv2.cvtColor(img_original, cv2.COLOR_BGR2RGB)
+
+    prepared = []
+    for version_name, img in preprocess_variants(img_rgb).items():
+        for scale in scales:
+            if scale != 1.0:
+                height, width = img.shape[:2]
+                new_height, new_width = int(height * scale), int(width * scale)
+                scaled_img = cv2.resize(img, (new_width, new_height))
+            else:
+                scaled_img = img
+            prepared.append((image_path, version_name, scale, scaled_img))
+    return prepared
+
+
+def load_model(conf=0.25, classes=RELEVANT_CLASSES):
+    model = torch.hub.load('ultralytics/yolov5', 'yolov5s')
+    model.conf = conf  # Reducir el umbral de confianza
+    # Una sola inferencia por imagen con todas las clases; se separan después
+    model.classes = list(classes)
+    return model
+
+
+def sweep(image_paths, model, classes=RELEVANT_CLASSES, scales=SCALES, batch_size=16,
+          workers=None, save_images=False):
+    """
+    Corre todas las combinaciones (imagen, versión, escala) por el modelo.
+
+    El preprocesamiento se hace en un pool de procesos y las imágenes se
+    mandan al modelo en batches de batch_size, una sola vez con todas las
+    clases. Devuelve un DataFrame con una fila por (imagen, versión, escala,
+    clase) con el número de detecciones y la confianza máxima.
+    """
+    rows = []
+    detections_by_key = {}
+    batch = []
+
+    def run_batch():
+        results = model([item[3] for item in batch])
+        if save_images:
+            results.render()
+        batch_detections = results.pandas().xyxy
+        for i, (image_path, version_name, scale, _) in enumerate(batch):
+            detections = batch_detections[i]
+            detections_by_key[(image_path, version_name, scale)] = detections
+            for class_id in classes:
+                class_detections = detections[detections['class'] == class_id]
+                rows.append({
+                    'image': os.path.basename(image_path),
+                    'version': version_name,
+                    'scale': scale,
+                    'class': class_id,
+                    'detections': len(class_detections),
+                    'max_conf': float(class_detections['confidence'].max()) if len(class_detections) else 0.0
+                })
+            if save_images and not detections.empty:
+                name = os.path.splitext(os.path.basename(image_path))[0]
+                output_path = f'detection_{name}_{version_name}_scale{scale}.png'
+                Image.fromarray(results.ims[i]).save(output_path)
+        batch.clear()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for prepared in executor.map(prepare_image, image_paths, [scales] * len(image_paths)):
+            for item in prepared:
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    run_batch()
+    if batch:
+        run_batch()
+
+    return pd.DataFrame(rows), detections_by_key
+
+
+def summary_table(results):
+    """Resumen por (versión, escala): en cuántas imágenes detectó algo y con qué confianza"""
+    per_image = results.groupby(['version', 'scale', 'image'])['max_conf'].max().reset_index()
+    summary = per_image.groupby(['version', 'scale']).agg(
+        images=('image', 'count'),
+        detected=('max_conf', lambda conf: int((conf > 0).sum())),
+        mean_best_conf=('max_conf', 'mean'),
+        max_conf=('max_conf', 'max')
+    )
+    summary['detection_rate'] = summary['detected'] / summary['images']
+    return summary.sort_values(['detection_rate', 'mean_best_conf'], ascending=False)
+
+
+def find_images(path):
+    if os.path.isdir(path):
+        return sorted(
+            os.path.join(path, name) for name in os.listdir(path)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+    return [path]
+
+
+def preprocess_and_test(image_path):
+    """
+    Prueba múltiples preprocesamientos de la imagen con configuración mejorada
+    """
+    model = load_model()
+
+    # Leer la imagen original
+    img_original = cv2.imread(image_path)
+    img_rgb = cv2.cvtColor(img_original, cv2.COLOR_BGR2RGB)
+
+    # Crear visualización de debug
+    plt.figure(figsize=(20, 15))
+
     # Mostrar todas las versiones
-    for idx, (name, img) in enumerate(preprocessed_images.items(), 1):
+    for idx, (name, img) in enumerate(preprocess_variants(img_rgb).items(), 1):
         plt.subplot(2, 3, idx)
         plt.imshow(img.astype(np.uint8))
         plt.title(name)
-    
+
     # Guardar visualización
     plt.savefig('preprocessing_debug.png')
     plt.close()
-    
-    best_confidence = 0
-    best_detection = None
-    best_version = None
-    
+
     print("\nProbando diferentes preprocesamientos:")
     print("-" * 50)
-    
-    for version_name, img in preprocessed_images.items():
-        print(f"\nProbando versión: {version_name}")
-        
-        # Normalizar imagen
-        img = img.astype(np.uint8)
-        
-        # Probar detección con diferentes tamaños
-        scales = [1.0, 1.5, 0.75]  # Probar diferentes escalas
-        for scale in scales:
-            if scale != 1.0:
-                height, width = img.shape[:2]
-                new_height, new_width = int(height * scale), int(width * scale)
-                scaled_img = cv2.resize(img, (new_width, new_height))
-            else:
-                scaled_img = img
-                
-            # Probar con diferentes clases
-            for class_id in relevant_classes:
-                model.classes = [class_id]
-                results = model(scaled_img)
-                detections = results.pandas().xyxy[0]
-                
-                if not detections.empty:
-                    max_conf = detections['confidence'].max()
-                    if max_conf > best_confidence:
-                        best_confidence = max_conf
-                        best_detection = detections
-                        best_version = f"{version_name} (scale: {scale})"
-                    
-                    print(f"Clase {class_id} - Escala {scale} - Detecciones:")
-                    print(detections)
-                    
-                    # Guardar imagen con detecciones
-                    results.render()
-                    output_path = f'detection_{version_name}_class{class_id}_scale{scale}.png'
-                    Image.fromarray(results.ims[0]).save(output_path)
-    
-    if best_detection is not None:
+
+    results, detections_by_key = sweep([image_path], model, save_images=True)
+    found = results[results['detections'] > 0]
+    for row in found.to_dict('records'):
+        print(f"{row['version']} - Clase {row['class']} - Escala {row['scale']} - "
+              f"{row['detections']} detecciones (max {row['max_conf']:.3f})")
+
+    if not found.empty:
+        best = found.loc[found['max_conf'].idxmax()]
         print("\nMejor detección encontrada:")
-        print(f"Versión: {best_version}")
-        print(f"Confianza: {best_confidence}")
-        print(best_detection)
+        print(f"Versión: {best['version']} (scale: {best['scale']})")
+        print(f"Confianza: {best['max_conf']}")
+        print(detections_by_key[(image_path, best['version'], best['scale'])])
     else:
         print("\nNo se encontraron detecciones en ninguna versión")
-        
+
         # Análisis detallado de la imagen
         print("\nAnálisis de la imagen:")
         print("1. Dimensiones:", img_rgb.shape)
@@ -117,9 +192,26 @@ def preprocess_and_test(image_path):
             print(f"      mean={values.mean():.2f}, std={values.std():.2f}")
             print(f"      median={np.median(values):.2f}")
 
+
+def sweep_directory(path, batch_size=16, workers=None):
+    """Barrido sobre todas las imágenes de una carpeta, imprime la tabla resumen"""
+    image_paths = find_images(path)
+    print(f"Barrido sobre {len(image_paths)} imágenes")
+    model = load_model()
+    results, _ = sweep(image_paths, model, batch_size=batch_size, workers=workers)
+    results.to_csv('sweep_results.csv', index=False)
+    summary = summary_table(results)
+    print(summary.to_string(float_format=lambda v: f"{v:.3f}"))
+    return summary
+
+
 def main():
-    image_path = 'vision_debug/agent0_detection_20241114_161634_025906.png'
-    preprocess_and_test(image_path)
+    # python CamTry.py [imagen o carpeta]
+    path = sys.argv[1] if len(sys.argv) > 1 else 'vision_debug/agent0_detection_20241114_161634_025906.png'
+    if os.path.isdir(path):
+        sweep_directory(path)
+    else:
+        preprocess_and_test(path)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
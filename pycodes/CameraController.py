@@ -9,93 +9,169 @@ import json
 from ultralytics import YOLO
 import torch
 import warnings
+from PreviewServer import PreviewServer
+from FrameDecoder import FrameDecoder
+from ModelServer import ModelClient
+from TrackingEngine import MultiStreamTracker
+from ServiceLogging import setup_logging, log_event
+from ServiceMetrics import counter, histogram, start_metrics_server
+from ServiceProfiler import timed, enable_profiling
 warnings.filterwarnings("ignore", category=FutureWarning)
 
-logging.basicConfig(level=logging.DEBUG)
+# Un log por datagrama es demasiado: se deja pasar 1 de cada 100 y los envíos se limitan por segundo
+setup_logging(
+    level=logging.DEBUG,
+    sample={'datagram': 100},
+    rates={'human_detection_sent': 2},
+    config_file='logging_config.json'
+)
 logger = logging.getLogger(__name__)
 
+FRAMES_RECEIVED = counter('drone_camera_frames_received_total', 'Datagrams received per drone', ['agent'])
+FRAMES_DECODED = counter('drone_camera_frames_decoded_total', 'Frames decoded per drone', ['agent'])
+FRAMES_DROPPED = counter('drone_camera_frames_dropped_total', 'Datagrams dropped per drone', ['agent', 'reason'])
+INFERENCE_SECONDS = histogram('drone_camera_inference_seconds', 'Detector time per frame', ['agent'])
+DETECTIONS_SENT = counter('drone_camera_human_detections_sent_total', 'Human detections sent to the controller')
+SEND_ERRORS = counter('drone_camera_send_errors_total', 'Errors sending human detections to the controller')
+
 class AgentVisionReceiver:
-    def __init__(self, num_agents=1, base_port=5123, conf_threshold=0.5, model_type='yolov8n'):
+    def __init__(self, num_agents=1, base_port=5123, conf_threshold=0.5, model_type='yolov8n',
+                 show_window=True, preview_port=None, preview_fps=10, model_server=None, metrics_port=None):
         self.num_agents = num_agents
         self.base_port = base_port
         self.running = True
         self.frame_buffer = {}
         self.lock = threading.Lock()
         self.conf_threshold = conf_threshold
+        self.show_window = show_window
+        
+        # Metrics at http://127.0.0.1:<metrics_port>/metrics
+        if metrics_port is not None:
+            start_metrics_server(metrics_port)
         
-        # Load YOLOv8 model
+        # Remote MJPEG preview, only encodes while someone is watching
+        self.preview = None
+        if preview_port is not None:
+            self.preview = PreviewServer(port=preview_port, max_fps=preview_fps,
+                                         cols=min(3, num_agents), cell_size=(320, 240))
+        
+        # Load YOLOv8 model, or share the one loaded by ModelServer.py
+        self.model = None
+        self.model_client = None
         logger.info(f"Loading {model_type} model...")
         try:
-            self.model = YOLO(f'{model_type}.pt')
-            self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-            self.model.to(self.device)
-            logger.info(f"Model loaded successfully on {self.device}")
+            if model_server is not None:
+                self.model_client = ModelClient('drone_cameras', address=model_server,
+                                                model=model_type, priority=1, quota=num_agents)
+            else:
+                self.model = YOLO(f'{model_type}.pt')
+                self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+                self.model.to(self.device)
+                logger.info(f"Model loaded successfully on {self.device}")
         except Exception as e:
             logger.error(f"Error loading model: {e}")
             raise
             
-        # Initialize tracking dictionary
-        self.trackers = {}
+        # The model is shared by all receiver threads and is not thread-safe
+        self.model_lock = threading.Lock()
+        
+        # Tracker state is kept per drone so ids do not jump between feeds
+        self.tracker = MultiStreamTracker(iou_threshold=0.3, high_conf=conf_threshold, max_age=1.0)
         
         # Add socket for human detections
         self.human_detection_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.controller_address = ('localhost', 5557)
         
+    def _send_human_detection(self, agent_id, box, confidence, frame_shape):
+        x1, y1, x2, y2 = box
+        center_x = (x1 + x2) / 2 / frame_shape[1]
+        center_y = (y1 + y2) / 2 / frame_shape[0]
+        
+        detection_data = {
+            'type': 'human',
+            'agent_id': agent_id,
+            'confidence': float(confidence),
+            'position': {
+                'x': float(center_x),
+                'y': float(center_y)
+            },
+            'timestamp': time.time()
+        }
+        
+        try:
+            self.human_detection_socket.sendto(
+                json.dumps(detection_data).encode(),
+                self.controller_address
+            )
+            DETECTIONS_SENT.inc()
+            log_event(logger, logging.INFO, 'human_detection_sent', agent=agent_id, confidence=round(float(confidence), 3))
+        except Exception as e:
+            SEND_ERRORS.inc()
+            logger.error(f"Error sending human detection: {e}")
+    
+    def _detect(self, frame):
+        """
+        Runs the detector, locally or on the shared ModelServer.
+        Returns (boxes, confidences, classes, annotated_frame, elapsed_ms) or None.
+        """
+        if self.model_client:
+            started = time.time()
+            detections = self.model_client.predict(frame, conf=self.conf_threshold)
+            if detections is None:
+                return None
+            
+            annotated_frame = frame.copy()
+            for box, confidence, cls in zip(*detections):
+                x1, y1, x2, y2 = box.astype(int)
+                cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+                label = f"{self.model_client.names.get(int(cls), int(cls))} {confidence:.2f}"
+                cv2.putText(annotated_frame, label, (x1, y1 - 10),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+            elapsed_ms = (time.time() - started) * 1000
+            return detections.boxes, detections.confidences, detections.classes, annotated_frame, elapsed_ms
+        
+        with self.model_lock:
+            results = self.model.predict(frame, conf=self.conf_threshold, verbose=False)
+        
+        if not results:
+            return None
+        result = results[0]
+        return (
+            result.boxes.xyxy.cpu().numpy(),
+            result.boxes.conf.cpu().numpy(),
+            result.boxes.cls.cpu().numpy().astype(int),
+            result.plot(),
+            result.speed['inference'] + result.speed['preprocess']
+        )
+    
+    @timed('drone_camera.process_frame')
     def process_frame_yolo(self, frame, agent_id):
         try:
-            results = self.model.track(frame, persist=True, conf=self.conf_threshold, tracker="bytetrack.yaml")
+            with INFERENCE_SECONDS.labels(agent_id).time():
+                detections = self._detect(frame)
+            if detections is None:
+                return frame
+            boxes, confidences, classes, annotated_frame, elapsed_ms = detections
             
-            if results and len(results) > 0:
-                result = results[0]
-                annotated_frame = result.plot()
-                
-                # Process human detections
-                if hasattr(result, 'boxes'):
-                    for i, (box, cls) in enumerate(zip(result.boxes.xyxy, result.boxes.cls)):
-                        if int(cls) == 0:  # Person class
-                            confidence = float(result.boxes.conf[i])
-                            if confidence >= self.conf_threshold:
-                                x1, y1, x2, y2 = box.cpu().numpy()
-                                center_x = (x1 + x2) / 2 / frame.shape[1]
-                                center_y = (y1 + y2) / 2 / frame.shape[0]
-                                
-                                detection_data = {
-                                    'type': 'human',
-                                    'agent_id': agent_id,
-                                    'confidence': float(confidence),
-                                    'position': {
-                                        'x': float(center_x),
-                                        'y': float(center_y)
-                                    },
-                                    'timestamp': time.time()
-                                }
-                                
-                                try:
-                                    self.human_detection_socket.sendto(
-                                        json.dumps(detection_data).encode(),
-                                        self.controller_address
-                                    )
-                                    logger.info(f"Human detection sent for dron {agent_id}")
-                                except Exception as e:
-                                    logger.error(f"Error sending human detection: {e}")
-                
-                if hasattr(result, 'boxes') and result.boxes.id is not None:
-                    tracks = result.boxes.id.cpu().numpy().astype(int)
-                    for i, box in enumerate(result.boxes.xyxy):
-                        if i < len(tracks):
-                            track_id = tracks[i]
-                            x1, y1 = box[:2].cpu().numpy().astype(int)
-                            cv2.putText(annotated_frame, f"ID: {track_id}", 
-                                      (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX,
-                                      0.5, (0, 255, 0), 2)
-                
-                fps = 1000 / (results[0].speed['inference'] + results[0].speed['preprocess'])
-                cv2.putText(annotated_frame, f"FPS: {fps:.1f}", (10, 50),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-                
-                return annotated_frame
+            # Process human detections
+            for box, confidence, cls in zip(boxes, confidences, classes):
+                if int(cls) == 0 and confidence >= self.conf_threshold:  # Person class
+                    self._send_human_detection(agent_id, box, confidence, frame.shape)
             
-            return frame
+            # Track ids are unique per drone: (agent_id, track_id) is the stable key
+            track_ids = self.tracker.update_stream(agent_id, boxes, confidences, time.time())
+            for box, track_id in zip(boxes, track_ids):
+                if track_id >= 0:
+                    x1, y1 = box[:2].astype(int)
+                    cv2.putText(annotated_frame, f"ID: {track_id}", 
+                              (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX,
+                              0.5, (0, 255, 0), 2)
+            
+            fps = 1000 / max(elapsed_ms, 1e-3)
+            cv2.putText(annotated_frame, f"FPS: {fps:.1f}", (10, 50),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+            
+            return annotated_frame
             
         except Exception as e:
             logger.error(f"Error in YOLO process: {e}")
@@ -113,33 +189,45 @@ class AgentVisionReceiver:
         except Exception as e:
             logger.error(f"Error setting up socket for agent {agent_id}: {e}")
             return
+        
+        # Decode straight to 320x240 using DCT scaling instead of full decode + resize
+        decoder = FrameDecoder(target_size=(320, 240))
             
         while self.running:
             try:
                 data, addr = sock.recvfrom(65535)
-                logger.debug(f"Data received from {addr} for agent {agent_id}")
+                FRAMES_RECEIVED.labels(agent_id).inc()
+                log_event(logger, logging.DEBUG, 'datagram', agent=agent_id, addr=addr[0], size=len(data))
                 
                 if len(data) < 4:
+                    FRAMES_DROPPED.labels(agent_id, 'short').inc()
                     continue
                 
                 received_agent_id = struct.unpack('i', data[:4])[0]
                 if received_agent_id != agent_id:
+                    FRAMES_DROPPED.labels(agent_id, 'wrong_agent').inc()
                     continue
                 
                 img_data = data[4:]
-                nparr = np.frombuffer(img_data, np.uint8)
-                frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+                frame = decoder.decode(img_data)
                 
                 if frame is None:
+                    FRAMES_DROPPED.labels(agent_id, 'decode_error').inc()
+                    img_data = None
                     frame = np.ones((240, 320, 3), dtype=np.uint8) * 128
                     cv2.putText(frame, f"Dron {agent_id} - No Data", (10, 120),
                               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
                 else:
-                    frame = cv2.resize(frame, (320, 240))
+                    FRAMES_DECODED.labels(agent_id).inc()
                     frame = self.process_frame_yolo(frame, agent_id)
                 
+                # frame puede ser un buffer del pool del decoder (se reutiliza en pocas
+                # decodificaciones): el buffer de la ventana y la vista previa usan una copia
+                copy = frame.copy()
                 with self.lock:
-                    self.frame_buffer[agent_id] = frame.copy()
+                    self.frame_buffer[agent_id] = copy
+                if self.preview:
+                    self.preview.publish(agent_id, jpeg=img_data, frame=copy)
                     
             except socket.timeout:
                 continue
@@ -159,7 +247,18 @@ class AgentVisionReceiver:
             receiver.daemon = True
             receiver.start()
         
-        self._display_streams()
+        if self.preview:
+            self.preview.start()
+        
+        if self.show_window:
+            self._display_streams()
+        else:
+            self._wait_until_stopped()
+    
+    def _wait_until_stopped(self):
+        """Headless mode: frames are only served through the preview server"""
+        while self.running:
+            time.sleep(0.5)
     
     def _display_streams(self):
         logger.info("Starting visualization")
@@ -202,13 +301,22 @@ class AgentVisionReceiver:
     def stop(self):
         logger.info("Stopping AgentVisionReceiver")
         self.running = False
+        if self.preview:
+            self.preview.stop()
+        if self.model_client:
+            self.model_client.close()
         self.human_detection_socket.close()
         cv2.destroyAllWindows()
 
 if __name__ == "__main__":
+    # kill -USR1 <pid> or http://127.0.0.1:9101/profile?seconds=10 to profile the live process
+    enable_profiling()
     receiver = AgentVisionReceiver(
         num_agents=1,
         model_type='yolov8n',
-        conf_threshold=0.5
+        conf_threshold=0.5,
+        preview_port=8081,  # MJPEG preview at http://<host>:8081/grid
+        metrics_port=9101,  # Metrics at http://127.0.0.1:9101/metrics
+        model_server=None  # ('127.0.0.1', 5600) to share the model loaded by ModelServer.py
     )
     receiver.start_receiving()
\ No newline at end of file
@@ -0,0 +1,359 @@
+import socket
+import threading
+import selectors
+import hashlib
+import bisect
+import argparse
+import time
+import logging
+import json
+from ServiceLogging import setup_logging
+from ServiceMetrics import counter, gauge, start_metrics_server
+#this code is called CameraSharding.py and is in the folder pycodes
+#it spreads the static cameras over several inference nodes (SecurityCameraSystem processes)
+#a coordinator assigns the cameras to the live nodes with consistent hashing, the nodes register with
+#heartbeats, and the confirmed detections of all the nodes are merged into one stream for controller4
+#
+#   python CameraSharding.py coordinator --cameras 200
+#   python CameraSharding.py node --node-id a
+#   python CameraSharding.py node --node-id b
+#
+#unity sends camera i to port 5124 + i; without --relay each node binds the ports of its own cameras
+#(nodes on the same machine), with --relay the coordinator binds them and forwards each datagram to the
+#node that owns the camera (nodes on other machines, listening on --data-port + i)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONTROL_ADDRESS = ('127.0.0.1', 5590)
+DEFAULT_DETECTION_PORT = 5591
+
+NODES = gauge('shard_coordinator_nodes', 'Live inference nodes')
+DETECTIONS_FORWARDED = counter('shard_coordinator_detections_forwarded_total', 'Detections forwarded to the controller')
+DETECTIONS_DROPPED = counter('shard_coordinator_detections_dropped_total', 'Detections from a node that no longer owns the camera')
+FRAMES_RELAYED = counter('shard_coordinator_frames_relayed_total', 'Camera datagrams relayed to the nodes')
+
+
+class ConsistentHashRing:
+    """
+    Anillo de hashing consistente. Cada nodo ocupa `replicas` puntos del
+    anillo; una llave pertenece al primer punto a su derecha. Agregar o quitar
+    un nodo solo mueve las llaves de los tramos que ese nodo gana o pierde.
+    """
+
+    def __init__(self, replicas=64):
+        self.replicas = replicas
+        self.points = []  # hashes ordenados
+        self.owners = []  # nodo de cada punto
+
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(hashlib.md5(str(key).encode()).digest()[:8], 'big')
+
+    def __contains__(self, node_id):
+        return node_id in self.owners
+
+    def add(self, node_id):
+        if node_id in self.owners:
+            return
+        for replica in range(self.replicas):
+            point = self._hash(f"{node_id}#{replica}")
+            index = bisect.bisect(self.points, point)
+            self.points.insert(index, point)
+            self.owners.insert(index, node_id)
+
+    def remove(self, node_id):
+        keep = [i for i, owner in enumerate(self.owners) if owner != node_id]
+        self.points = [self.points[i] for i in keep]
+        self.owners = [self.owners[i] for i in keep]
+
+    def lookup(self, key):
+        if not self.points:
+            return None
+        index = bisect.bisect(self.points, self._hash(key)) % len(self.points)
+        return self.owners[index]
+
+
+class ShardCoordinator:
+    """
+    Registro de nodos, asignación de cámaras y unión de detecciones.
+
+    Los nodos mandan un heartbeat JSON por UDP a control_address cada segundo
+    y reciben su lista de cámaras en la respuesta. Un nodo sin heartbeat por
+    heartbeat_timeout segundos sale del anillo y sus cámaras pasan a otros.
+    Las detecciones confirmadas llegan a detection_port y se reenvían al
+    controlador, descartando las de un nodo que ya no es dueño de la cámara
+    (pasa durante un traspaso).
+    """
+
+    def __init__(self, camera_ids, control_address=DEFAULT_CONTROL_ADDRESS,
+                 detection_port=DEFAULT_DETECTION_PORT, controller_address=('127.0.0.1', 5556),
+                 heartbeat_timeout=3.0, relay=False, camera_base_port=5124):
+        self.camera_ids = list(camera_ids)
+        self.control_address = control_address
+        self.detection_port = detection_port
+        self.controller_address = controller_address
+        self.heartbeat_timeout = heartbeat_timeout
+        self.relay = relay
+        self.camera_base_port = camera_base_port
+
+        self.lock = threading.Lock()
+        self.ring = ConsistentHashRing()
+        self.nodes = {}  # node_id -> {'last_seen', 'data_host', 'data_base_port'}
+        self.owner = {}  # camera_id -> node_id
+        self.version = 0
+        self.running = False
+
+    #########################################################
+    #                     Assignment                        #
+    #########################################################
+
+    def _rebalance(self):
+        previous = self.owner
+        self.owner = {camera_id: self.ring.lookup(camera_id) for camera_id in self.camera_ids}
+        moved = sum(1 for camera_id in self.camera_ids if previous.get(camera_id) != self.owner[camera_id])
+        self.version += 1
+        NODES.set(len(self.nodes))
+        logger.info(f"Assignment v{self.version}: {len(self.nodes)} nodes, {moved} cameras moved")
+
+    def _register(self, message, address):
+        node_id = message['node_id']
+        with self.lock:
+            node = self.nodes.get(node_id)
+            if node is None:
+                logger.info(f"Node {node_id} registered from {address[0]}")
+                node = self.nodes[node_id] = {}
+                self.ring.add(node_id)
+                self._rebalance()
+            node['last_seen'] = time.monotonic()
+            node['data_host'] = message.get('data_host', address[0])
+            node['data_base_port'] = message.get('data_base_port', self.camera_base_port)
+            cameras = sorted(c for c, owner in self.owner.items() if owner == node_id)
+            return {'type': 'assignment', 'version': self.version, 'cameras': cameras}
+
+    def _expire_nodes(self):
+        while self.running:
+            time.sleep(self.heartbeat_timeout / 3)
+            now = time.monotonic()
+            with self.lock:
+                dead = [n for n, node in self.nodes.items() if now - node['last_seen'] > self.heartbeat_timeout]
+                for node_id in dead:
+                    logger.warning(f"Node {node_id} missed its heartbeats, reassigning its cameras")
+                    del self.nodes[node_id]
+                    self.ring.remove(node_id)
+                if dead:
+                    self._rebalance()
+
+    def assignments(self):
+        """{node_id: [camera_id, ...]}"""
+        with self.lock:
+            result = {node_id: [] for node_id in self.nodes}
+            for camera_id, owner in self.owner.items():
+                if owner is not None:
+                    result[owner].append(camera_id)
+            return result
+
+    #########################################################
+    #                      Threads                          #
+    #########################################################
+
+    def _serve_control(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(self.control_address)
+        sock.settimeout(1.0)
+        while self.running:
+            try:
+                data, address = sock.recvfrom(65535)
+                message = json.loads(data.decode())
+                if message.get('type') == 'heartbeat':
+                    reply = self._register(message, address)
+                elif message.get('type') == 'get_assignments':
+                    reply = {'type': 'assignments', 'version': self.version, 'nodes': self.assignments()}
+                else:
+                    continue
+                sock.sendto(json.dumps(reply).encode(), address)
+            except socket.timeout:
+                continue
+            except Exception as e:
+                logger.error(f"Control message error: {e}")
+        sock.close()
+
+    def _merge_detections(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind((self.control_address[0], self.detection_port))
+        sock.settimeout(1.0)
+        out = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        while self.running:
+            try:
+                data, _ = sock.recvfrom(65535)
+                detection = json.loads(data.decode())
+                if self.owner.get(detection.get('camera_id')) != detection.get('node_id'):
+                    DETECTIONS_DROPPED.inc()
+                    continue
+                out.sendto(data, self.controller_address)
+                DETECTIONS_FORWARDED.inc()
+            except socket.timeout:
+                continue
+            except Exception as e:
+                logger.error(f"Detection merge error: {e}")
+        sock.close()
+        out.close()
+
+    def _relay_frames(self):
+        """Un solo hilo para todos los puertos de cámara, reenvía cada datagrama a su nodo"""
+        selector = selectors.DefaultSelector()
+        out = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        for camera_id in self.camera_ids:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind(('0.0.0.0', self.camera_base_port + camera_id))
+            sock.setblocking(False)
+            selector.register(sock, selectors.EVENT_READ, camera_id)
+
+        while self.running:
+            for key, _ in selector.select(timeout=1.0):
+                camera_id = key.data
+                try:
+                    data = key.fileobj.recv(65535)
+                except BlockingIOError:
+                    continue
+                node = self.nodes.get(self.owner.get(camera_id))
+                if node is None:
+                    continue
+                try:
+                    out.sendto(data, (node['data_host'], node['data_base_port'] + camera_id))
+                    FRAMES_RELAYED.inc()
+                except OSError as e:
+                    logger.error(f"Relay error for camera {camera_id}: {e}")
+
+        for key in list(selector.get_map().values()):
+            key.fileobj.close()
+        selector.close()
+        out.close()
+
+    def start(self):
+        self.running = True
+        targets = [self._serve_control, self._merge_detections, self._expire_nodes]
+        if self.relay:
+            targets.append(self._relay_frames)
+        threads = []
+        for target in targets:
+            thread = threading.Thread(target=target, name=f"Coordinator{target.__name__}")
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        logger.info(f"Shard coordinator for {len(self.camera_ids)} cameras on {self.control_address}")
+        return threads
+
+    def stop(self):
+        self.running = False
+
+
+class ShardNode:
+    """
+    Nodo de inferencia: un SecurityCameraSystem cuyas cámaras cambian según
+    la asignación del coordinador. Las detecciones confirmadas se mandan al
+    coordinador con el node_id.
+    """
+
+    def __init__(self, node_id, coordinator_address=DEFAULT_CONTROL_ADDRESS,
+                 detection_port=DEFAULT_DETECTION_PORT, data_host='127.0.0.1', data_base_port=5124,
+                 heartbeat_interval=1.0, **system_kwargs):
+        from StaticCameras import SecurityCameraSystem
+
+        self.node_id = node_id
+        self.coordinator_address = coordinator_address
+        self.data_host = data_host
+        self.data_base_port = data_base_port
+        self.heartbeat_interval = heartbeat_interval
+        self.version = -1
+
+        system_kwargs.setdefault('show_window', False)
+        self.system = SecurityCameraSystem(
+            base_port=data_base_port,
+            camera_ids=[],
+            detection_address=(coordinator_address[0], detection_port),
+            node_id=node_id,
+            **system_kwargs
+        )
+
+    def _heartbeat(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.settimeout(self.heartbeat_interval)
+        message = json.dumps({
+            'type': 'heartbeat',
+            'node_id': self.node_id,
+            'data_host': self.data_host,
+            'data_base_port': self.data_base_port
+        }).encode()
+
+        while self.system.running:
+            try:
+                sock.sendto(message, self.coordinator_address)
+                reply = json.loads(sock.recvfrom(65535)[0].decode())
+                if reply.get('type') == 'assignment' and reply['version'] != self.version:
+                    self._apply(reply['cameras'])
+                    self.version = reply['version']
+            except socket.timeout:
+                logger.warning("No answer from the coordinator")
+                continue
+            except Exception as e:
+                logger.error(f"Heartbeat error: {e}")
+            time.sleep(self.heartbeat_interval)
+        sock.close()
+
+    def _apply(self, cameras):
+        current = set(self.system.active_cameras)
+        cameras = set(cameras)
+        for camera_id in current - cameras:
+            self.system.remove_camera(camera_id)
+        for camera_id in cameras - current:
+            self.system.add_camera(camera_id)
+        logger.info(f"Node {self.node_id} now serves {len(cameras)} cameras "
+                    f"(+{len(cameras - current)} -{len(current - cameras)})")
+
+    def start(self):
+        thread = threading.Thread(target=self._heartbeat, name="ShardHeartbeat")
+        thread.daemon = True
+        thread.start()
+        self.system.start()
+
+    def stop(self):
+        self.system.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cámaras estáticas repartidas en varios nodos")
+    parser.add_argument('role', choices=['coordinator', 'node'])
+    parser.add_argument('--coordinator', default=f"{DEFAULT_CONTROL_ADDRESS[0]}:{DEFAULT_CONTROL_ADDRESS[1]}")
+    parser.add_argument('--cameras', type=int, default=4, help="número de cámaras (coordinador)")
+    parser.add_argument('--relay', action='store_true', help="el coordinador recibe y reenvía los frames")
+    parser.add_argument('--node-id', help="nombre del nodo")
+    parser.add_argument('--data-host', default='127.0.0.1', help="host donde el nodo recibe los frames")
+    parser.add_argument('--data-port', type=int, default=5124, help="puerto base de las cámaras en el nodo")
+    parser.add_argument('--metrics-port', type=int, default=None)
+    args = parser.parse_args()
+
+    setup_logging(level=logging.INFO)
+    host, port = args.coordinator.rsplit(':', 1)
+    address = (host, int(port))
+
+    if args.role == 'coordinator':
+        coordinator = ShardCoordinator(range(args.cameras), control_address=address, relay=args.relay)
+        if args.metrics_port is not None:
+            start_metrics_server(args.metrics_port)
+        coordinator.start()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            coordinator.stop()
+    else:
+        node = ShardNode(args.node_id or socket.gethostname(), coordinator_address=address,
+                         data_host=args.data_host, data_base_port=args.data_port,
+                         metrics_port=args.metrics_port)
+        try:
+            node.start()
+        except KeyboardInterrupt:
+            node.stop()
+
+if __name__ == "__main__":
+    main()
@@ -2,56 +2,157 @@ import agentpy as ap
 from flask import Flask, jsonify, request
 import numpy as np
 import random
+import json
+import ast
+import math
+import heapq
+from collections import defaultdict
+from BinaryTransport import (is_binary_request, wants_binary, read_array, array_response,
+                             encode_actions, encode_cubes, ACTION_DTYPE, ACTION_TYPES, CUBE_DTYPE)
 
 app = Flask(__name__)
 
+class CubeIndex:
+    """Uniform grid over the floor (x, z) holding the cubes that are free to pick"""
+    
+    def __init__(self, cell_size=2.0):
+        self.cell_size = cell_size
+        self.cells = defaultdict(set)
+        self.positions = {}  # cube id -> (x, z)
+        self.bounds = None  # (min_cx, max_cx, min_cz, max_cz) of the cells used so far
+        
+    def __len__(self):
+        return len(self.positions)
+    
+    def __contains__(self, cube_id):
+        return cube_id in self.positions
+        
+    def _cell(self, x, z):
+        return (math.floor(x / self.cell_size), math.floor(z / self.cell_size))
+    
+    def add(self, cube_id, position):
+        x, z = position[0], position[2]
+        cell = self._cell(x, z)
+        self.cells[cell].add(cube_id)
+        self.positions[cube_id] = (x, z)
+        if self.bounds is None:
+            self.bounds = (cell[0], cell[0], cell[1], cell[1])
+        else:
+            min_cx, max_cx, min_cz, max_cz = self.bounds
+            self.bounds = (min(min_cx, cell[0]), max(max_cx, cell[0]),
+                           min(min_cz, cell[1]), max(max_cz, cell[1]))
+    
+    def remove(self, cube_id):
+        x, z = self.positions.pop(cube_id)
+        cell = self._cell(x, z)
+        self.cells[cell].discard(cube_id)
+        if not self.cells[cell]:
+            del self.cells[cell]
+    
+    def _ring(self, cx, cz, r):
+        if r == 0:
+            yield (cx, cz)
+            return
+        for dx in range(-r, r + 1):
+            yield (cx + dx, cz - r)
+            yield (cx + dx, cz + r)
+        for dz in range(-r + 1, r):
+            yield (cx - r, cz + dz)
+            yield (cx + r, cz + dz)
+    
+    def nearest(self, position, exclude=None):
+        """Returns (cube_id, distance) of the nearest free cube other than exclude, or None"""
+        if not self.positions:
+            return None
+        x, z = position[0], position[2]
+        cx, cz = self._cell(x, z)
+        min_cx, max_cx, min_cz, max_cz = self.bounds
+        max_ring = max(abs(cx - min_cx), abs(cx - max_cx), abs(cz - min_cz), abs(cz - max_cz))
+        
+        best, best_d2 = None, float('inf')
+        for r in range(max_ring + 1):
+            for cell in self._ring(cx, cz, r):
+                for cube_id in self.cells.get(cell, ()):
+                    if cube_id == exclude:
+                        continue
+                    cube_x, cube_z = self.positions[cube_id]
+                    d2 = (cube_x - x) ** 2 + (cube_z - z) ** 2
+                    if d2 < best_d2:
+                        best, best_d2 = cube_id, d2
+            # Cubes beyond this ring are at least r cells away
+            if best is not None and best_d2 <= (r * self.cell_size) ** 2:
+                break
+        if best is None:
+            return None
+        return best, math.sqrt(best_d2)
+
 class RobotAgent(ap.Agent):
     
     def setup(self):
-        self.position = [0, 0, 0]  # x, y, z coordinates
+        self.index = 0  # row of this robot in the model's arrays (set by RobotWorld)
         self.has_cube = False
         self.target_cube = None
         self.target_position = None
-        self.state = "searching"  # states: searching, moving_to_cube, picking, transporting, dropping
+        self.last_dropped = None  # id of the cube this robot just delivered
+        self.state = "searching"  # states: searching, moving_to_cube, transporting
+        
+    @property
+    def position(self):
+        """x, y, z coordinates reported by Unity"""
+        return self.model.positions[self.index]
+    
+    @property
+    def arrived(self):
+        """Whether the robot is within the arrival tolerance of its target (RobotWorld.update_arrivals)"""
+        return self.model.arrived[self.index]
+    
+    def set_target(self, target_position):
+        self.target_position = target_position
+        self.model.targets[self.index] = target_position if target_position is not None else np.nan
         
     def step(self):
-        """Determine next action based on current state"""
+        """
+        Advance the state machine. Only called when the robot has an event
+        (a cube was assigned or it arrived), and actions are only emitted
+        on state transitions.
+        """
         actions = []
         
         if self.state == "searching" and not self.has_cube:
-            # Find nearest available cube
-            available_cubes = [cube for cube in self.model.cubes if not cube['being_carried']]
-            if available_cubes:
-                self.target_cube = random.choice(available_cubes)
-                self.target_position = self.target_cube['position']
+            # The model assigns the nearest unclaimed cube (RobotWorld.assign_cubes)
+            if self.target_cube is not None:
+                self.set_target(self.target_cube['position'])
                 self.state = "moving_to_cube"
                 actions.append({"type": "move", "agent_id": self.id, 
                               "target": self.target_position})
                 
         elif self.state == "moving_to_cube":
             # Check if we've reached the cube
-            if self.position == self.target_position:
-                self.state = "picking"
+            if self.arrived:
                 actions.append({"type": "pick", "agent_id": self.id, 
                               "cube_id": self.target_cube['id']})
                 self.has_cube = True
                 self.target_cube['being_carried'] = True
                 # Choose random drop point
-                self.target_position = [random.randint(-10, 10), 0, random.randint(-10, 10)]
+                self.set_target([random.randint(-10, 10), 0, random.randint(-10, 10)])
                 self.state = "transporting"
+                actions.append({"type": "move", "agent_id": self.id, 
+                              "target": self.target_position})
             
         elif self.state == "transporting":
-            if self.position == self.target_position:
-                self.state = "dropping"
+            if self.arrived:
                 actions.append({"type": "drop", "agent_id": self.id, 
                               "cube_id": self.target_cube['id']})
                 self.has_cube = False
                 self.target_cube['being_carried'] = False
-                self.target_cube['position'] = self.position
+                self.target_cube['position'] = self.position.tolist()
+                # The cube is free again where it was dropped
+                self.model.cube_index.add(self.target_cube['id'], self.target_cube['position'])
+                # It is the closest cube now, do not pick it right back up
+                self.last_dropped = self.target_cube['id']
+                self.target_cube = None
+                self.set_target(None)
                 self.state = "searching"
-            else:
-                actions.append({"type": "move", "agent_id": self.id, 
-                              "target": self.target_position})
                 
         return actions
 
@@ -62,24 +163,101 @@ class RobotWorld(ap.Model):
         self.actions = []
         self.agents = ap.AgentList(self, self.p.num_robots, RobotAgent)
         
+        # Robot state as arrays, so arrival is checked for all robots at once
+        self.positions = np.zeros((self.p.num_robots, 3))
+        self.targets = np.full((self.p.num_robots, 3), np.nan)
+        self.arrived = np.zeros(self.p.num_robots, dtype=bool)
+        self.arrival_tolerance = self.p.get('arrival_tolerance', 0.5)
+        for i, agent in enumerate(self.agents):
+            agent.index = i
+        
         # Initialize cubes with random positions
         self.cubes = []
+        self.cube_index = CubeIndex(cell_size=self.p.get('cube_cell_size', 2.0))
         for i in range(self.p.num_cubes):
             self.cubes.append({
                 'id': i,
                 'position': [random.randint(-10, 10), 0, random.randint(-10, 10)],
                 'being_carried': False
             })
+            self.cube_index.add(i, self.cubes[i]['position'])
+
+    def set_positions(self, positions):
+        """Positions from Unity, one (x, y, z) per robot"""
+        positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        self.positions[:len(positions)] = positions
+
+    def _nearest_for(self, agent):
+        """Nearest free cube other than the one the robot just dropped, unless it is the only one"""
+        nearest = self.cube_index.nearest(agent.position, exclude=agent.last_dropped)
+        if nearest is None:
+            nearest = self.cube_index.nearest(agent.position)
+        return nearest
+
+    def assign_cubes(self):
+        """
+        Greedy global assignment: the closest (robot, free cube) pair is
+        assigned first, so robots do not cross the map and no two robots
+        target the same cube. Assigned cubes leave the index until dropped.
+        A robot is not assigned the cube it just dropped while there are others.
+        Returns the robots that got a cube.
+        """
+        proposals = []
+        for agent in self.agents:
+            if agent.state == "searching" and not agent.has_cube and agent.target_cube is None:
+                nearest = self._nearest_for(agent)
+                if nearest is None:
+                    continue
+                cube_id, distance = nearest
+                heapq.heappush(proposals, (distance, agent.id, cube_id, agent))
+        
+        assigned = []
+        while proposals and len(self.cube_index):
+            _, agent_id, cube_id, agent = heapq.heappop(proposals)
+            if cube_id in self.cube_index:
+                self.cube_index.remove(cube_id)
+                agent.target_cube = self.cubes[cube_id]
+                # Only the immediate re-pick is blocked
+                agent.last_dropped = None
+                assigned.append(agent)
+            else:
+                # Someone closer took it, look again
+                nearest = self._nearest_for(agent)
+                if nearest is not None:
+                    cube_id, distance = nearest
+                    heapq.heappush(proposals, (distance, agent_id, cube_id, agent))
+        return assigned
+
+    def update_arrivals(self):
+        """Distance-tolerance arrival check for every robot in one pass"""
+        distances = np.linalg.norm(self.positions - self.targets, axis=1)
+        # Robots without a target have NaN distance and never arrive
+        self.arrived = distances <= self.arrival_tolerance
 
     def step(self):
         self.actions = []
-        for agent in self.agents:
-            self.actions.extend(agent.step())
+        assigned = self.assign_cubes()
+        self.update_arrivals()
+        
+        # Only robots with an event need to act
+        events = set(np.nonzero(self.arrived)[0].tolist())
+        events.update(agent.index for agent in assigned)
+        for index in sorted(events):
+            self.actions.extend(self.agents[index].step())
 
     def update(self):
         if self.t >= self._steps:
             self.stop()
 
+def compact_actions(actions):
+    """Actions as short rows: [type, agent_id, cube_id, x, y, z] (type codes from ACTION_TYPES)"""
+    rows = []
+    for action in actions:
+        target = action.get('target') or (0, 0, 0)
+        rows.append([ACTION_TYPES[action['type']], action['agent_id'],
+                     action.get('cube_id', -1), *target])
+    return rows
+
 # Global model instance
 parameters = {
     'num_robots': 5,
@@ -89,9 +267,21 @@ parameters = {
 model = RobotWorld(parameters)
 model.sim_setup()
 
+def parse_positions(text):
+    """Parse the positions list sent by Unity without eval"""
+    try:
+        return json.loads(text)
+    except ValueError:
+        return ast.literal_eval(text)
+
 @app.route('/setup', methods=['GET'])
 def setup():
     """Initial setup information for Unity"""
+    if wants_binary(request):
+        # Binary: the cubes as CUBE_DTYPE records (robot count is X-Robots)
+        response = array_response(encode_cubes(model.cubes), CUBE_DTYPE)
+        response.headers['X-Robots'] = str(model.p.num_robots)
+        return response
     return jsonify({
         'robots': model.p.num_robots,
         'cubes': model.cubes
@@ -100,15 +290,30 @@ def setup():
 @app.route('/step', methods=['POST'])
 def step():
     """Process updates from Unity and return next actions"""
-    # Update positions from Unity
-    positions = eval(request.form['positions'])
-    for i, pos in enumerate(positions):
-        model.agents[i].position = pos
+    # Update positions from Unity, as float32 (x, y, z) per robot
+    # (Content-Type: application/octet-stream) or as a form field
+    try:
+        if is_binary_request(request):
+            positions = read_array(request, '<f4', columns=3)
+        else:
+            positions = parse_positions(request.form['positions'])
+        positions = np.asarray(positions, dtype=float)
+        if positions.ndim != 2 or positions.shape[1] != 3 or len(positions) > model.p.num_robots:
+            raise ValueError(f"Expected up to {model.p.num_robots} (x, y, z) positions, "
+                             f"got an array of shape {positions.shape}")
+    except (ValueError, SyntaxError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    model.set_positions(positions)
     
     # Execute model step
     model.sim_step()
     model.update()
     
+    # The actions are only the state transitions of this step
+    if wants_binary(request):
+        return array_response(encode_actions(model.actions), ACTION_DTYPE)
+    if request.args.get('format') == 'compact':
+        return jsonify({'t': model.t, 'actions': compact_actions(model.actions)})
     return jsonify({'actions': model.actions})
 
 if __name__ == '__main__':
@@ -8,14 +8,25 @@ import socket
 import json
 import threading
 import time
+import EnvironmentConfig
+from MotionMetrics import MotionMetrics
+from ServiceLogging import setup_logging, log_event
+from ServiceMetrics import counter, histogram, start_metrics_server
+from ServiceProfiler import timed, enable_profiling
 
-logging.basicConfig(
+# Los logs se escriben en otro hilo; los eventos por request se limitan por segundo
+# (se pueden cambiar en caliente con logging_config.json)
+setup_logging(
     level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
+    rates={'agent_step': 5, 'agent_decision': 5, 'get_decisions': 2, 'detection_state': 5},
+    config_file='logging_config.json'
 )
 logger = logging.getLogger(__name__)
 
+DETECTIONS_RECEIVED = counter('robot_controller_detections_received_total', 'Detections received from the cameras')
+DECISION_SECONDS = histogram('robot_controller_decision_seconds', 'Time to answer /get_decisions')
+DECISION_ERRORS = counter('robot_controller_decision_errors_total', 'Failed /get_decisions requests')
+
 app = Flask(__name__)
 CORS(app)
 
@@ -23,9 +34,6 @@ class RobotAgent(ap.Agent):
     def setup(self):
         self.id = 0
         self.start_time = datetime.now()
-        self.total_distance_traveled = 0
-        self.last_position = None
-        self.last_movement_time = None
         self.MIN_MOVEMENT_THRESHOLD = 1
         self.current_action = None
         self.target_position = None
@@ -34,13 +42,7 @@ class RobotAgent(ap.Agent):
         self._detected_person = None
         self._last_detection_time = None
         self.detection_cooldown = 5.0
-        self.camera_positions = [
-            {'x': -2.833347, 'y': 8.0, 'z': 44.74295},
-            {'x': -61.0, 'y': 10.0, 'z': 67.0},
-            {'x': 52.0, 'y': 4.0, 'z': -35.0},
-            {'x': 28.24, 'y': 4.0, 'z': -104.0}
-        ]
-        logger.debug(f"Drone initialized with id: {self.id}")
+        logger.debug("Drone initialized with id: %s", self.id)
 
     @property
     def investigating(self):
@@ -49,23 +51,23 @@ class RobotAgent(ap.Agent):
     @investigating.setter
     def investigating(self, value):
         self._investigating = value
-        logger.debug(f"Setting investigating to: {value}")
+        logger.debug("Setting investigating to: %s", value)
 
     def handle_person_detection(self, detection_data):
         current_time = time.time()
         
         # Log current state for debugging
-        logger.debug(f"Current state before processing detection:")
-        logger.debug(f"investigating: {self.investigating}")
-        logger.debug(f"last_detection_time: {self._last_detection_time}")
-        logger.debug(f"detected_person: {self._detected_person}")
+        log_event(logger, logging.DEBUG, 'detection_state', stage='before',
+                  investigating=self._investigating,
+                  last_detection_time=self._last_detection_time,
+                  detected_person=self._detected_person)
         
         # Check cooldown period
         if self._last_detection_time:
             time_since_last = current_time - self._last_detection_time
-            logger.debug(f"Time since last detection: {time_since_last:.2f} seconds")
+            logger.debug("Time since last detection: %.2f seconds", time_since_last)
             if time_since_last < self.detection_cooldown:
-                logger.debug(f"In cooldown period ({time_since_last:.2f} < {self.detection_cooldown})")
+                logger.debug("In cooldown period (%.2f < %s)", time_since_last, self.detection_cooldown)
                 return
         
         # Check if we're already investigating
@@ -82,16 +84,16 @@ class RobotAgent(ap.Agent):
         
         self._detected_person = {
             'camera_id': camera_id,
-            'position': self.camera_positions[camera_id],
+            'position': EnvironmentConfig.current().investigation_point(camera_id),
             'detection_time': current_time
         }
         self._investigating = True
         self._investigation_complete = False
         self._last_detection_time = current_time
         
-        logger.debug("Detection processed - New state:")
-        logger.debug(f"investigating: {self._investigating}")
-        logger.debug(f"detected_person: {self._detected_person}")
+        log_event(logger, logging.DEBUG, 'detection_state', stage='after',
+                  investigating=self._investigating,
+                  detected_person=self._detected_person)
 
     def calculate_distance(self, pos1, pos2):
         distance = math.sqrt(
@@ -105,14 +107,11 @@ class RobotAgent(ap.Agent):
 
     def step(self, current_state):
         position = current_state['position']
-        current_time = current_state.get('time', time.time())
-        self.update_metrics(position, current_time)
 
-        logger.debug(f"Step - Current state:")
-        logger.debug(f"Position: {position}")
-        logger.debug(f"Investigating: {self._investigating}")
-        logger.debug(f"Investigation complete: {self._investigation_complete}")
-        logger.debug(f"Detected person: {self._detected_person}")
+        log_event(logger, logging.DEBUG, 'agent_step', agent=self.id, position=position,
+                  investigating=self._investigating,
+                  investigation_complete=self._investigation_complete,
+                  detected_person=self._detected_person)
         
         if self._investigating and self._detected_person:
             if self.check_investigation_complete(position):
@@ -120,7 +119,7 @@ class RobotAgent(ap.Agent):
                 return {"decision": "explore"}
             
             camera_pos = self._detected_person['position']
-            logger.debug(f"Moving to investigation target: {camera_pos}")
+            logger.debug("Moving to investigation target: %s", camera_pos)
             return {
                 "decision": "move_to_target",
                 "target": camera_pos
@@ -135,7 +134,7 @@ class RobotAgent(ap.Agent):
         target_pos = self._detected_person['position']
         distance = self.calculate_distance(current_position, target_pos)
         
-        logger.debug(f"Checking investigation completion - Distance to target: {distance:.2f}")
+        logger.debug("Checking investigation completion - Distance to target: %.2f", distance)
         
         if distance < 2.0:
             logger.info(f"Investigation complete - Distance to target: {distance:.2f}")
@@ -146,31 +145,21 @@ class RobotAgent(ap.Agent):
             
         return False
 
-    def update_metrics(self, current_position, current_time):
-        if self.last_position and self.last_movement_time:
-            if isinstance(current_time, datetime):
-                time_diff = (current_time - self.last_movement_time).total_seconds()
-            else:
-                time_diff = current_time - self.last_movement_time
-            
-            if time_diff >= 0.1:
-                distance = self.calculate_distance(current_position, self.last_position)
-                if distance > 0:
-                    self.total_distance_traveled += distance
-                self.last_movement_time = current_time
-        else:
-            self.last_movement_time = current_time
-
-        self.last_position = current_position.copy()
-
 
 class RobotWorld(ap.Model):
     def setup(self):
+        # Puntos de investigación de cada cámara desde environment_config.json (uno para todos los agentes)
+        EnvironmentConfig.watch()
         self.agents = ap.AgentList(self, self.p.num_robots, RobotAgent)
+        # Distancia, velocidad y tiempo inactivo de todos los agentes en arrays
+        self.metrics = MotionMetrics(self.p.num_robots, min_movement=1, min_interval=0.1,
+                                     window_seconds=60.0)
         self.detection_thread = None
         self.detection_socket = None
         self.running = True
         self._setup_detection_socket()
+        if self.p.get('metrics_port') is not None:
+            start_metrics_server(self.p['metrics_port'])
         logger.info(f"Created model with {self.p.num_robots} agents")
 
     def _setup_detection_socket(self):
@@ -212,6 +201,7 @@ class RobotWorld(ap.Model):
             try:
                 data, _ = self.detection_socket.recvfrom(65536)
                 detection = json.loads(data.decode())
+                DETECTIONS_RECEIVED.inc()
                 # logger.info(f"Received detection: {detection}")
                 for agent in self.agents:
                     agent.handle_person_detection(detection)
@@ -220,30 +210,53 @@ class RobotWorld(ap.Model):
                     logger.error(f"Error processing detection: {e}")
                     time.sleep(0.1)
 
+    def _ingest(self, world_state):
+        """
+        Lee el estado del mundo una sola vez y pasa las posiciones a las métricas.
+        Devuelve {id: state} de los agentes.
+        """
+        agent_states = {entry['id']: entry['state'] for entry in world_state['agentStates']}
+        now = time.time()
+        
+        indices, positions, times = [], [], []
+        for i, agent in enumerate(self.agents):
+            state = agent_states.get(str(agent.id))
+            if state is not None:
+                position = state['position']
+                indices.append(i)
+                positions.append((position['x'], position['y'], position['z']))
+                times.append(state.get('time', now))
+        self.metrics.ingest(indices, positions, times)
+        return agent_states
+
+    @timed('robot_controller.get_decisions')
     def get_decisions(self, world_state):
-        logger.debug(f"Getting decisions for world state: {world_state}")
+        log_event(logger, logging.DEBUG, 'get_decisions', agents=len(world_state.get('agentStates', [])))
         decisions = []
-        agent_states = {entry['id']: entry['state'] for entry in world_state['agentStates']}
+        agent_states = self._ingest(world_state)
         
         for agent in self.agents:
             if str(agent.id) in agent_states:
                 agent_state = agent_states[str(agent.id)]
                 decision = agent.step(agent_state)
                 decisions.append(decision)
-                logger.debug(f"Decision for agent {agent.id}: {decision}")
+                log_event(logger, logging.DEBUG, 'agent_decision', agent=agent.id, decision=decision)
         
         return decisions
 
     def get_metrics(self, world_state):
+        # Las muestras repetidas se ignoran, así que no hay doble conteo con get_decisions
         metrics = []
-        agent_states = {entry['id']: entry['state'] for entry in world_state['agentStates']}
-        for agent in self.agents:
+        agent_states = self._ingest(world_state)
+        snapshot = self.metrics.snapshot()
+        for i, agent in enumerate(self.agents):
             if str(agent.id) in agent_states:
-                agent_state = agent_states[str(agent.id)]
-                agent.update_metrics(agent_state['position'], agent_state.get('time', 0))
                 metrics.append({
                     'agent_id': agent.id,
-                    'total_distance': round(agent.total_distance_traveled, 2)
+                    'total_distance': round(float(snapshot['total_distance'][i]), 2),
+                    'distance_last_minute': round(float(snapshot['window_distance'][i]), 2),
+                    'speed': round(float(snapshot['speed'][i]), 2),
+                    'idle_time': round(float(snapshot['idle_time'][i]), 2)
                 })
         return metrics
 
@@ -255,16 +268,18 @@ class RobotWorld(ap.Model):
             except:
                 pass
 
-model = RobotWorld({'num_robots': 1})
+model = RobotWorld({'num_robots': 1, 'metrics_port': 9103})  # Métricas en http://127.0.0.1:9103/metrics
 model.sim_setup()
 
 @app.route('/get_decisions', methods=['POST'])
+@DECISION_SECONDS.time()
 def get_decisions():
     try:
         world_state = request.json
         decisions = model.get_decisions(world_state)
         return jsonify({'decisions': decisions})
     except Exception as e:
+        DECISION_ERRORS.inc()
         logger.error(f"Error processing decisions request: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
@@ -279,6 +294,8 @@ def get_metrics():
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
+    # kill -USR1 <pid> o http://127.0.0.1:9103/profile?seconds=10 para perfilar en vivo
+    enable_profiling()
     try:
         logger.info("Starting Flask application")
         app.run(debug=True)
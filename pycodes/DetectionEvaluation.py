@@ -0,0 +1,289 @@
+import numpy as np
+import pandas as pd
+import hashlib
+import itertools
+import argparse
+import json
+import os
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from FrameDecoder import FrameDecoder, jpeg_size
+from TrackingEngine import MultiStreamTracker, iou_matrix, greedy_match
+from DetectionValidation import DetectionValidator
+#this code is called DetectionEvaluation.py and is in the folder pycodes
+#it evaluates offline the detection + validation pipeline of StaticCameras.py over recorded and labeled frames
+#the raw output of the detector is cached on disk, so sweeping the validation parameters does not run yolo again
+#
+#dataset layout: one folder per sequence with the frames and a labels.json
+#   {"camera_id": 0, "fps": 10, "frames": {"000001.jpg": [{"id": 1, "box": [x1, y1, x2, y2]}, ...]}}
+#frames missing from "frames" have no people; "timestamps": {"000001.jpg": 0.0, ...} overrides fps
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+# Mismos valores que SecurityCameraSystem
+DETECTOR_CONF = 0.25
+TRACKER_PARAMS = {'iou_threshold': 0.3, 'high_conf': 0.5, 'max_age': 1.0}
+DEFAULT_GRID = {
+    'conf_threshold': [0.3, 0.5, 0.7],
+    'min_detection_time': [0.0, 0.1, 0.3, 0.5],
+    'max_position_change': [0.05, 0.1, 0.2, 1000]
+}
+
+
+def load_sequence(sequence_dir):
+    """Devuelve (camera_id, [(frame_path, timestamp, gt_ids, gt_boxes)])"""
+    with open(os.path.join(sequence_dir, 'labels.json')) as f:
+        labels = json.load(f)
+    fps = labels.get('fps', 10)
+    timestamps = labels.get('timestamps', {})
+    frame_labels = labels.get('frames', {})
+
+    names = sorted(name for name in os.listdir(sequence_dir) if name.lower().endswith(IMAGE_EXTENSIONS))
+    frames = []
+    for index, name in enumerate(names):
+        objects = frame_labels.get(name, [])
+        gt_ids = [obj.get('id') for obj in objects]
+        gt_boxes = np.array([obj['box'] for obj in objects], dtype=np.float32).reshape(-1, 4)
+        frames.append((os.path.join(sequence_dir, name), timestamps.get(name, index / fps), gt_ids, gt_boxes))
+    return labels.get('camera_id', 0), frames
+
+
+class DetectionCache:
+    """
+    Salida cruda del detector por frame, indexada por el hash del archivo del
+    frame y la configuración del detector. Se guarda con una confianza mínima
+    baja (cache_conf) para poder barrer también umbrales de confianza.
+    """
+
+    def __init__(self, cache_dir, model_name='yolov8n', cache_conf=0.05):
+        self.directory = os.path.join(cache_dir, f"{model_name}_conf{cache_conf}")
+        self.cache_conf = cache_conf
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, digest):
+        return os.path.join(self.directory, digest[:2], digest + '.npz')
+
+    @staticmethod
+    def digest(data):
+        return hashlib.sha1(data).hexdigest()
+
+    def get(self, digest):
+        path = self._path(digest)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as cached:
+            return cached['detections'], tuple(cached['shape'])
+
+    def put(self, digest, detections, shape):
+        path = self._path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + f'.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, detections=np.asarray(detections, dtype=np.float32).reshape(-1, 5),
+                     shape=np.array(shape[:2]))
+        os.replace(tmp_path, path)  # Otros workers pueden estar leyendo el mismo frame
+
+
+_worker_model = None
+
+
+def _get_model(model_name):
+    # Un modelo por proceso worker, cargado la primera vez que se necesita
+    global _worker_model
+    if _worker_model is None:
+        from ultralytics import YOLO
+        _worker_model = YOLO(f'{model_name}.pt')
+    return _worker_model
+
+
+def source_size(data, frame):
+    """
+    (ancho, alto) original del archivo. FrameDecoder solo reduce los JPEG; los
+    demás formatos (png, bmp) se decodifican completos y frame ya tiene el tamaño.
+    """
+    return jpeg_size(data) or (frame.shape[1], frame.shape[0])
+
+
+def cache_sequence(sequence_dir, cache_dir, model_name='yolov8n', cache_conf=0.05):
+    """Corre el detector sobre los frames de la secuencia que no están en cache"""
+    cache = DetectionCache(cache_dir, model_name, cache_conf)
+    decoder = FrameDecoder(target_size=(640, 480), resize=False)  # Igual que StaticCameras
+    _, frames = load_sequence(sequence_dir)
+    hits = misses = 0
+    for frame_path, _, _, _ in frames:
+        with open(frame_path, 'rb') as f:
+            data = f.read()
+        digest = cache.digest(data)
+        if cache.get(digest) is not None:
+            hits += 1
+            continue
+        misses += 1
+        frame = decoder.decode(data)
+        if frame is None:
+            cache.put(digest, np.zeros((0, 5)), (0, 0))
+            continue
+        result = _get_model(model_name).predict(frame, classes=[0], conf=cache_conf, verbose=False)[0]
+        # Las etiquetas están en pixeles de la imagen original, el decoder puede reducirla
+        width, height = source_size(data, frame)
+        scale = np.array([width / frame.shape[1], height / frame.shape[0]] * 2, dtype=np.float32)
+        detections = np.column_stack([result.boxes.xyxy.cpu().numpy() * scale, result.boxes.conf.cpu().numpy()])
+        cache.put(digest, detections, (height, width))
+    return sequence_dir, hits, misses
+
+
+@lru_cache(maxsize=64)
+def _cached_sequence(sequence_dir, cache_dir, model_name, cache_conf):
+    """Secuencia con la salida del detector ya cargada (se reutiliza entre sets de parámetros)"""
+    cache = DetectionCache(cache_dir, model_name, cache_conf)
+    camera_id, frames = load_sequence(sequence_dir)
+    loaded = []
+    for frame_path, timestamp, gt_ids, gt_boxes in frames:
+        with open(frame_path, 'rb') as f:
+            cached = cache.get(cache.digest(f.read()))
+        if cached is None:
+            raise RuntimeError(f"{frame_path} is not in the detection cache")
+        detections, shape = cached
+        loaded.append((timestamp, detections, shape, gt_ids, gt_boxes))
+    return camera_id, loaded
+
+
+def evaluate_sequence(sequence_dir, params, cache_dir, model_name='yolov8n', cache_conf=0.05,
+                      match_iou=0.5):
+    """
+    Repite el pipeline de SecurityCameraSystem.process_frame (tracker + validación)
+    con params sobre la salida cacheada del detector y lo compara con las etiquetas.
+    """
+    camera_id, frames = _cached_sequence(sequence_dir, cache_dir, model_name, cache_conf)
+    tracker = MultiStreamTracker(**TRACKER_PARAMS)
+    validator = DetectionValidator(min_detection_time=params['min_detection_time'],
+                                   max_position_change=params['max_position_change'])
+
+    tp = fp = fn = 0
+    first_seen = {}
+    first_confirmed = {}
+    for timestamp, detections, shape, gt_ids, gt_boxes in frames:
+        validator.cleanup(timestamp)
+        detections = detections[detections[:, 4] >= params.get('detector_conf', DETECTOR_CONF)]
+
+        confirmed = []
+        if len(detections):
+            boxes, confidences = detections[:, :4], detections[:, 4]
+            track_ids = tracker.update_stream(camera_id, boxes, confidences, timestamp)
+            for i, box in enumerate(boxes):
+                if confidences[i] > params['conf_threshold'] and track_ids[i] >= 0:
+                    x1, y1, x2, y2 = map(int, box)
+                    position = {
+                        'x': (x1 + x2) / (2 * shape[1]),
+                        'y': (y1 + y2) / (2 * shape[0])
+                    }
+                    if validator.is_valid(camera_id, int(track_ids[i]), position, timestamp):
+                        confirmed.append(box)
+        confirmed = np.array(confirmed, dtype=np.float32).reshape(-1, 4)
+
+        rows, cols = greedy_match(iou_matrix(gt_boxes, confirmed), match_iou)
+        tp += len(rows)
+        fn += len(gt_boxes) - len(rows)
+        fp += len(confirmed) - len(cols)
+
+        for gt_id in gt_ids:
+            if gt_id is not None:
+                first_seen.setdefault(gt_id, timestamp)
+        for r in rows:
+            if gt_ids[r] is not None:
+                first_confirmed.setdefault(gt_ids[r], timestamp)
+
+    latencies = [first_confirmed[i] - first_seen[i] for i in first_confirmed]
+    return {
+        'tp': tp, 'fp': fp, 'fn': fn,
+        'objects': len(first_seen),
+        'missed_objects': len(first_seen) - len(first_confirmed),
+        'latencies': latencies
+    }
+
+
+def _evaluate_task(task):
+    params, sequence_dir, cache_dir, model_name, cache_conf = task
+    return params, evaluate_sequence(sequence_dir, params, cache_dir, model_name, cache_conf)
+
+
+def parameter_grid(grid):
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def evaluate(dataset_dir, grid=DEFAULT_GRID, cache_dir='detection_cache', model_name='yolov8n',
+             cache_conf=0.05, workers=None):
+    """
+    1. Llena el cache del detector (un worker por secuencia, solo frames nuevos).
+    2. Evalúa cada set de parámetros sobre todas las secuencias en paralelo.
+    Devuelve un DataFrame con precision/recall/latencia por set de parámetros.
+    """
+    sequences = sorted(
+        os.path.join(dataset_dir, name) for name in os.listdir(dataset_dir)
+        if os.path.exists(os.path.join(dataset_dir, name, 'labels.json'))
+    )
+    param_sets = parameter_grid(grid)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(cache_sequence, s, cache_dir, model_name, cache_conf) for s in sequences]
+        for future in futures:
+            sequence_dir, hits, misses = future.result()
+            print(f"{os.path.basename(sequence_dir)}: {hits} frames cacheados, {misses} nuevos")
+
+    # Se agrupan por secuencia para que cada worker reutilice la secuencia cargada
+    tasks = [(params, s, cache_dir, model_name, cache_conf) for s in sequences for params in param_sets]
+    totals = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for params, result in executor.map(_evaluate_task, tasks, chunksize=max(1, len(param_sets))):
+            key = tuple(sorted(params.items()))
+            total = totals.setdefault(key, {'tp': 0, 'fp': 0, 'fn': 0, 'objects': 0,
+                                            'missed_objects': 0, 'latencies': []})
+            for name in ('tp', 'fp', 'fn', 'objects', 'missed_objects'):
+                total[name] += result[name]
+            total['latencies'].extend(result['latencies'])
+
+    rows = []
+    for key, total in totals.items():
+        precision = total['tp'] / max(total['tp'] + total['fp'], 1)
+        recall = total['tp'] / max(total['tp'] + total['fn'], 1)
+        latencies = total['latencies']
+        rows.append({
+            **dict(key),
+            'precision': precision,
+            'recall': recall,
+            'f1': 2 * precision * recall / max(precision + recall, 1e-9),
+            'mean_latency': float(np.mean(latencies)) if latencies else float('nan'),
+            'p90_latency': float(np.percentile(latencies, 90)) if latencies else float('nan'),
+            'missed_objects': total['missed_objects'],
+            'objects': total['objects']
+        })
+    return pd.DataFrame(rows).sort_values('f1', ascending=False).reset_index(drop=True)
+
+
+def _float_list(text):
+    return [float(value) for value in text.split(',')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluación offline de la detección de StaticCameras")
+    parser.add_argument('dataset', help="carpeta con una subcarpeta por secuencia")
+    parser.add_argument('--conf', type=_float_list, default=DEFAULT_GRID['conf_threshold'])
+    parser.add_argument('--min-time', type=_float_list, default=DEFAULT_GRID['min_detection_time'])
+    parser.add_argument('--max-change', type=_float_list, default=DEFAULT_GRID['max_position_change'])
+    parser.add_argument('--cache', default='detection_cache')
+    parser.add_argument('--model', default='yolov8n')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', default='evaluation_results.csv')
+    args = parser.parse_args()
+
+    grid = {
+        'conf_threshold': args.conf,
+        'min_detection_time': args.min_time,
+        'max_position_change': args.max_change
+    }
+    results = evaluate(args.dataset, grid, cache_dir=args.cache, model_name=args.model, workers=args.workers)
+    results.to_csv(args.output, index=False)
+    print(results.to_string(float_format=lambda v: f"{v:.3f}"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+import numpy as np
+import threading
+import logging
+import json
+import os
+#this code is called DetectionFusion.py and is in the folder pycodes
+#it projects the detections of the static cameras to world coordinates on the floor plane
+#and merges the detections of the same intruder seen by several cameras into a single track
+
+logger = logging.getLogger(__name__)
+
+
+def homography_from_points(image_points, world_points):
+    """
+    Calcula la homografía (DLT) que lleva puntos normalizados de la imagen
+    (x, y en [0, 1]) a puntos del piso en el mundo (x, z). Necesita >= 4 pares.
+    """
+    image_points = np.asarray(image_points, dtype=np.float64)
+    world_points = np.asarray(world_points, dtype=np.float64)
+    if len(image_points) < 4 or len(image_points) != len(world_points):
+        raise ValueError("Homography needs at least 4 matching image/world points")
+
+    rows = []
+    for (u, v), (x, z) in zip(image_points, world_points):
+        rows.append([-u, -v, -1, 0, 0, 0, u * x, v * x, x])
+        rows.append([0, 0, 0, -u, -v, -1, u * z, v * z, z])
+    _, _, vt = np.linalg.svd(np.array(rows))
+    H = vt[-1].reshape(3, 3)
+    return H / H[2, 2]
+
+
+class CameraCalibration:
+    """
+    Calibración de una cámara estática: homografía imagen -> piso y altura del piso.
+    Sin homografía, todas las detecciones se ubican en la posición de la cámara.
+    """
+
+    def __init__(self, camera_position, homography=None, floor_y=0.0):
+        self.camera_position = np.array(
+            [camera_position['x'], camera_position['y'], camera_position['z']], dtype=np.float64)
+        self.homography = None if homography is None else np.asarray(homography, dtype=np.float64)
+        self.floor_y = floor_y
+
+    @property
+    def calibrated(self):
+        return self.homography is not None
+
+    def project(self, positions):
+        """positions: (N, 2) normalizadas de la imagen -> (N, 3) mundo (x, y, z)"""
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        if not self.calibrated:
+            return np.repeat(self.camera_position[None, :], len(positions), axis=0)
+        points = np.hstack([positions, np.ones((len(positions), 1))]) @ self.homography.T
+        xz = points[:, :2] / points[:, 2:3]
+        return np.column_stack([xz[:, 0], np.full(len(xz), self.floor_y), xz[:, 1]])
+
+
+def load_calibrations(camera_positions, path='camera_calibration.json'):
+    """
+    Carga las calibraciones desde un JSON con la forma:
+        {"0": {"image_points": [[u, v], ...], "world_points": [[x, z], ...], "floor_y": 0.0}, ...}
+    Las cámaras sin entrada quedan sin calibrar.
+    """
+    data = {}
+    if path and os.path.exists(path):
+        with open(path) as f:
+            data = json.load(f)
+        logger.info(f"Loaded camera calibration for cameras {sorted(data)} from {path}")
+
+    calibrations = {}
+    for camera_id, position in camera_positions.items():
+        entry = data.get(str(camera_id))
+        homography = None
+        floor_y = 0.0
+        if entry:
+            homography = entry.get('homography')
+            if homography is None:
+                homography = homography_from_points(entry['image_points'], entry['world_points'])
+            floor_y = entry.get('floor_y', 0.0)
+        calibrations[camera_id] = CameraCalibration(position, homography, floor_y)
+    return calibrations
+
+
+class DetectionFusion:
+    """
+    Fusión de detecciones entre cámaras en coordenadas del mundo.
+
+    Cada detección (camera_id, track_id) se proyecta al piso y se asocia a un
+    track fusionado: primero por la asociación que ya tenía ese track de la
+    cámara, y si no, al track fusionado más cercano dentro de gate_distance.
+    Los tracks fusionados llevan posición y velocidad con un filtro alfa-beta,
+    y cada uno se emite como un solo evento cada emit_interval segundos.
+    """
+
+    def __init__(self, calibrations, gate_distance=3.0, max_age=2.0, emit_interval=0.25,
+                 alpha=0.5, beta=0.1):
+        self.calibrations = calibrations
+        self.gate_distance = gate_distance
+        self.max_age = max_age
+        self.emit_interval = emit_interval
+        self.alpha = alpha
+        self.beta = beta
+
+        self.lock = threading.Lock()
+        self.next_id = 1
+        self.tracks = {}  # fused_id -> estado del track
+        self.source_map = {}  # (camera_id, track_id) -> fused_id
+
+    def update(self, detections, current_time):
+        """
+        detections: lista de dicts de StaticCameras (camera_id, track_id,
+        position normalizada, confidence). Devuelve la lista de eventos
+        fusionados que hay que entregar al controlador (puede estar vacía).
+        """
+        by_camera = {}
+        for detection in detections:
+            camera_id = detection.get('camera_id')
+            if camera_id in self.calibrations:
+                by_camera.setdefault(camera_id, []).append(detection)
+
+        events = []
+        with self.lock:
+            self._prune(current_time)
+            for camera_id, camera_detections in by_camera.items():
+                world = self.calibrations[camera_id].project(
+                    [[d['position']['x'], d['position']['y']] for d in camera_detections])
+                self._associate(camera_id, camera_detections, world, current_time)
+
+            for fused_id, track in self.tracks.items():
+                if track['updated'] == current_time and \
+                        current_time - track['last_emitted'] >= self.emit_interval:
+                    track['last_emitted'] = current_time
+                    events.append(self._event(fused_id, track, current_time))
+        return events
+
+    def _associate(self, camera_id, detections, world, current_time):
+        fused_ids = list(self.tracks)
+        assigned = set()
+        unmatched = []
+
+        # 1. Mantener la asociación previa de (camera_id, track_id) si sigue dentro del gate
+        for i, detection in enumerate(detections):
+            key = (camera_id, detection.get('track_id'))
+            fused_id = self.source_map.get(key)
+            if fused_id in self.tracks and fused_id not in assigned and \
+                    np.linalg.norm(self._predict(self.tracks[fused_id], current_time) - world[i]) <= self.gate_distance:
+                assigned.add(fused_id)
+                self._correct(fused_id, world[i], detection, key, current_time)
+            else:
+                unmatched.append(i)
+
+        # 2. Asignación greedy por distancia con gate para las demás
+        candidates = [f for f in fused_ids if f not in assigned]
+        if unmatched and candidates:
+            predicted = np.array([self._predict(self.tracks[f], current_time) for f in candidates])
+            distances = np.linalg.norm(world[unmatched][:, None, :] - predicted[None, :, :], axis=2)
+            rows, cols = np.nonzero(distances <= self.gate_distance)
+            order = np.argsort(distances[rows, cols], kind='stable')
+            used_rows = set()
+            for r, c in zip(rows[order], cols[order]):
+                fused_id = candidates[c]
+                if r in used_rows or fused_id in assigned:
+                    continue
+                used_rows.add(r)
+                assigned.add(fused_id)
+                i = unmatched[r]
+                key = (camera_id, detections[i].get('track_id'))
+                self._correct(fused_id, world[i], detections[i], key, current_time)
+            unmatched = [i for r, i in enumerate(unmatched) if r not in used_rows]
+
+        # 3. Las que no se asociaron abren un track nuevo
+        for i in unmatched:
+            key = (camera_id, detections[i].get('track_id'))
+            fused_id = self.next_id
+            self.next_id += 1
+            self.tracks[fused_id] = {
+                'position': world[i].copy(),
+                'velocity': np.zeros(3),
+                'updated': current_time,
+                'last_emitted': 0.0,
+                'confidence': float(detections[i].get('confidence', 0.0)),
+                'sources': {key}
+            }
+            self.source_map[key] = fused_id
+            logger.info(f"New intruder track {fused_id} from camera {camera_id}")
+
+    def _predict(self, track, current_time):
+        return track['position'] + track['velocity'] * (current_time - track['updated'])
+
+    def _correct(self, fused_id, measurement, detection, key, current_time):
+        track = self.tracks[fused_id]
+        dt = current_time - track['updated']
+        predicted = self._predict(track, current_time)
+        residual = measurement - predicted
+        track['position'] = predicted + self.alpha * residual
+        if dt > 1e-3:
+            track['velocity'] = track['velocity'] + self.beta * residual / dt
+        track['updated'] = current_time
+        track['confidence'] = max(0.8 * track['confidence'], float(detection.get('confidence', 0.0)))
+        track['sources'].add(key)
+        self.source_map[key] = fused_id
+
+    def _prune(self, current_time):
+        stale = [f for f, t in self.tracks.items() if current_time - t['updated'] > self.max_age]
+        for fused_id in stale:
+            for key in self.tracks.pop(fused_id)['sources']:
+                if self.source_map.get(key) == fused_id:
+                    del self.source_map[key]
+
+    def _event(self, fused_id, track, current_time):
+        x, y, z = track['position']
+        vx, vy, vz = track['velocity']
+        return {
+            'type': 'intruder',
+            'track_id': fused_id,
+            'position': {'x': float(x), 'y': float(y), 'z': float(z)},
+            'velocity': {'x': float(vx), 'y': float(vy), 'z': float(vz)},
+            'confidence': track['confidence'],
+            'cameras': sorted({camera_id for camera_id, _ in track['sources']}),
+            'timestamp': current_time
+        }
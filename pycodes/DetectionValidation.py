@@ -0,0 +1,94 @@
+import numpy as np
+from collections import defaultdict
+from ServiceProfiler import timed
+#this code is called DetectionValidation.py and is in the folder pycodes
+#it has the temporal validation of the static camera detections (a track has to be seen for some time
+#without jumping before it is sent to unity), separated so it can be replayed offline by DetectionEvaluation.py
+
+
+class DetectionValidator:
+    """
+    Historia temporal de cada track (camera_id, track_id). Una detección se
+    confirma cuando su track se vio de forma continua al menos
+    min_detection_time segundos sin cambios de posición mayores a
+    max_position_change (posición normalizada). El tiempo lo da quien llama,
+    así que funciona igual en vivo y sobre frames grabados.
+    """
+
+    def __init__(self, min_detection_time=0.1, max_position_change=1000, cleanup_interval=5.0,
+                 history_size=10):
+        self.min_detection_time = min_detection_time  # Tiempo mínimo de detección continua (segundos)
+        self.max_position_change = max_position_change  # Cambio máximo permitido entre frames
+        self.cleanup_interval = cleanup_interval  # Intervalo para limpiar detecciones antiguas
+        self.history_size = history_size
+        self.history = defaultdict(lambda: defaultdict(dict))
+        self.last_cleanup_time = None
+
+    @timed('static_camera.is_valid')
+    def is_valid(self, camera_id, track_id, position, current_time):
+        """
+        Verifica si una detección es válida basada en su historia temporal y movimiento
+        """
+        history = self.history[camera_id][track_id]
+
+        # Si es una nueva detección
+        if not history:
+            history['first_seen'] = current_time
+            history['last_seen'] = current_time
+            history['positions'] = [position]
+            history['confirmed'] = False
+            return False
+
+        # Actualizar último tiempo visto
+        history['last_seen'] = current_time
+
+        # Verificar si el movimiento es realista
+        if history['positions']:
+            last_position = history['positions'][-1]
+            position_change = np.sqrt(
+                (position['x'] - last_position['x'])**2 +
+                (position['y'] - last_position['y'])**2
+            )
+
+            # Si el cambio de posición es muy grande, podría ser un falso positivo
+            if position_change > self.max_position_change:
+                history['positions'] = [position]  # Reiniciar tracking
+                history['first_seen'] = current_time
+                history['confirmed'] = False
+                return False
+
+        # Actualizar historial de posiciones
+        history['positions'].append(position)
+        if len(history['positions']) > self.history_size:  # Mantener solo las últimas posiciones
+            history['positions'].pop(0)
+
+        # Si ya está confirmada, mantener la confirmación
+        if history['confirmed']:
+            return True
+
+        # Si cumple el tiempo mínimo, confirmar la detección
+        if current_time - history['first_seen'] >= self.min_detection_time:
+            history['confirmed'] = True
+            return True
+
+        return False
+
+    def tracking_time(self, camera_id, track_id, current_time):
+        return current_time - self.history[camera_id][track_id]['first_seen']
+
+    def cleanup(self, current_time):
+        """
+        Limpia detecciones antiguas que ya no están activas
+        """
+        if self.last_cleanup_time is None:
+            self.last_cleanup_time = current_time
+        if current_time - self.last_cleanup_time < self.cleanup_interval:
+            return
+
+        self.last_cleanup_time = current_time
+
+        for camera_id in list(self.history.keys()):
+            for track_id in list(self.history[camera_id].keys()):
+                history = self.history[camera_id][track_id]
+                if current_time - history['last_seen'] > self.min_detection_time:
+                    del self.history[camera_id][track_id]
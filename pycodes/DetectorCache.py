@@ -0,0 +1,78 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+#this code is called DetectorCache.py and is in the folder pycodes
+#unity resends the same frame when nothing moves in front of a static camera,
+#this cache keeps the detector output by frame content so the same frame is not run through yolo twice
+
+_MISSING = object()
+
+
+class DetectorCache:
+    """
+    Cache LRU de la salida del detector indexada por el contenido del frame.
+
+    Por defecto la llave es un hash de los bytes JPEG recibidos (solo frames
+    idénticos comparten resultado). Con perceptual=True la llave es un hash
+    promedio del frame reducido a hash_size x hash_size, que también junta
+    frames re-codificados casi iguales; es más agresivo y puede reutilizar
+    detecciones de frames con movimientos muy pequeños.
+
+    Las entradas y los contadores de aciertos/fallos se llevan por cámara:
+    dos cámaras con el mismo frame (o el mismo hash perceptual) no comparten
+    detecciones.
+    """
+
+    def __init__(self, max_entries=256, perceptual=False, hash_size=16):
+        self.max_entries = max_entries
+        self.perceptual = perceptual
+        self.hash_size = hash_size
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = {}
+        self.misses = {}
+
+    def key(self, data=None, frame=None):
+        """Llave del frame: bytes codificados, o el frame decodificado si es perceptual"""
+        if self.perceptual and frame is not None:
+            small = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY),
+                               (self.hash_size, self.hash_size), interpolation=cv2.INTER_AREA)
+            return np.packbits(small > small.mean()).tobytes()
+        return hashlib.blake2b(data, digest_size=16).digest()
+
+    def get(self, camera_id, key):
+        """Devuelve (hit, detections); detections puede ser None si el frame no tenía detecciones"""
+        with self.lock:
+            entry = (camera_id, key)
+            value = self.entries.get(entry, _MISSING)
+            if value is _MISSING:
+                self.misses[camera_id] = self.misses.get(camera_id, 0) + 1
+                return False, None
+            self.entries.move_to_end(entry)
+            self.hits[camera_id] = self.hits.get(camera_id, 0) + 1
+            return True, value
+
+    def put(self, camera_id, key, detections):
+        with self.lock:
+            entry = (camera_id, key)
+            self.entries[entry] = detections
+            self.entries.move_to_end(entry)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        """{camera_id: {'hits', 'misses', 'hit_rate'}}"""
+        with self.lock:
+            cameras = sorted(set(self.hits) | set(self.misses))
+            stats = {}
+            for camera_id in cameras:
+                hits = self.hits.get(camera_id, 0)
+                misses = self.misses.get(camera_id, 0)
+                stats[camera_id] = {
+                    'hits': hits,
+                    'misses': misses,
+                    'hit_rate': hits / (hits + misses) if hits + misses else 0.0
+                }
+            return stats
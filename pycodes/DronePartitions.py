@@ -0,0 +1,339 @@
+import socket
+import selectors
+import threading
+import multiprocessing
+import http.client
+import argparse
+import time
+import logging
+import json
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, request, jsonify
+import EnvironmentConfig
+from ExplorationPlanner import ExplorationPlanner
+from PathPlanner import NavigationGraph
+from ServiceMetrics import counter, gauge, histogram, start_metrics_server
+#this code is called DronePartitions.py and is in the folder pycodes
+#it runs the drone fleet of controller4.py split in several DroneModel worker processes
+#each worker owns the drones with index % partitions == k, and a front router on the usual ports
+#(flask 5000, detections 5556/5557) splits /get_decisions by drone and merges the answers
+#the router also owns the only ExplorationPlanner, so coverage and claimed waypoints are fleet-wide
+#
+#   python DronePartitions.py --drones 12 --partitions 4
+
+logger = logging.getLogger(__name__)
+
+WORKER_HTTP_PORT = 5100  # worker k: http 5100 + k
+WORKER_DETECTION_PORT = 6000  # worker k: 6000 + 2k (cámaras estáticas) y 6001 + 2k (drones)
+
+ROUTER_DECISION_SECONDS = histogram('drone_router_decision_seconds', 'Time to answer /get_decisions in the router')
+PARTITION_ERRORS = counter('drone_router_partition_errors_total', 'Failed requests to a partition', ['partition'])
+DETECTIONS_FORWARDED = counter('drone_router_detections_forwarded_total', 'Detection datagrams forwarded', ['source'])
+EXPLORATION_COVERAGE = gauge('drone_router_exploration_coverage', 'Fraction of the map covered recently by the fleet')
+
+
+def partition_drones(n_drones, partitions):
+    """Índices globales de los drones de cada partición"""
+    return [list(range(k, n_drones, partitions)) for k in range(partitions)]
+
+
+def worker_ports(k):
+    return {
+        'http_port': WORKER_HTTP_PORT + k,
+        'detection_port': WORKER_DETECTION_PORT + 2 * k,
+        'dron_detection_port': WORKER_DETECTION_PORT + 2 * k + 1
+    }
+
+
+class RemoteExplorer:
+    """
+    Lo que usa DroneAgent de ExplorationPlanner, pero las asignaciones las hace
+    el planificador del router: un planificador por worker no vería la
+    cobertura ni las reservas de los drones de otras particiones. El router
+    marca la cobertura con las posiciones de cada /get_decisions, así que
+    update() no hace nada aquí.
+    """
+
+    def __init__(self, drone_ids, bounds, cell_size, host='127.0.0.1', port=5000, timeout=1.0):
+        self.drone_ids = drone_ids  # id del agente en este worker -> índice del drone en la flota
+        self.min_x, self.min_z = bounds[0], bounds[2]
+        self.cell_size = cell_size
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.claims = {}  # id del agente -> waypoint asignado por el router
+        self.last_coverage = 0.0
+
+    def _request(self, path, payload):
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            connection.request('POST', path, json.dumps(payload), {'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            result = json.loads(response.read())
+            if response.status != 200:
+                raise RuntimeError(result.get('error', response.status))
+            return result
+        finally:
+            connection.close()
+
+    def _cell(self, position):
+        return (int((position['x'] - self.min_x) // self.cell_size),
+                int((position['z'] - self.min_z) // self.cell_size))
+
+    def update(self, drone_id, position, now):
+        pass
+
+    def assign(self, drone_id, position, now):
+        try:
+            result = self._request('/exploration/assign', {'drone': self.drone_ids[drone_id], 'position': position})
+        except Exception as e:
+            # Sin router el drone explora como antes, sin waypoint
+            logger.error(f"Exploration assignment failed: {e}")
+            self.claims.pop(drone_id, None)
+            return None
+        self.last_coverage = result['coverage']
+        if result['target'] is None:
+            self.claims.pop(drone_id, None)
+        else:
+            self.claims[drone_id] = result['target']
+        return result['target']
+
+    def reached(self, drone_id, position):
+        target = self.claims.get(drone_id)
+        return target is not None and self._cell(position) == self._cell(target)
+
+    def release(self, drone_id):
+        if self.claims.pop(drone_id, None) is None:
+            return
+        try:
+            self._request('/exploration/release', {'drone': self.drone_ids[drone_id]})
+        except Exception as e:
+            logger.error(f"Exploration release failed: {e}")
+
+    def coverage(self):
+        return self.last_coverage
+
+
+def run_worker(k, n_drones, metrics_port=None, drone_ids=None, router_port=None):
+    """Proceso worker: un DroneModel con sus drones y el /get_decisions de controller4"""
+    import controller4
+
+    ports = worker_ports(k)
+    model = controller4.create_model({
+        'n_drones': n_drones,
+        'detection_port': ports['detection_port'],
+        'dron_detection_port': ports['dron_detection_port'],
+        'command_port': None,
+        'metrics_port': metrics_port,
+        # Un planificador por worker no vería a las otras particiones: lo tiene el router
+        'exploration': None
+    })
+    if router_port is not None:
+        model.explorer = RemoteExplorer(dict(zip((agent.id for agent in model.agents), drone_ids)),
+                                        model.navigation.bounds, model.navigation.cell_size, port=router_port)
+    logger.info(f"Partition {k} with {n_drones} drones on port {ports['http_port']}")
+    try:
+        controller4.app.run(host='127.0.0.1', port=ports['http_port'], threaded=True)
+    finally:
+        controller4.drone_model.end()
+
+
+class DroneRouter:
+    """
+    Frente de las particiones. /get_decisions se parte por drone (el índice en
+    agentStates), cada parte va a su worker en paralelo y las respuestas se
+    vuelven a poner en el orden original.
+
+    Las detecciones de cámaras estáticas y de drones se reenvían a todas las
+    particiones: en controller4 cada detección la procesan todos los drones,
+    así que todas las particiones tienen drones que la necesitan.
+
+    El router tiene el único ExplorationPlanner de la flota (exploration=False
+    lo desactiva): actualiza la cobertura con todas las posiciones antes de
+    repartir el request, y los workers le piden los waypoints (RemoteExplorer).
+    """
+
+    def __init__(self, n_drones, partitions, host='127.0.0.1', timeout=2.0, exploration=True):
+        self.n_drones = n_drones
+        self.partitions = partitions
+        self.host = host
+        self.timeout = timeout
+        self.owned = partition_drones(n_drones, partitions)
+        self.explorer = None
+        if exploration:
+            # El mismo grid que los workers (navigation_map.json); el router no planea caminos
+            navigation = NavigationGraph.load(EnvironmentConfig.current(), landmarks=0)
+            self.explorer = ExplorationPlanner(navigation.bounds, cell_size=navigation.cell_size,
+                                               free=navigation.free)
+            EXPLORATION_COVERAGE.set_function(self.explorer.coverage)
+        self.pool = ThreadPoolExecutor(max_workers=partitions, thread_name_prefix="Partition")
+        self.connections = threading.local()
+        self.running = True
+
+    def _connection(self, k):
+        # Una conexión HTTP persistente por hilo y partición
+        connections = getattr(self.connections, 'by_partition', None)
+        if connections is None:
+            connections = self.connections.by_partition = {}
+        if k not in connections:
+            connections[k] = http.client.HTTPConnection(self.host, worker_ports(k)['http_port'],
+                                                        timeout=self.timeout)
+        return connections[k]
+
+    def _post(self, k, agent_states):
+        body = json.dumps({'agentStates': agent_states})
+        for attempt in range(2):
+            connection = self._connection(k)
+            try:
+                connection.request('POST', '/get_decisions', body, {'Content-Type': 'application/json'})
+                response = connection.getresponse()
+                result = json.loads(response.read())
+                if response.status != 200:
+                    raise RuntimeError(result.get('error', response.status))
+                return result['decisions']
+            except (http.client.HTTPException, ConnectionError, OSError):
+                # Conexión vieja cerrada por el worker: reintentar una vez con una nueva
+                connection.close()
+                del self.connections.by_partition[k]
+                if attempt:
+                    raise
+
+    def get_decisions(self, world_state):
+        agent_states = world_state['agentStates']
+        if self.explorer:
+            now = time.time()
+            for i, agent_state in enumerate(agent_states[:self.n_drones]):
+                self.explorer.update(i, agent_state['state']['position'], now)
+        batches = []
+        for k, indices in enumerate(self.owned):
+            indices = [i for i in indices if i < len(agent_states)]
+            if indices:
+                batches.append((k, indices, self.pool.submit(self._post, k, [agent_states[i] for i in indices])))
+
+        decisions = [None] * min(len(agent_states), self.n_drones)
+        for k, indices, future in batches:
+            try:
+                for i, decision in zip(indices, future.result()):
+                    decisions[i] = decision
+            except Exception as e:
+                PARTITION_ERRORS.labels(k).inc()
+                logger.error(f"Partition {k} failed: {e}")
+        # Un drone sin respuesta de su partición se queda quieto en este paso
+        return [d if d is not None else {"decision": "continue", "target": None} for d in decisions]
+
+    def _forward_detections(self, listen_ports):
+        """Un hilo para los dos puertos de detecciones, reenvía cada datagrama a todas las particiones"""
+        selector = selectors.DefaultSelector()
+        out = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        for source, port, offset in listen_ports:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind(('0.0.0.0', port))
+            sock.setblocking(False)
+            selector.register(sock, selectors.EVENT_READ, (source, offset))
+
+        while self.running:
+            for key, _ in selector.select(timeout=1.0):
+                source, offset = key.data
+                try:
+                    data = key.fileobj.recv(65535)
+                except BlockingIOError:
+                    continue
+                for k in range(self.partitions):
+                    out.sendto(data, (self.host, WORKER_DETECTION_PORT + 2 * k + offset))
+                DETECTIONS_FORWARDED.labels(source).inc()
+
+        for key in list(selector.get_map().values()):
+            key.fileobj.close()
+        selector.close()
+        out.close()
+
+    def start_forwarding(self, detection_port=5556, dron_detection_port=5557):
+        thread = threading.Thread(
+            target=self._forward_detections,
+            args=([('static_camera', detection_port, 0), ('drone', dron_detection_port, 1)],),
+            name="DetectionForwarder"
+        )
+        thread.daemon = True
+        thread.start()
+
+    def wait_for_workers(self, timeout=60.0):
+        deadline = time.monotonic() + timeout
+        for k in range(self.partitions):
+            while True:
+                try:
+                    socket.create_connection((self.host, worker_ports(k)['http_port']), timeout=1.0).close()
+                    break
+                except OSError:
+                    if time.monotonic() > deadline:
+                        raise RuntimeError(f"Partition {k} did not start")
+                    time.sleep(0.5)
+
+
+def create_router_app(router):
+    app = Flask(__name__)
+
+    @app.route('/get_decisions', methods=['POST'])
+    @ROUTER_DECISION_SECONDS.time()
+    def get_decisions():
+        try:
+            decisions = router.get_decisions(request.get_json())
+            return jsonify({"decisions": decisions})
+        except Exception as e:
+            logger.error(f"Decision routing error: {e}")
+            return jsonify({"error": str(e)}), 500
+
+    # Planificador de exploración compartido (lo llaman los RemoteExplorer de los workers)
+    @app.route('/exploration/assign', methods=['POST'])
+    def exploration_assign():
+        if router.explorer is None:
+            return jsonify({"error": "exploration is disabled"}), 404
+        body = request.get_json()
+        target = router.explorer.assign(body['drone'], body['position'], time.time())
+        return jsonify({"target": target, "coverage": router.explorer.coverage()})
+
+    @app.route('/exploration/release', methods=['POST'])
+    def exploration_release():
+        if router.explorer is not None:
+            router.explorer.release(request.get_json()['drone'])
+        return jsonify({})
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="controller4 con la flota repartida en varios procesos")
+    parser.add_argument('--drones', type=int, default=4)
+    parser.add_argument('--partitions', type=int, default=max(1, multiprocessing.cpu_count() // 2))
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--metrics-port', type=int, default=9105, help="router; los workers usan el siguiente")
+    parser.add_argument('--no-exploration-planner', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    partitions = max(1, min(args.partitions, args.drones))
+    workers = []
+    for k, indices in enumerate(partition_drones(args.drones, partitions)):
+        process = multiprocessing.Process(
+            target=run_worker,
+            args=(k, len(indices), args.metrics_port + 1 + k, indices,
+                  None if args.no_exploration_planner else args.port),
+            name=f"DronePartition-{k}"
+        )
+        process.start()
+        workers.append(process)
+
+    router = DroneRouter(args.drones, partitions, exploration=not args.no_exploration_planner)
+    try:
+        router.wait_for_workers()
+        router.start_forwarding()
+        start_metrics_server(args.metrics_port)
+        logger.info(f"Routing {args.drones} drones over {partitions} partitions")
+        create_router_app(router).run(host='0.0.0.0', port=args.port, threaded=True)
+    finally:
+        router.running = False
+        for process in workers:
+            process.terminate()
+            process.join()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+import argparse
+import logging
+import math
+import json
+import time
+from functools import lru_cache
+from controller4 import DroneModel, decide
+from PathPlanner import NavigationGraph
+from ServiceLogging import configure
+#this code is called DroneSimulation.py and is in the folder pycodes
+#it runs the decision logic of controller4.py without Unity: simulated clock, simulated drones with
+#simple kinematics and synthetic intruders seen by the static cameras and the drone cameras
+#everything runs in discrete ticks as fast as the CPU allows and the same seed gives the same run
+#
+#   python DroneSimulation.py --drones 4 --hours 10 --seed 1
+
+logger = logging.getLogger(__name__)
+
+
+class SimClock:
+    """Reloj inyectable: DroneModel lo llama como a time.time"""
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, dt):
+        self.now += dt
+
+
+class SimulatedDrone:
+    """Cinemática simple: vuela en línea recta al objetivo de la última decisión"""
+
+    def __init__(self, position, speed=6.0, climb_rate=2.0, cruise_altitude=3.0):
+        self.position = dict(position)
+        self.speed = speed
+        self.climb_rate = climb_rate
+        self.cruise_altitude = cruise_altitude
+        self.goal = None
+        self.distance = 0.0
+
+    def apply(self, decision, random, bounds):
+        """Lo mismo que hace RobotWorld2.cs con cada decisión"""
+        kind = decision['decision']
+        if kind == 'takeoff':
+            self.goal = dict(self.position, y=self.cruise_altitude)
+        elif kind == 'land':
+            self.goal = dict(self.position, y=0.0)
+        elif kind in ('move_to_target', 'explore_waypoint'):
+            waypoints = decision.get('waypoints')
+            target = waypoints[0] if waypoints else decision['target']
+            if target and 'z' in target:
+                self.goal = {'x': target['x'], 'y': self.cruise_altitude, 'z': target['z']}
+        elif kind == 'move_to_target_human':
+            self.goal = None
+        elif kind == 'explore':
+            # La exploración de Unity sin planificador: un punto al azar del mapa
+            self.goal = {'x': random.uniform(bounds[0], bounds[1]), 'y': self.cruise_altitude,
+                         'z': random.uniform(bounds[2], bounds[3])}
+
+    def move(self, dt):
+        if self.goal is None:
+            return
+        dx = self.goal['x'] - self.position['x']
+        dz = self.goal['z'] - self.position['z']
+        dy = self.goal['y'] - self.position['y']
+        horizontal = math.hypot(dx, dz)
+        step = min(horizontal, self.speed * dt)
+        if horizontal > 1e-9:
+            self.position['x'] += dx / horizontal * step
+            self.position['z'] += dz / horizontal * step
+        climb = max(-self.climb_rate * dt, min(self.climb_rate * dt, dy))
+        self.position['y'] += climb
+        self.distance += step
+        if step >= horizontal and abs(dy) <= self.climb_rate * dt:
+            self.goal = None
+
+
+class Intruder:
+    """Camina entre puntos al azar del mapa hasta que lo intercepta un drone o se va"""
+
+    def __init__(self, intruder_id, position, spawn_time, lifetime):
+        self.id = intruder_id
+        self.position = position
+        self.spawn_time = spawn_time
+        self.leave_time = spawn_time + lifetime
+        self.first_seen = None
+        self.goal = position
+
+    def move(self, dt, speed, random, bounds):
+        dx = self.goal['x'] - self.position['x']
+        dz = self.goal['z'] - self.position['z']
+        distance = math.hypot(dx, dz)
+        if distance < 0.5:
+            self.goal = {'x': random.uniform(bounds[0], bounds[1]), 'y': 0.0,
+                         'z': random.uniform(bounds[2], bounds[3])}
+            return
+        step = min(distance, speed * dt)
+        self.position = {'x': self.position['x'] + dx / distance * step, 'y': 0.0,
+                         'z': self.position['z'] + dz / distance * step}
+
+
+@lru_cache(maxsize=4)
+def _shared_navigation(path, environment):
+    # Construir el grafo una vez por proceso (y snapshot) y no en cada corrida
+    return NavigationGraph.load(environment, path)
+
+
+def _percentile(values, q):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class SimulatedDroneModel(DroneModel):
+    """
+    DroneModel headless: las decisiones salen de la misma lógica de
+    DroneAgent, pero el tiempo avanza dt por step y Unity, las cámaras y
+    los intrusos se simulan. Los resultados quedan en model.reporters.
+
+    Parámetros además de los de DroneModel: dt, decision_interval (3 s como
+    RobotWorld2.cs), intruder_rate (por hora), intruder_lifetime, intruder_speed,
+    drone_speed, camera_range, camera_detect_prob, camera_interval,
+    drone_view_range, intercept_radius y seed.
+    """
+
+    headless = True
+
+    def setup(self):
+        super().setup()
+        self.clock = SimClock()
+        p = self.p
+        self.dt = p.get('dt', 0.5)
+        self.decision_every = max(1, round(p.get('decision_interval', 3.0) / self.dt))
+        self.camera_every = max(1, round(p.get('camera_interval', 0.5) / self.dt))
+        self.bounds = self.navigation.bounds
+
+        start = {'x': 0.7, 'y': 0.0, 'z': -6.2}  # posición inicial del drone en RobotWorld2.cs
+        self.drones = [SimulatedDrone(start, speed=p.get('drone_speed', 6.0)) for _ in self.agents]
+        self.intruders = []
+        self.next_intruder_id = 1
+        self.next_spawn = self._after(0.0)
+
+        self.intercept_times = []  # desde que una cámara lo ve hasta que llega un drone
+        self.spawned = self.intercepted = self.escaped = self.unseen = 0
+        self.coverage_samples = []
+
+    def _load_navigation(self, environment):
+        return _shared_navigation(self.p.get('navigation_file', 'navigation_map.json'), environment)
+
+    def _after(self, previous):
+        # Llegadas de Poisson con intruder_rate intrusos por hora
+        rate = self.p.get('intruder_rate', 6.0) / 3600.0
+        return previous + self.random.expovariate(rate) if rate > 0 else math.inf
+
+    def _spawn(self, now):
+        position = {'x': self.random.uniform(self.bounds[0], self.bounds[1]), 'y': 0.0,
+                    'z': self.random.uniform(self.bounds[2], self.bounds[3])}
+        self.intruders.append(Intruder(self.next_intruder_id, position, now,
+                                       self.p.get('intruder_lifetime', 600.0)))
+        self.next_intruder_id += 1
+        self.spawned += 1
+
+    def _static_camera_detections(self, now):
+        """Una detección por cámara que tenga al intruso en rango (formato de StaticCameras.py)"""
+        camera_range = self.p.get('camera_range', 25.0)
+        probability = self.p.get('camera_detect_prob', 0.7)
+        for intruder in self.intruders:
+            for camera_id, camera in self.environment.camera_positions.items():
+                if math.hypot(intruder.position['x'] - camera['x'], intruder.position['z'] - camera['z']) > camera_range:
+                    continue
+                if self.random.random() >= probability:
+                    continue
+                if intruder.first_seen is None:
+                    intruder.first_seen = now
+                self.ingest_static_detection({
+                    'camera_id': camera_id,
+                    'track_id': intruder.id,
+                    'position': {'x': 0.5, 'y': 0.5},
+                    'confidence': self.random.uniform(0.75, 0.99),
+                    'tracking_time': now - intruder.first_seen
+                }, now)
+
+    def _drone_camera_detections(self, now):
+        """Cámara de cada drone (formato de CameraController.py)"""
+        view_range = self.p.get('drone_view_range', 10.0)
+        for index, drone in enumerate(self.drones):
+            for intruder in self.intruders:
+                if math.hypot(intruder.position['x'] - drone.position['x'],
+                              intruder.position['z'] - drone.position['z']) <= view_range:
+                    self.ingest_drone_detection({
+                        'type': 'human',
+                        'agent_id': index,
+                        'confidence': self.random.uniform(0.85, 0.99),
+                        'position': {'x': 0.5, 'y': 0.5},
+                        'timestamp': now
+                    }, now)
+                    break
+
+    def _resolve_intruders(self, now):
+        radius = self.p.get('intercept_radius', 5.0)
+        remaining = []
+        for intruder in self.intruders:
+            caught = any(math.hypot(intruder.position['x'] - d.position['x'],
+                                    intruder.position['z'] - d.position['z']) <= radius for d in self.drones)
+            if caught:
+                self.intercepted += 1
+                self.intercept_times.append(now - (intruder.first_seen if intruder.first_seen is not None
+                                                   else intruder.spawn_time))
+            elif now >= intruder.leave_time:
+                self.escaped += 1
+                if intruder.first_seen is None:
+                    self.unseen += 1
+            else:
+                remaining.append(intruder)
+        self.intruders = remaining
+
+    def step(self):
+        now = self.clock()
+        tick = self.t  # agentpy cuenta los steps desde 1
+
+        while now >= self.next_spawn:
+            self._spawn(now)
+            self.next_spawn = self._after(self.next_spawn)
+        speed = self.p.get('intruder_speed', 1.5)
+        for intruder in self.intruders:
+            intruder.move(self.dt, speed, self.random, self.bounds)
+
+        if tick % self.camera_every == 0:
+            self._static_camera_detections(now)
+            self._drone_camera_detections(now)
+
+        if tick % self.decision_every == 0:
+            states = [{'state': {'position': dict(drone.position)}} for drone in self.drones]
+            for drone, decision in zip(self.drones, decide(self, states, now)):
+                drone.apply(decision, self.random, self.bounds)
+            if self.explorer:
+                self.coverage_samples.append(self.explorer.coverage())
+
+        for drone in self.drones:
+            drone.move(self.dt)
+        self._resolve_intruders(now)
+        self.clock.advance(self.dt)
+
+    def end(self):
+        super().end()
+        hours = self.clock() / 3600.0
+        self.report('simulated_hours', hours)
+        self.report('intruders', self.spawned)
+        self.report('intercepted', self.intercepted)
+        self.report('escaped', self.escaped)
+        self.report('never_seen', self.unseen)
+        self.report('intercept_rate', self.intercepted / self.spawned if self.spawned else float('nan'))
+        self.report('mean_time_to_intercept',
+                    sum(self.intercept_times) / len(self.intercept_times) if self.intercept_times else float('nan'))
+        self.report('p90_time_to_intercept', _percentile(self.intercept_times, 0.9))
+        self.report('mean_coverage',
+                    sum(self.coverage_samples) / len(self.coverage_samples) if self.coverage_samples else float('nan'))
+        self.report('distance_per_drone', sum(d.distance for d in self.drones) / max(1, len(self.drones)))
+
+
+def simulate(params, hours=1.0, seed=0):
+    """Corre una simulación y devuelve sus resultados como dict"""
+    params = dict(params)
+    steps = int(hours * 3600.0 / params.get('dt', 0.5))
+    model = SimulatedDroneModel(params)
+    model.run(steps=steps, seed=seed, display=False)
+    return dict(model.reporters)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="controller4 sin Unity, en tiempo simulado")
+    parser.add_argument('--drones', type=int, default=1)
+    parser.add_argument('--hours', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dt', type=float, default=0.5)
+    parser.add_argument('--intruder-rate', type=float, default=6.0, help="intrusos por hora")
+    parser.add_argument('--no-exploration-planner', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    # Los mensajes por decisión/detección no sirven a esta velocidad
+    configure(levels={'controller4': 'WARNING', 'DetectionFusion': 'WARNING', 'PathPlanner': 'WARNING'})
+    params = {'n_drones': args.drones, 'dt': args.dt, 'intruder_rate': args.intruder_rate}
+    if args.no_exploration_planner:
+        params['exploration'] = None
+
+    started = time.perf_counter()
+    results = simulate(params, hours=args.hours, seed=args.seed)
+    elapsed = time.perf_counter() - started
+    print(json.dumps(results, indent=2, default=float))
+    logger.warning(f"Simulated {args.hours} h in {elapsed:.1f} s ({args.hours * 3600 / elapsed:.0f}x real time)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import numpy as np
+import threading
+import logging
+import time
+import json
+import os
+from types import MappingProxyType
+#this code is called EnvironmentConfig.py and is in the folder pycodes
+#it loads environment_config.json (camera positions, robot investigation points, patrol points) once
+#into an immutable snapshot with precomputed numpy tables, and swaps it when the file changes
+#controller4.py, controller3.py and Controller2.py read the cameras from here
+#
+#   {"cameras": {"0": {"position": {"x": .., "y": .., "z": ..}, "investigate": {"x": .., "y": .., "z": ..}}},
+#    "patrol_points": [{"x": .., "y": .., "z": ..}, ...],
+#    "map": {"min_x": .., "max_x": .., "min_z": .., "max_z": .., "cell_size": 5.0}}
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = 'environment_config.json'
+
+
+def _point(p):
+    return MappingProxyType({'x': float(p['x']), 'y': float(p['y']), 'z': float(p['z'])})
+
+
+def _readonly(array):
+    array.flags.writeable = False
+    return array
+
+
+class EnvironmentConfig:
+    """
+    Snapshot inmutable de la configuración. Todas las tablas se calculan al
+    cargar; quien lo usa toma current() una vez por request y lee de ahí,
+    así no ve mezcla de dos versiones si el archivo cambia a mitad.
+    """
+
+    def __init__(self, data, version=0):
+        cameras = data['cameras']
+        self.version = version
+        self.camera_ids = tuple(sorted(int(camera_id) for camera_id in cameras))
+        self.index = MappingProxyType({camera_id: i for i, camera_id in enumerate(self.camera_ids)})
+
+        # Posición de la cámara (destino de los drones) y punto del piso donde investiga el robot
+        self.camera_positions = MappingProxyType(
+            {camera_id: _point(cameras[str(camera_id)]['position']) for camera_id in self.camera_ids}
+        )
+        self.investigation_points = MappingProxyType(
+            {camera_id: _point(cameras[str(camera_id)].get('investigate', cameras[str(camera_id)]['position']))
+             for camera_id in self.camera_ids}
+        )
+
+        self.positions = _readonly(np.array(
+            [[p['x'], p['y'], p['z']] for p in self.camera_positions.values()], dtype=np.float64
+        ).reshape(-1, 3))
+        self.distances = _readonly(
+            np.linalg.norm(self.positions[:, None, :] - self.positions[None, :, :], axis=2)
+        )
+
+        # Sin patrol_points se patrulla entre los puntos de investigación
+        patrol = data.get('patrol_points') or list(self.investigation_points.values())
+        self.patrol_points = tuple(_point(p) for p in patrol)
+        self.patrol = _readonly(np.array(
+            [[p['x'], p['y'], p['z']] for p in self.patrol_points], dtype=np.float64
+        ).reshape(-1, 3))
+        # Límites del mapa en x/z (planificadores); sin "map" se toman los puntos conocidos con margen
+        points = np.vstack([self.positions, self.patrol])
+        map_config = data.get('map') or {}
+        margin = float(map_config.get('margin', 10.0))
+        self.map_bounds = (
+            float(map_config.get('min_x', points[:, 0].min() - margin)),
+            float(map_config.get('max_x', points[:, 0].max() + margin)),
+            float(map_config.get('min_z', points[:, 2].min() - margin)),
+            float(map_config.get('max_z', points[:, 2].max() + margin))
+        )
+        self.cell_size = float(map_config.get('cell_size', 5.0))
+
+        camera_to_patrol = np.linalg.norm(self.positions[:, None, :] - self.patrol[None, :, :], axis=2)
+        self.nearest_patrol = _readonly(
+            camera_to_patrol.argmin(axis=1) if len(self.patrol) else np.zeros(len(self.camera_ids), dtype=np.int64)
+        )
+
+    # Los puntos se devuelven como dict nuevo: se mandan a Unity en JSON y el snapshot no se toca
+    def camera_position(self, camera_id):
+        return dict(self.camera_positions[camera_id])
+
+    def investigation_point(self, camera_id):
+        return dict(self.investigation_points[camera_id])
+
+    def nearest_patrol_point(self, camera_id):
+        return dict(self.patrol_points[self.nearest_patrol[self.index[camera_id]]])
+
+    def closest_cameras(self, camera_id, k=None):
+        """Ids de las otras cámaras ordenadas por distancia"""
+        row = self.distances[self.index[camera_id]]
+        order = [self.camera_ids[i] for i in np.argsort(row, kind='stable') if self.camera_ids[i] != camera_id]
+        return order if k is None else order[:k]
+
+
+_current = None
+_lock = threading.Lock()
+_listeners = []
+_watched = set()
+
+
+def load(path=DEFAULT_PATH):
+    """Lee el archivo y publica el snapshot nuevo; si el archivo es inválido queda el anterior"""
+    global _current
+    with open(path) as f:
+        data = json.load(f)
+    with _lock:
+        version = 0 if _current is None else _current.version + 1
+        config = EnvironmentConfig(data, version)
+        # Una sola asignación: los lectores ven el snapshot viejo o el nuevo completo
+        _current = config
+        listeners = list(_listeners)
+    logger.info(f"Environment configuration v{config.version} loaded from {path} "
+                f"({len(config.camera_ids)} cameras, {len(config.patrol_points)} patrol points)")
+    for callback in listeners:
+        try:
+            callback(config)
+        except Exception as e:
+            logger.error(f"Environment configuration listener failed: {e}")
+    return config
+
+
+def current(path=DEFAULT_PATH):
+    """Snapshot actual; la primera llamada carga el archivo"""
+    config = _current
+    if config is None:
+        config = load(path)
+    return config
+
+
+def subscribe(callback):
+    """callback(config) se llama después de cada recarga"""
+    with _lock:
+        _listeners.append(callback)
+
+
+def unsubscribe(callback):
+    """Deja de llamar a callback; no hace nada si no estaba suscrito"""
+    with _lock:
+        if callback in _listeners:
+            _listeners.remove(callback)
+
+
+def watch(path=DEFAULT_PATH, interval=2.0):
+    """Carga el archivo y lo vuelve a leer cada vez que cambia su fecha de modificación"""
+    config = current(path)
+    with _lock:
+        if path in _watched:
+            return config
+        _watched.add(path)
+
+    def run():
+        last_mtime = os.path.getmtime(path)
+        while True:
+            time.sleep(interval)
+            try:
+                mtime = os.path.getmtime(path)
+                if mtime != last_mtime:
+                    last_mtime = mtime
+                    load(path)
+            except Exception as e:
+                logger.error(f"Could not reload environment configuration from {path}: {e}")
+
+    thread = threading.Thread(target=run, name="EnvironmentConfigWatcher")
+    thread.daemon = True
+    thread.start()
+    return config
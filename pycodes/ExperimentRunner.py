@@ -0,0 +1,193 @@
+import argparse
+import logging
+import math
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import agentpy as ap
+import pandas as pd
+from DroneSimulation import SimulatedDroneModel
+from ServiceLogging import configure
+#this code is called ExperimentRunner.py and is in the folder pycodes
+#it sweeps the decision parameters of controller4.py (timeouts, cooldowns, confidence thresholds)
+#over many seeded runs of DroneSimulation.py in parallel processes, using agentpy's Sample and
+#Experiment, and appends each finished batch of runs to a parquet file (csv if pyarrow is missing)
+#
+#   python ExperimentRunner.py --levels 3 --iterations 5 --hours 1 --out sweep.parquet
+#   python ExperimentRunner.py --vary target_timeout explore_cooldown --levels 8 --iterations 20
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+logger = logging.getLogger(__name__)
+
+# Rangos por defecto alrededor de los valores fijos de controller4.py
+PARAMETER_RANGES = {
+    'target_timeout': ap.Range(5.0, 20.0),  # 10
+    'human_detection_timeout': ap.Range(2.0, 10.0),  # 5
+    'explore_cooldown': ap.Range(5.0, 20.0),  # 10
+    'detection_cooldown': ap.Range(1.0, 6.0),  # 3
+    'target_confidence': ap.Range(0.6, 0.95),  # 0.8
+    'alert_confidence': ap.Range(0.8, 0.99),  # 0.9
+}
+
+# DroneSimulation.py no genera alertas de seguridad, así que alert_confidence no cambia
+# ninguna métrica: solo se barre si se pide con --vary
+DEFAULT_VARY = [name for name in PARAMETER_RANGES if name != 'alert_confidence']
+
+METRICS = ['intercept_rate', 'mean_time_to_intercept', 'p90_time_to_intercept', 'mean_coverage',
+           'distance_per_drone']
+
+_experiment = None
+
+
+def _init_worker(experiment):
+    # El experimento (modelo y muestra) se manda una vez por proceso, no con cada corrida
+    global _experiment
+    _experiment = experiment
+    configure(levels={'controller4': 'WARNING', 'DetectionFusion': 'WARNING', 'PathPlanner': 'WARNING',
+                      'EnvironmentConfig': 'WARNING'})
+
+
+def _run_batch(run_ids):
+    rows = []
+    for run_id in run_ids:
+        sample_id = 0 if run_id[0] is None else run_id[0]
+        results = _experiment._single_sim(run_id)
+        row = {'sample_id': sample_id, 'iteration': run_id[1] or 0}
+        row.update({k: v for k, v in _experiment.sample[sample_id].items() if k != 'seed'})
+        # Las semillas de agentpy son de 128 bits, no caben en int64
+        row.update({k: (str(v) if k == 'seed' else v)
+                    for k, v in results['reporters'].iloc[0].to_dict().items()})
+        rows.append(row)
+    return rows
+
+
+class ResultWriter:
+    """Agrega filas al archivo por bloques: un row group de parquet (o un trozo de csv) por flush"""
+
+    def __init__(self, path):
+        self.path = path
+        self.columnar = pq is not None and path.endswith('.parquet')
+        if not self.columnar and path.endswith('.parquet'):
+            self.path = path[:-len('.parquet')] + '.csv'
+            logger.warning(f"pyarrow not installed, writing {self.path} instead")
+        self.writer = None
+        self.schema = None
+        self.rows = 0
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def write(self, rows):
+        if not rows:
+            return
+        frame = pd.DataFrame(rows)
+        if self.columnar:
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self.writer is None:
+                self.schema = table.schema
+                self.writer = pq.ParquetWriter(self.path, self.schema)
+            self.writer.write_table(table.cast(self.schema))
+        else:
+            frame.to_csv(self.path, mode='a', header=self.rows == 0, index=False)
+        self.rows += len(rows)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+    def read(self):
+        return pd.read_parquet(self.path) if self.columnar else pd.read_csv(self.path)
+
+
+class StreamingExperiment(ap.Experiment):
+    """
+    ap.Experiment que corre en un pool de procesos y guarda los reporters de
+    cada corrida a medida que terminan, en vez de juntar todo en memoria al
+    final como Experiment.run. Las semillas por corrida son las de agentpy.
+    """
+
+    def stream(self, path, n_jobs=None, batch_size=8, flush_every=256, display=True):
+        n_jobs = n_jobs or multiprocessing.cpu_count()
+        batches = [self.run_ids[i:i + batch_size] for i in range(0, len(self.run_ids), batch_size)]
+        writer = ResultWriter(path)
+        pending_rows = []
+        started = time.perf_counter()
+        try:
+            with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(self,)) as pool:
+                # Pocos lotes en vuelo: la memoria no crece con el tamaño del barrido
+                queue = iter(batches)
+                running = set()
+                for batch in queue:
+                    running.add(pool.submit(_run_batch, batch))
+                    if len(running) >= 2 * n_jobs:
+                        break
+                while running:
+                    done, running = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        pending_rows.extend(future.result())
+                        batch = next(queue, None)
+                        if batch is not None:
+                            running.add(pool.submit(_run_batch, batch))
+                    if len(pending_rows) >= flush_every:
+                        writer.write(pending_rows)
+                        pending_rows = []
+                    if display:
+                        completed = writer.rows + len(pending_rows)
+                        elapsed = time.perf_counter() - started
+                        remaining = elapsed / completed * (self.n_runs - completed)
+                        print(f"\rCompleted: {completed}/{self.n_runs}, "
+                              f"estimated time remaining: {remaining:.0f} s", end='')
+            writer.write(pending_rows)
+        finally:
+            writer.close()
+        if display:
+            print("")
+        self.output.info['completed'] = True
+        self.output.info['run_time'] = time.perf_counter() - started
+        return writer
+
+
+def summarize(results, parameters):
+    """Métricas por combinación de parámetros, de menor a mayor tiempo de intercepción"""
+    summary = results.groupby(['sample_id'] + parameters)[METRICS].mean()
+    summary['runs'] = results.groupby(['sample_id'] + parameters).size()
+    return summary.sort_values(['mean_time_to_intercept', 'intercept_rate'], ascending=[True, False])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Barrido Monte Carlo de los parámetros de decisión")
+    parser.add_argument('--vary', nargs='+', default=DEFAULT_VARY, choices=list(PARAMETER_RANGES))
+    parser.add_argument('--levels', type=int, default=3, help="valores por parámetro (linspace) o n de saltelli")
+    parser.add_argument('--method', default='linspace', choices=['linspace', 'saltelli'])
+    parser.add_argument('--iterations', type=int, default=10, help="corridas (semillas) por combinación")
+    parser.add_argument('--hours', type=float, default=1.0, help="tiempo simulado por corrida")
+    parser.add_argument('--drones', type=int, default=2)
+    parser.add_argument('--dt', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--jobs', type=int, default=None)
+    parser.add_argument('--out', default='sweep.parquet')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    parameters = {name: PARAMETER_RANGES[name] for name in args.vary}
+    # Mismo seed en todas las combinaciones: cada una ve los mismos escenarios (números aleatorios
+    # comunes), así las diferencias vienen de los parámetros y no del azar
+    fixed = {'n_drones': args.drones, 'dt': args.dt, 'seed': args.seed,
+             'steps': int(math.ceil(args.hours * 3600.0 / args.dt))}
+    sample = ap.Sample(dict(parameters, **fixed), n=args.levels, method=args.method, randomize=False)
+    experiment = StreamingExperiment(SimulatedDroneModel, sample, iterations=args.iterations)
+    logger.info(f"{experiment.n_runs} runs of {args.hours} simulated hours")
+
+    writer = experiment.stream(args.out, n_jobs=args.jobs)
+    summary = summarize(writer.read(), list(parameters))
+    pd.set_option('display.width', 200)
+    print(summary.head(10).to_string())
+    logger.info(f"Results in {writer.path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import numpy as np
+import threading
+import heapq
+import logging
+#this code is called ExplorationPlanner.py and is in the folder pycodes
+#it keeps a coarse coverage grid of the map (x/z) updated with the positions reported by the drones
+#and gives each exploring drone a waypoint where it would cover the most area nobody has seen recently
+#controller4.py uses it for the explore decision
+
+logger = logging.getLogger(__name__)
+
+
+class ExplorationPlanner:
+    """
+    Grid de cobertura en el plano x/z.
+
+    Una celda queda cubierta cuando pasa un drone a menos de sensor_radius y
+    vuelve a estar descubierta revisit_interval segundos después de la última
+    visita. gain[c] es cuántas celdas descubiertas verías desde c; se mantiene
+    incrementalmente: solo se toca cuando una celda cambia de estado (el
+    vecindario de esa celda), nunca se recalcula todo el mapa.
+    """
+
+    def __init__(self, bounds, cell_size=5.0, sensor_radius=10.0, revisit_interval=120.0,
+                 distance_weight=0.5, claim_radius=15.0, free=None):
+        self.min_x, self.max_x, self.min_z, self.max_z = bounds
+        self.cell_size = cell_size
+        self.nx = max(1, int(np.ceil((self.max_x - self.min_x) / cell_size)))
+        self.nz = max(1, int(np.ceil((self.max_z - self.min_z) / cell_size)))
+        self.revisit_interval = revisit_interval
+        self.distance_weight = distance_weight
+        self.claim_cells = claim_radius / cell_size
+
+        # Celdas transitables (de un mapa de ocupación); por defecto todo el rectángulo
+        self.free = np.ones((self.nx, self.nz), dtype=bool) if free is None else np.asarray(free, dtype=bool)
+
+        r = int(np.ceil(sensor_radius / cell_size))
+        di, dj = np.mgrid[-r:r + 1, -r:r + 1]
+        inside = di ** 2 + dj ** 2 <= (sensor_radius / cell_size) ** 2
+        self.offsets = (di[inside], dj[inside])
+
+        # Celdas no transitables cuentan como cubiertas para siempre
+        self.covered = ~self.free
+        self.last_visit = np.full((self.nx, self.nz), -np.inf)
+        self.gain = np.zeros((self.nx, self.nz), dtype=np.int32)
+        for i, j in zip(*np.nonzero(self.free)):
+            self._adjust_gain(i, j, 1)
+
+        self.expiry = []  # heap (tiempo, i, j) de celdas cubiertas
+        self.claims = {}  # drone_id -> celda del waypoint asignado
+        self.centers_x = self.min_x + (np.arange(self.nx) + 0.5) * cell_size
+        self.centers_z = self.min_z + (np.arange(self.nz) + 0.5) * cell_size
+        self.lock = threading.Lock()
+
+    def _cell(self, position):
+        i = int((position['x'] - self.min_x) // self.cell_size)
+        j = int((position['z'] - self.min_z) // self.cell_size)
+        return min(max(i, 0), self.nx - 1), min(max(j, 0), self.nz - 1)
+
+    def _neighborhood(self, i, j):
+        ii = self.offsets[0] + i
+        jj = self.offsets[1] + j
+        valid = (ii >= 0) & (ii < self.nx) & (jj >= 0) & (jj < self.nz)
+        return ii[valid], jj[valid]
+
+    def _adjust_gain(self, i, j, delta):
+        # La celda (i, j) se ve desde todo su vecindario (el disco es simétrico)
+        ii, jj = self._neighborhood(i, j)
+        self.gain[ii, jj] += delta
+
+    def _expire(self, now):
+        while self.expiry and self.expiry[0][0] <= now:
+            _, i, j = heapq.heappop(self.expiry)
+            expires = self.last_visit[i, j] + self.revisit_interval
+            if expires > now:
+                # Se volvió a visitar después de entrar al heap
+                heapq.heappush(self.expiry, (expires, i, j))
+            elif self.covered[i, j]:
+                self.covered[i, j] = False
+                self._adjust_gain(i, j, 1)
+
+    def update(self, drone_id, position, now):
+        """Marca como cubierto el disco alrededor de la posición reportada"""
+        with self.lock:
+            self._expire(now)
+            ii, jj = self._neighborhood(*self._cell(position))
+            keep = self.free[ii, jj]
+            ii, jj = ii[keep], jj[keep]
+            self.last_visit[ii, jj] = now
+            newly = ~self.covered[ii, jj]
+            for i, j in zip(ii[newly], jj[newly]):
+                self.covered[i, j] = True
+                self._adjust_gain(i, j, -1)
+                heapq.heappush(self.expiry, (now + self.revisit_interval, int(i), int(j)))
+
+    def assign(self, drone_id, position, now):
+        """
+        Waypoint para el drone: celda descubierta que más área nueva deja ver,
+        penalizada por la distancia y lejos de los waypoints de otros drones.
+        Devuelve None si todo está cubierto.
+        """
+        with self.lock:
+            self._expire(now)
+            candidates = ~self.covered
+            for other, (ci, cj) in self.claims.items():
+                if other == drone_id:
+                    continue
+                di = np.arange(self.nx)[:, None] - ci
+                dj = np.arange(self.nz)[None, :] - cj
+                candidates &= di ** 2 + dj ** 2 > self.claim_cells ** 2
+            if not candidates.any():
+                self.claims.pop(drone_id, None)
+                return None
+
+            i0, j0 = self._cell(position)
+            distance = np.hypot(np.arange(self.nx)[:, None] - i0, np.arange(self.nz)[None, :] - j0)
+            score = np.where(candidates, self.gain - self.distance_weight * distance, -np.inf)
+            i, j = np.unravel_index(int(np.argmax(score)), score.shape)
+            self.claims[drone_id] = (int(i), int(j))
+            return {'x': float(self.centers_x[i]), 'y': position.get('y', 0.0), 'z': float(self.centers_z[j])}
+
+    def reached(self, drone_id, position):
+        """True si el drone ya llegó a la celda de su waypoint"""
+        with self.lock:
+            claim = self.claims.get(drone_id)
+        return claim is not None and self._cell(position) == claim
+
+    def release(self, drone_id):
+        with self.lock:
+            self.claims.pop(drone_id, None)
+
+    def coverage(self):
+        """Fracción de celdas transitables cubiertas"""
+        with self.lock:
+            free = self.free.sum()
+            return float((self.covered & self.free).sum() / free) if free else 1.0
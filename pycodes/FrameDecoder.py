@@ -0,0 +1,115 @@
+import cv2
+import numpy as np
+import logging
+#this code is called FrameDecoder.py and is in the folder pycodes
+#it decodes the jpeg frames that unity sends directly at a reduced scale (libjpeg DCT scaling)
+#so the receivers do not decode the full image just to resize it down afterwards
+
+logger = logging.getLogger(__name__)
+
+# Factores de reducción soportados por libjpeg y su flag de OpenCV
+REDUCED_FLAGS = {
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    1: cv2.IMREAD_COLOR,
+}
+
+# Marcadores SOF que no describen un frame (DHT, JPG, DAC)
+_NON_SOF_MARKERS = (0xC4, 0xC8, 0xCC)
+
+
+def jpeg_size(data):
+    """
+    Lee (ancho, alto) del encabezado SOF de un JPEG sin decodificarlo.
+    Devuelve None si no es un JPEG (sin SOI) o no se encuentra el encabezado.
+    """
+    if data[:2] != b'\xff\xd8':
+        return None
+    i = 2
+    n = len(data)
+    while i + 9 < n:
+        if data[i] != 0xFF:
+            i += 1
+            continue
+        marker = data[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            i += 2
+            continue
+        if 0xC0 <= marker <= 0xCF and marker not in _NON_SOF_MARKERS:
+            height = (data[i + 5] << 8) | data[i + 6]
+            width = (data[i + 7] << 8) | data[i + 8]
+            return width, height
+        length = (data[i + 2] << 8) | data[i + 3]
+        i += 2 + length
+    return None
+
+
+class FrameDecoder:
+    """
+    Decodifica frames JPEG al tamaño de entrada del detector.
+
+    Elige el mayor factor de reducción (1/2, 1/4, 1/8) que todavía deja la
+    imagen igual o más grande que target_size. Con resize=True termina con un
+    resize exacto sobre un buffer reutilizado del pool; esos arrays son válidos
+    hasta que se hagan pool_size decodificaciones más, quien necesite guardarlos
+    más tiempo debe copiarlos. Con resize=False devuelve la imagen reducida tal
+    cual (útil cuando solo se usan posiciones normalizadas).
+
+    Cada hilo receptor debe tener su propio FrameDecoder.
+    """
+
+    def __init__(self, target_size=(320, 240), resize=True, pool_size=4):
+        self.target_width, self.target_height = target_size
+        self.resize = resize
+        self.pool_size = pool_size
+        self._pool = [None] * pool_size
+        self._pool_index = 0
+        self._last_source_size = None
+        self._last_factor = 1
+
+    def _reduction_factor(self, data):
+        size = jpeg_size(data)
+        if size is None:
+            return 1
+        # La resolución de Unity casi nunca cambia, reutilizar la última decisión
+        if size == self._last_source_size:
+            return self._last_factor
+
+        width, height = size
+        factor = 1
+        for f in (8, 4, 2):
+            if width // f >= self.target_width and height // f >= self.target_height:
+                factor = f
+                break
+
+        logger.info(f"Decoding {width}x{height} frames at 1/{factor} scale "
+                    f"for {self.target_width}x{self.target_height} inference")
+        self._last_source_size = size
+        self._last_factor = factor
+        return factor
+
+    def _next_buffer(self):
+        buf = self._pool[self._pool_index]
+        if buf is None:
+            buf = np.empty((self.target_height, self.target_width, 3), dtype=np.uint8)
+            self._pool[self._pool_index] = buf
+        self._pool_index = (self._pool_index + 1) % self.pool_size
+        return buf
+
+    def decode(self, data):
+        """Decodifica bytes JPEG a BGR de target_size. Devuelve None si falla."""
+        factor = self._reduction_factor(data)
+        frame = cv2.imdecode(np.frombuffer(data, np.uint8), REDUCED_FLAGS[factor])
+        if frame is None:
+            return None
+
+        if not self.resize or (frame.shape[1] == self.target_width and
+                               frame.shape[0] == self.target_height):
+            return frame
+
+        return cv2.resize(frame, (self.target_width, self.target_height),
+                          dst=self._next_buffer())
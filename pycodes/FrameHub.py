@@ -0,0 +1,307 @@
+import socket
+import struct
+import selectors
+import argparse
+import threading
+import time
+import logging
+import os
+from collections import namedtuple, Counter
+from multiprocessing import shared_memory, resource_tracker
+from ServiceMetrics import counter, start_metrics_server
+#this code is called FrameHub.py and is in the folder pycodes
+#it binds the camera udp ports only once and shares the received jpeg datagrams with several local
+#consumers (StaticCameras.py, recorders, analytics) through a ring buffer in shared memory
+#each subscriber has its own read cursor; a slow subscriber skips ahead and never blocks the others
+#
+#   python FrameHub.py hub --cameras 4 --base-port 5124
+#   python StaticCameras.py          (with hub_name='camera_hub')
+#   python FrameHub.py record --out recordings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NAME = 'camera_hub'
+
+_HEADER_BYTES = 64
+_SLOT_HEADER = struct.Struct('<QqQd')  # seq, camera_id, length, timestamp
+_U64 = struct.Struct('<Q')
+
+FRAMES_PUBLISHED = counter('frame_hub_frames_published_total', 'Datagrams written to the ring', ['camera'])
+
+# Frame leído del ring: data es una vista sobre la memoria compartida (sin copia),
+# solo es válida mientras subscriber.valid(frame) sea True
+Frame = namedtuple('Frame', ['seq', 'camera_id', 'timestamp', 'data'])
+
+
+class _Ring:
+    """
+    Ring en memoria compartida:
+        [head (u64), slots (u64), slot_size (u64), ...] 64 bytes
+        slots x [seq, camera_id, length, timestamp] + slot_size bytes de payload
+    seq de un slot vale 0 mientras se escribe; head es el último seq publicado.
+    """
+
+    def __init__(self, shm, slots, slot_size):
+        self.buf = shm.buf
+        self.slots = slots
+        self.slot_size = slot_size
+        self.stride = _SLOT_HEADER.size + slot_size
+
+    def _offset(self, seq):
+        return _HEADER_BYTES + (seq % self.slots) * self.stride
+
+    @property
+    def head(self):
+        return _U64.unpack_from(self.buf, 0)[0]
+
+    @head.setter
+    def head(self, seq):
+        _U64.pack_into(self.buf, 0, seq)
+
+    def slot_seq(self, seq):
+        return _U64.unpack_from(self.buf, self._offset(seq))[0]
+
+    def header(self, seq):
+        return _SLOT_HEADER.unpack_from(self.buf, self._offset(seq))
+
+    def begin(self, seq):
+        """Marca el slot como en escritura y devuelve la vista donde recibir el datagrama"""
+        offset = self._offset(seq)
+        _U64.pack_into(self.buf, offset, 0)
+        start = offset + _SLOT_HEADER.size
+        return self.buf[start:start + self.slot_size]
+
+    def commit(self, seq, camera_id, length, timestamp):
+        _SLOT_HEADER.pack_into(self.buf, self._offset(seq), 0, camera_id, length, timestamp)
+        # El seq se escribe al final: hasta aquí los lectores ven el slot como inválido
+        _U64.pack_into(self.buf, self._offset(seq), seq)
+        self.head = seq
+
+    def payload(self, seq, length):
+        start = self._offset(seq) + _SLOT_HEADER.size
+        return self.buf[start:start + length]
+
+    @staticmethod
+    def size(slots, slot_size):
+        return _HEADER_BYTES + slots * (_SLOT_HEADER.size + slot_size)
+
+
+class FrameHub:
+    """
+    Dueño de los puertos de cámara y del ring. Cada datagrama se recibe
+    directamente en su slot (recv_into), así que no hay copias intermedias.
+    """
+
+    def __init__(self, camera_ids, base_port=5124, name=DEFAULT_NAME, slots=256, slot_size=65536):
+        self.camera_ids = list(camera_ids)
+        self.base_port = base_port
+        self.name = name
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=_Ring.size(slots, slot_size))
+        struct.pack_into('<QQQ', self.shm.buf, 0, 0, slots, slot_size)
+        self.ring = _Ring(self.shm, slots, slot_size)
+        self.running = False
+
+    def _serve(self):
+        selector = selectors.DefaultSelector()
+        for camera_id in self.camera_ids:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind(('0.0.0.0', self.base_port + camera_id))
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+            sock.setblocking(False)
+            selector.register(sock, selectors.EVENT_READ, camera_id)
+
+        ring = self.ring
+        seq = ring.head
+        while self.running:
+            for key, _ in selector.select(timeout=1.0):
+                camera_id = key.data
+                # Vaciar todo lo que tenga el socket antes de volver a select
+                while True:
+                    payload = ring.begin(seq + 1)
+                    try:
+                        length = key.fileobj.recv_into(payload)
+                    except BlockingIOError:
+                        break
+                    finally:
+                        payload.release()
+                    seq += 1
+                    ring.commit(seq, camera_id, length, time.time())
+                    FRAMES_PUBLISHED.labels(camera_id).inc()
+
+        for key in list(selector.get_map().values()):
+            key.fileobj.close()
+        selector.close()
+
+    def start(self):
+        self.running = True
+        thread = threading.Thread(target=self._serve, name="FrameHub")
+        thread.daemon = True
+        thread.start()
+        logger.info(f"Frame hub '{self.name}' for cameras {self.camera_ids} on ports {self.base_port}+")
+        return thread
+
+    def stop(self):
+        self.running = False
+        time.sleep(1.1)
+        self.ring.buf = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+_attach_lock = threading.Lock()
+
+
+def _attach(name):
+    # Antes de Python 3.13 el lector también registra la memoria y la borraría al salir
+    try:
+        return shared_memory.SharedMemory(name=name, create=False, track=False)
+    except TypeError:
+        pass
+    with _attach_lock:
+        shm = shared_memory.SharedMemory(name=name, create=False)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+class HubSubscriber:
+    """
+    Lector del ring con su propio cursor. Empieza en el frame más nuevo; si
+    se atrasa más que el tamaño del ring salta al más nuevo. Nunca bloquea
+    al hub ni a otros lectores.
+
+    skipped cuenta por cámara (solo las de este lector) los frames perdidos,
+    y on_skip(camera_id, n) se llama en el momento en que se pierden. Un frame
+    que el hub sobrescribió antes de que se leyera su header se cuenta con
+    camera_id None, porque ya no se sabe de qué cámara era.
+    """
+
+    def __init__(self, name=DEFAULT_NAME, camera_ids=None, poll_interval=0.001, on_skip=None):
+        self.shm = _attach(name)
+        _, slots, slot_size = struct.unpack_from('<QQQ', self.shm.buf, 0)
+        self.ring = _Ring(self.shm, slots, slot_size)
+        self.camera_ids = None if camera_ids is None else set(camera_ids)
+        self.poll_interval = poll_interval
+        self.on_skip = on_skip
+        self.cursor = self.ring.head + 1
+        self.skipped = Counter()
+        self._views = []
+
+    def _count_skip(self, camera_id, count=1):
+        if camera_id is not None and self.camera_ids is not None and camera_id not in self.camera_ids:
+            return
+        self.skipped[camera_id] += count
+        if self.on_skip is not None:
+            self.on_skip(camera_id, count)
+
+    def _skip_to(self, head):
+        # Los slots que siguen en el ring dicen de qué cámara era cada frame saltado
+        ring = self.ring
+        first_readable = max(self.cursor, head - ring.slots + 1)
+        if first_readable > self.cursor:
+            self._count_skip(None, first_readable - self.cursor)
+        for seq in range(first_readable, head):
+            slot_seq, camera_id, _, _ = ring.header(seq)
+            self._count_skip(camera_id if slot_seq == seq else None)
+        self.cursor = head
+
+    def next(self, timeout=1.0):
+        """Siguiente Frame de las cámaras de este lector, o None si no llegó nada en timeout"""
+        ring = self.ring
+        deadline = time.monotonic() + timeout
+        self._release_views()
+        while True:
+            head = ring.head
+            if head < self.cursor:
+                if time.monotonic() > deadline:
+                    return None
+                time.sleep(self.poll_interval)
+                continue
+
+            if head - self.cursor >= ring.slots - 1:
+                # Atrasado: el hub ya sobrescribió (o está por sobrescribir) el cursor
+                self._skip_to(head)
+
+            seq = self.cursor
+            self.cursor += 1
+            slot_seq, camera_id, length, timestamp = ring.header(seq)
+            if slot_seq != seq:
+                self._count_skip(None)
+                continue
+            if self.camera_ids is not None and camera_id not in self.camera_ids:
+                continue
+            view = ring.payload(seq, length)
+            self._views.append(view)
+            frame = Frame(seq, camera_id, timestamp, view)
+            # El hub pudo haber empezado a escribir el slot mientras leíamos el header
+            if not self.valid(frame):
+                self._count_skip(camera_id)
+                continue
+            return frame
+
+    def valid(self, frame):
+        """True si el slot del frame no se sobrescribió (revisar después de usar frame.data)"""
+        return self.ring.slot_seq(frame.seq) == frame.seq
+
+    def _release_views(self):
+        for view in self._views:
+            view.release()
+        self._views.clear()
+
+    def close(self):
+        self._release_views()
+        self.ring.buf = None
+        self.shm.close()
+
+
+def record(out_dir, name=DEFAULT_NAME, camera_ids=None):
+    """Ejemplo de consumidor extra: guarda los JPEG de cada cámara tal como llegan"""
+    subscriber = HubSubscriber(name, camera_ids)
+    try:
+        while True:
+            frame = subscriber.next()
+            if frame is None:
+                continue
+            # Los primeros 4 bytes son el id de cámara que pone Unity
+            data = bytes(frame.data[4:])
+            if not subscriber.valid(frame):
+                continue
+            camera_dir = os.path.join(out_dir, f"camera{frame.camera_id}")
+            os.makedirs(camera_dir, exist_ok=True)
+            with open(os.path.join(camera_dir, f"{frame.timestamp:.3f}.jpg"), 'wb') as f:
+                f.write(data)
+    finally:
+        logger.info(f"Recorder skipped {sum(subscriber.skipped.values())} frames")
+        subscriber.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reparte los frames de las cámaras entre varios procesos")
+    parser.add_argument('role', choices=['hub', 'record'])
+    parser.add_argument('--name', default=DEFAULT_NAME)
+    parser.add_argument('--cameras', type=int, default=4)
+    parser.add_argument('--base-port', type=int, default=5124)
+    parser.add_argument('--slots', type=int, default=256)
+    parser.add_argument('--out', default='recordings')
+    parser.add_argument('--metrics-port', type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.metrics_port is not None:
+        start_metrics_server(args.metrics_port)
+
+    if args.role == 'hub':
+        hub = FrameHub(range(args.cameras), base_port=args.base_port, name=args.name, slots=args.slots)
+        hub.start()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            hub.stop()
+    else:
+        try:
+            record(args.out, args.name)
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == "__main__":
+    main()
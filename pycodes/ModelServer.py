@@ -0,0 +1,411 @@
+import cv2
+import numpy as np
+import socket
+import threading
+import struct
+import time
+import logging
+import json
+import heapq
+import itertools
+from collections import namedtuple
+from concurrent.futures import Future
+from ultralytics import YOLO
+import torch
+#this code is called ModelServer.py and is in the folder pycodes
+#it loads each YOLO model only once and serves detections to StaticCameras.py and CameraController.py
+#requests from all the clients are batched together in a single forward pass
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ADDRESS = ('127.0.0.1', 5600)
+
+# Resultado de una detección: boxes (N, 4) xyxy en pixeles, confidences (N,), classes (N,)
+Detections = namedtuple('Detections', ['boxes', 'confidences', 'classes'])
+
+EMPTY_DETECTIONS = Detections(
+    np.zeros((0, 4), dtype=np.float32),
+    np.zeros(0, dtype=np.float32),
+    np.zeros(0, dtype=np.int32)
+)
+
+
+#########################################################
+#                   Wire protocol                       #
+#########################################################
+# Cada mensaje: struct '!II' (largo del header, largo del payload),
+# header JSON y payload binario (jpeg o frame crudo)
+
+def send_message(sock, header, payload=b''):
+    head = json.dumps(header).encode()
+    sock.sendall(struct.pack('!II', len(head), len(payload)) + head)
+    if len(payload):
+        sock.sendall(payload)
+
+
+def _recv_exact(sock, size):
+    buf = bytearray(size)
+    view = memoryview(buf)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:], size - received)
+        if n == 0:
+            raise ConnectionError("Connection closed")
+        received += n
+    return buf
+
+
+def recv_message(sock):
+    head_len, payload_len = struct.unpack('!II', _recv_exact(sock, 8))
+    header = json.loads(_recv_exact(sock, head_len))
+    payload = _recv_exact(sock, payload_len) if payload_len else b''
+    return header, payload
+
+
+def _open_socket(address):
+    """address es una tupla (host, puerto) o la ruta de un socket Unix"""
+    if isinstance(address, str):
+        return socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    return socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+
+#########################################################
+#                      Server                           #
+#########################################################
+
+class _Request:
+    __slots__ = ('client', 'request_id', 'model', 'frame', 'conf', 'classes', 'received')
+
+    def __init__(self, client, request_id, model, frame, conf, classes):
+        self.client = client
+        self.request_id = request_id
+        self.model = model
+        self.frame = frame
+        self.conf = conf
+        self.classes = classes
+        self.received = time.time()
+
+
+class _Client:
+    def __init__(self, sock, name, priority, quota):
+        self.sock = sock
+        self.name = name
+        self.priority = priority
+        self.quota = quota
+        self.send_lock = threading.Lock()
+        self.pending = 0
+
+    def send(self, header):
+        with self.send_lock:
+            send_message(self.sock, header)
+
+
+class ModelServer:
+    """
+    Servicio local de inferencia compartido por varios procesos.
+
+    Carga un modelo por variante (yolov8n, yolov8s, ...) y junta en un mismo
+    batch los frames de todos los clientes que piden la misma variante.
+    Cada cliente se registra con una prioridad (menor = más urgente) y una
+    cuota de solicitudes pendientes; si la excede se descarta su frame más
+    viejo, que para video en tiempo real ya no sirve.
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, models=('yolov8n',), max_batch=8, max_wait=0.005):
+        self.address = address
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.running = False
+
+        self.models = {}
+        self.models_lock = threading.Lock()
+        self.device = None
+        for variant in models:
+            self._get_model(variant)
+
+        self.queue = []
+        self.queue_lock = threading.Condition()
+        self.sequence = itertools.count()
+
+        self.server = _open_socket(address)
+        if not isinstance(address, str):
+            self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+    def _get_model(self, variant):
+        with self.models_lock:
+            model = self.models.get(variant)
+            if model is None:
+                logger.info(f"Loading {variant} model...")
+                self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+                model = YOLO(f'{variant}.pt')
+                model.to(self.device)
+                self.models[variant] = model
+                logger.info(f"Model {variant} loaded on {self.device}")
+            return model
+
+    def start(self):
+        self.server.bind(self.address)
+        self.server.listen(16)
+        self.server.settimeout(1.0)
+        self.running = True
+        logger.info(f"Model server listening on {self.address}")
+
+        worker = threading.Thread(target=self._inference_loop, name="ModelServer-Inference")
+        worker.daemon = True
+        worker.start()
+
+        while self.running:
+            try:
+                sock, _ = self.server.accept()
+                handler = threading.Thread(target=self._handle_client, args=(sock,))
+                handler.daemon = True
+                handler.start()
+            except socket.timeout:
+                continue
+            except Exception as e:
+                if self.running:
+                    logger.error(f"Error accepting model client: {e}")
+
+    def stop(self):
+        self.running = False
+        with self.queue_lock:
+            self.queue_lock.notify_all()
+        try:
+            self.server.close()
+        except Exception:
+            pass
+
+    def _handle_client(self, sock):
+        client = None
+        try:
+            header, _ = recv_message(sock)
+            if header.get('type') != 'hello':
+                logger.error(f"Unexpected first message from model client: {header}")
+                return
+            client = _Client(sock, header.get('client', 'unknown'),
+                             header.get('priority', 10), header.get('quota', 4))
+            names = self._get_model(header.get('model', 'yolov8n')).names
+            client.send({'type': 'welcome', 'names': {int(k): v for k, v in names.items()}})
+            logger.info(f"Model client '{client.name}' connected "
+                        f"(priority {client.priority}, quota {client.quota})")
+
+            while self.running:
+                header, payload = recv_message(sock)
+                frame = self._decode_payload(header, payload)
+                if frame is None:
+                    client.send({'type': 'result', 'id': header['id'], 'error': 'decode failed'})
+                    continue
+                request = _Request(client, header['id'], header.get('model', 'yolov8n'), frame,
+                                   header.get('conf', 0.25), header.get('classes'))
+                self._enqueue(request)
+        except ConnectionError:
+            pass
+        except Exception as e:
+            logger.error(f"Model client error: {e}")
+        finally:
+            if client:
+                logger.info(f"Model client '{client.name}' disconnected")
+            sock.close()
+
+    def _decode_payload(self, header, payload):
+        if header.get('encoding') == 'jpeg':
+            return cv2.imdecode(np.frombuffer(payload, np.uint8), cv2.IMREAD_COLOR)
+        shape = header['shape']
+        return np.frombuffer(payload, np.uint8).reshape(shape)
+
+    def _enqueue(self, request):
+        client = request.client
+        dropped = None
+        with self.queue_lock:
+            if client.pending >= client.quota:
+                # Descartar el frame más viejo de este cliente
+                own = [entry for entry in self.queue if entry[2].client is client]
+                if own:
+                    oldest = min(own, key=lambda entry: entry[1])
+                    self.queue.remove(oldest)
+                    heapq.heapify(self.queue)
+                    client.pending -= 1
+                    dropped = oldest[2]
+            heapq.heappush(self.queue, (client.priority, next(self.sequence), request))
+            client.pending += 1
+            self.queue_lock.notify()
+
+        if dropped is not None:
+            self._reply(dropped, {'type': 'result', 'id': dropped.request_id, 'dropped': True})
+
+    def _next_batch(self):
+        """Toma el frame más prioritario y junta los que usan el mismo modelo"""
+        with self.queue_lock:
+            while self.running and not self.queue:
+                self.queue_lock.wait(1.0)
+            if not self.running:
+                return []
+
+            deadline = time.time() + self.max_wait
+            while len(self.queue) < self.max_batch and time.time() < deadline:
+                self.queue_lock.wait(deadline - time.time())
+
+            _, _, first = heapq.heappop(self.queue)
+            batch = [first]
+            remaining = []
+            while self.queue and len(batch) < self.max_batch:
+                entry = heapq.heappop(self.queue)
+                if entry[2].model == first.model:
+                    batch.append(entry[2])
+                else:
+                    remaining.append(entry)
+            for entry in remaining:
+                heapq.heappush(self.queue, entry)
+            for request in batch:
+                request.client.pending -= 1
+            return batch
+
+    def _inference_loop(self):
+        while self.running:
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                model = self._get_model(batch[0].model)
+                conf = min(request.conf for request in batch)
+                results = model.predict([request.frame for request in batch], conf=conf, verbose=False)
+                for request, result in zip(batch, results):
+                    self._reply(request, self._result_header(request, result))
+            except Exception as e:
+                logger.error(f"Batch inference error: {e}")
+                for request in batch:
+                    self._reply(request, {'type': 'result', 'id': request.request_id, 'error': str(e)})
+
+    def _result_header(self, request, result):
+        boxes = result.boxes.xyxy.cpu().numpy()
+        confidences = result.boxes.conf.cpu().numpy()
+        classes = result.boxes.cls.cpu().numpy().astype(int)
+
+        keep = confidences >= request.conf
+        if request.classes is not None:
+            keep &= np.isin(classes, request.classes)
+
+        return {
+            'type': 'result',
+            'id': request.request_id,
+            'boxes': boxes[keep].round(1).tolist(),
+            'confidences': confidences[keep].round(4).tolist(),
+            'classes': classes[keep].tolist(),
+            'speed': result.speed
+        }
+
+    def _reply(self, request, header):
+        try:
+            request.client.send(header)
+        except Exception as e:
+            logger.error(f"Error replying to model client '{request.client.name}': {e}")
+
+
+#########################################################
+#                      Client                           #
+#########################################################
+
+class ModelClient:
+    """
+    Cliente del ModelServer, seguro para usar desde varios hilos receptores.
+
+    predict() bloquea hasta recibir las detecciones del frame, o devuelve
+    None si el servidor descartó el frame por cuota o si se agotó el tiempo.
+    """
+
+    def __init__(self, name, address=DEFAULT_ADDRESS, model='yolov8n', priority=10, quota=4,
+                 send_jpeg=False):
+        self.name = name
+        self.model = model
+        self.send_jpeg = send_jpeg
+        self.sock = _open_socket(address)
+        self.sock.connect(address)
+        self.send_lock = threading.Lock()
+        self.pending = {}
+        self.pending_lock = threading.Lock()
+        self.request_ids = itertools.count()
+        self.running = True
+
+        send_message(self.sock, {'type': 'hello', 'client': name, 'model': model,
+                                 'priority': priority, 'quota': quota})
+        welcome, _ = recv_message(self.sock)
+        self.names = {int(k): v for k, v in welcome.get('names', {}).items()}
+        logger.info(f"Connected to model server at {address} as '{name}'")
+
+        self.reader = threading.Thread(target=self._read_responses, name=f"ModelClient-{name}")
+        self.reader.daemon = True
+        self.reader.start()
+
+    def predict(self, frame, conf=0.25, classes=None, jpeg=None, timeout=2.0):
+        request_id = next(self.request_ids)
+        future = Future()
+        with self.pending_lock:
+            self.pending[request_id] = future
+
+        header = {'type': 'predict', 'id': request_id, 'model': self.model,
+                  'conf': conf, 'classes': classes}
+        if self.send_jpeg and jpeg is not None:
+            header['encoding'] = 'jpeg'
+            payload = jpeg
+        else:
+            frame = np.ascontiguousarray(frame)
+            header['encoding'] = 'raw'
+            header['shape'] = list(frame.shape)
+            payload = memoryview(frame).cast('B')
+
+        try:
+            with self.send_lock:
+                send_message(self.sock, header, payload)
+            response = future.result(timeout=timeout)
+        except Exception as e:
+            logger.error(f"Model server request failed: {e}")
+            return None
+        finally:
+            with self.pending_lock:
+                self.pending.pop(request_id, None)
+
+        if response.get('dropped') or 'error' in response:
+            return None
+        if not response['boxes']:
+            return EMPTY_DETECTIONS
+        return Detections(
+            np.array(response['boxes'], dtype=np.float32),
+            np.array(response['confidences'], dtype=np.float32),
+            np.array(response['classes'], dtype=np.int32)
+        )
+
+    def _read_responses(self):
+        while self.running:
+            try:
+                header, _ = recv_message(self.sock)
+            except Exception as e:
+                if self.running:
+                    logger.error(f"Lost connection to model server: {e}")
+                break
+            with self.pending_lock:
+                future = self.pending.get(header.get('id'))
+            if future is not None and not future.done():
+                future.set_result(header)
+
+        # Liberar a los hilos que siguen esperando
+        with self.pending_lock:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Model server disconnected"))
+
+    def close(self):
+        self.running = False
+        try:
+            self.sock.close()
+        except Exception:
+            pass
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    server = ModelServer(models=('yolov8n',))
+    try:
+        server.start()
+    except KeyboardInterrupt:
+        server.stop()
+        logger.info("Model server stopped by user")
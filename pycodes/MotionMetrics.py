@@ -0,0 +1,98 @@
+import numpy as np
+import threading
+#this code is called MotionMetrics.py and is in the folder pycodes
+#it accumulates the distance, speed and idle time of every agent from the positions unity sends
+#all agents are updated at once with numpy arrays, and the metrics are read from the accumulated state
+
+
+class MotionMetrics:
+    """
+    Métricas de movimiento por agente acumuladas en arrays de numpy.
+
+    Cada muestra (posición, tiempo) se compara con la última muestra aceptada
+    del agente: si pasaron al menos min_interval segundos se acepta, y la
+    distancia se suma solo si supera min_movement (ruido de Unity). Una muestra
+    con tiempo igual o anterior a la última aceptada se ignora, así que
+    ingerir el mismo estado desde dos endpoints no cuenta la distancia dos veces.
+
+    La distancia también se guarda en cubetas de bucket_seconds para servir
+    agregados por ventana (por ejemplo, distancia del último minuto).
+    """
+
+    def __init__(self, num_agents, min_movement=1.0, min_interval=0.1,
+                 window_seconds=60.0, bucket_seconds=1.0):
+        self.num_agents = num_agents
+        self.min_movement = min_movement
+        self.min_interval = min_interval
+        self.bucket_seconds = bucket_seconds
+        self.num_buckets = max(1, int(round(window_seconds / bucket_seconds)))
+        self.lock = threading.Lock()
+
+        self.last_position = np.full((num_agents, 3), np.nan)
+        self.last_time = np.full(num_agents, np.nan)
+        self.total_distance = np.zeros(num_agents)
+        self.idle_time = np.zeros(num_agents)
+        self.speed = np.zeros(num_agents)
+
+        self.window_distance = np.zeros((self.num_buckets, num_agents))
+        self.bucket_number = np.full(self.num_buckets, -1, dtype=np.int64)
+        self.latest_time = 0.0
+
+    def ingest(self, indices, positions, times):
+        """
+        indices: (K,) fila de cada agente, positions: (K, 3), times: (K,) en segundos.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        times = np.asarray(times, dtype=float)
+        if len(indices) == 0:
+            return
+
+        with self.lock:
+            last_time = self.last_time[indices]
+            first = np.isnan(last_time)
+            dt = times - last_time
+            accepted = ~first & (dt >= self.min_interval)
+
+            rows = indices[accepted]
+            dt = dt[accepted]
+            step = np.linalg.norm(positions[accepted] - self.last_position[rows], axis=1)
+            step[step < self.min_movement] = 0
+
+            self.total_distance[rows] += step
+            self.speed[rows] = step / dt
+            self.idle_time[rows] += np.where(step == 0, dt, 0)
+
+            # La primera muestra de un agente solo fija el punto de partida
+            update = indices[first | accepted]
+            self.last_position[update] = positions[first | accepted]
+            self.last_time[update] = times[first | accepted]
+
+            if len(rows):
+                now = times[accepted].max()
+                self.latest_time = max(self.latest_time, now)
+                bucket = int(now // self.bucket_seconds)
+                slot = bucket % self.num_buckets
+                if self.bucket_number[slot] != bucket:
+                    self.window_distance[slot] = 0
+                    self.bucket_number[slot] = bucket
+                np.add.at(self.window_distance[slot], rows, step)
+
+    def distance_in_window(self, now=None):
+        """Distancia recorrida por cada agente en la ventana (window_seconds) hasta now"""
+        with self.lock:
+            now = self.latest_time if now is None else now
+            current = int(now // self.bucket_seconds)
+            valid = self.bucket_number > current - self.num_buckets
+            return self.window_distance[valid].sum(axis=0)
+
+    def snapshot(self):
+        """Copia de las métricas acumuladas (no recalcula nada)"""
+        window = self.distance_in_window()
+        with self.lock:
+            return {
+                'total_distance': self.total_distance.copy(),
+                'window_distance': window,
+                'speed': self.speed.copy(),
+                'idle_time': self.idle_time.copy()
+            }
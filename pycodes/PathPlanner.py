@@ -0,0 +1,224 @@
+import numpy as np
+import threading
+import heapq
+import logging
+import json
+import os
+from collections import OrderedDict
+#this code is called PathPlanner.py and is in the folder pycodes
+#it plans drone paths over a grid of the dungeon (x/z) so the decisions carry waypoints instead of
+#only the final target. The grid is built once from navigation_map.json (exported occupancy):
+#
+#   {"min_x": -70, "min_z": -110, "cell_size": 5, "rows": ["..##..", ...]}
+#
+#rows go along z (row 0 = min_z) and each character along x ('#' = blocked).
+#without the file the whole "map" rectangle of environment_config.json is free
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = 'navigation_map.json'
+
+# 8 vecinos (di, dj, costo en celdas)
+_MOVES = [(1, 0, 1.0), (-1, 0, 1.0), (0, 1, 1.0), (0, -1, 1.0),
+          (1, 1, 2 ** 0.5), (1, -1, 2 ** 0.5), (-1, 1, 2 ** 0.5), (-1, -1, 2 ** 0.5)]
+
+
+class NavigationGraph:
+    """
+    Grid de navegación con todo lo caro calculado al cargar:
+      - vecinos de cada celda libre (sin cortar esquinas de paredes)
+      - distancias desde landmarks para la heurística ALT de A*
+      - árboles de camino más corto hacia los destinos frecuentes (cámaras),
+        de donde un camino sale siguiendo punteros, sin búsqueda
+    Los demás destinos usan A* y los caminos se guardan en un LRU por celda.
+    """
+
+    def __init__(self, free, bounds, cell_size, landmarks=8, goals=(), cache_size=4096):
+        self.free = np.asarray(free, dtype=bool)
+        self.nx, self.nz = self.free.shape
+        self.min_x, self.min_z = bounds[0], bounds[2]
+        self.bounds = bounds
+        self.cell_size = cell_size
+        self.lock = threading.Lock()
+
+        self.neighbors = [[] for _ in range(self.nx * self.nz)]
+        for i, j in zip(*np.nonzero(self.free)):
+            node = i * self.nz + j
+            for di, dj, cost in _MOVES:
+                a, b = i + di, j + dj
+                if not (0 <= a < self.nx and 0 <= b < self.nz and self.free[a, b]):
+                    continue
+                if di and dj and not (self.free[i + di, j] and self.free[i, j + dj]):
+                    continue
+                self.neighbors[node].append((int(a * self.nz + b), cost))
+
+        self.free_nodes = np.flatnonzero(self.free.ravel())
+        self.landmarks, distances = self._select_landmarks(landmarks)
+        self.landmark_distances = (np.array(distances) if distances
+                                   else np.zeros((0, self.nx * self.nz)))
+
+        self.trees = {}  # nodo destino -> siguiente nodo hacia el destino
+        for goal in goals:
+            self.add_goal(goal)
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        logger.info(f"Navigation grid {self.nx}x{self.nz} with {len(self.free_nodes)} free cells, "
+                    f"{len(self.landmarks)} landmarks, {len(self.trees)} cached goals")
+
+    @classmethod
+    def load(cls, environment, path=DEFAULT_PATH, **kwargs):
+        """Grid desde el archivo exportado, o el rectángulo del mapa sin obstáculos"""
+        if path and os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            cell_size = float(data['cell_size'])
+            rows = data['rows']
+            free = np.array([[rows[j][i] != '#' for j in range(len(rows))] for i in range(len(rows[0]))])
+            bounds = (data['min_x'], data['min_x'] + free.shape[0] * cell_size,
+                      data['min_z'], data['min_z'] + free.shape[1] * cell_size)
+            logger.info(f"Loaded navigation map from {path}")
+        else:
+            bounds = environment.map_bounds
+            cell_size = environment.cell_size
+            nx = max(1, int(np.ceil((bounds[1] - bounds[0]) / cell_size)))
+            nz = max(1, int(np.ceil((bounds[3] - bounds[2]) / cell_size)))
+            free = np.ones((nx, nz), dtype=bool)
+        goals = list(environment.camera_positions.values()) + list(environment.patrol_points)
+        return cls(free, bounds, cell_size, goals=goals, **kwargs)
+
+    def _select_landmarks(self, count):
+        """Farthest-point: cada landmark nuevo es la celda libre más lejana a los anteriores"""
+        landmarks, distances = [], []
+        if not len(self.free_nodes) or count <= 0:
+            return landmarks, distances
+        landmarks.append(int(self.free_nodes[0]))
+        closest = None
+        while True:
+            distances.append(self._dijkstra(landmarks[-1])[0])
+            if len(landmarks) >= min(count, len(self.free_nodes)):
+                break
+            closest = distances[-1] if closest is None else np.minimum(closest, distances[-1])
+            reachable = np.where(np.isfinite(closest), closest, -1.0)
+            candidate = int(np.argmax(reachable))
+            if reachable[candidate] <= 0:
+                break
+            landmarks.append(candidate)
+        return landmarks, distances
+
+    def _dijkstra(self, source):
+        """Distancias (en celdas) desde source y el nodo previo de cada uno (grafo no dirigido)"""
+        # Listas de Python en el ciclo (indexar arrays de numpy uno por uno es más lento)
+        distances = [float('inf')] * (self.nx * self.nz)
+        previous = [-1] * (self.nx * self.nz)
+        distances[source] = 0.0
+        heap = [(0.0, source)]
+        neighbors = self.neighbors
+        while heap:
+            d, node = heapq.heappop(heap)
+            if d > distances[node]:
+                continue
+            for other, cost in neighbors[node]:
+                nd = d + cost
+                if nd < distances[other]:
+                    distances[other] = nd
+                    previous[other] = node
+                    heapq.heappush(heap, (nd, other))
+        return np.array(distances), np.array(previous, dtype=np.int64)
+
+    def _node(self, position):
+        """Celda libre de la posición (la más cercana si cae en una pared o fuera del mapa)"""
+        i = min(max(int((position['x'] - self.min_x) // self.cell_size), 0), self.nx - 1)
+        j = min(max(int((position['z'] - self.min_z) // self.cell_size), 0), self.nz - 1)
+        if self.free[i, j]:
+            return i * self.nz + j
+        if not len(self.free_nodes):
+            return None
+        fi, fj = np.divmod(self.free_nodes, self.nz)
+        return int(self.free_nodes[np.argmin((fi - i) ** 2 + (fj - j) ** 2)])
+
+    def _center(self, node, y):
+        i, j = divmod(node, self.nz)
+        return {'x': self.min_x + (i + 0.5) * self.cell_size, 'y': y,
+                'z': self.min_z + (j + 0.5) * self.cell_size}
+
+    def add_goal(self, position):
+        """Precalcula el árbol de caminos hacia un destino frecuente"""
+        goal = self._node(position)
+        if goal is not None and goal not in self.trees:
+            # El grafo es no dirigido: el previo desde el destino es el siguiente paso hacia él
+            self.trees[goal] = self._dijkstra(goal)[1]
+
+    def _astar(self, start, goal):
+        # Heurística ALT: desigualdad triangular con las distancias a los landmarks
+        if len(self.landmarks):
+            h = np.abs(self.landmark_distances[:, goal][:, None] - self.landmark_distances).max(axis=0)
+            h = np.where(np.isfinite(h), h, 0.0).tolist()
+        else:
+            h = [0.0] * (self.nx * self.nz)
+        g = {start: 0.0}
+        previous = {start: None}
+        heap = [(h[start], start)]
+        closed = set()
+        while heap:
+            _, node = heapq.heappop(heap)
+            if node == goal:
+                path = []
+                while node is not None:
+                    path.append(node)
+                    node = previous[node]
+                return path[::-1]
+            if node in closed:
+                continue
+            closed.add(node)
+            for other, cost in self.neighbors[node]:
+                ng = g[node] + cost
+                if ng < g.get(other, float('inf')):
+                    g[other] = ng
+                    previous[other] = node
+                    heapq.heappush(heap, (ng + h[other], other))
+        return None
+
+    def _nodes_path(self, start, goal):
+        tree = self.trees.get(goal)
+        if tree is not None:
+            path = [start]
+            while path[-1] != goal:
+                step = int(tree[path[-1]])
+                if step < 0:
+                    return None
+                path.append(step)
+            return path
+
+        key = (start, goal)
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+        path = self._astar(start, goal)
+        with self.lock:
+            self.cache[key] = path
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return path
+
+    def plan(self, start, target):
+        """
+        Waypoints (puntos de quiebre del camino, el último es target) de start a
+        target. Lista vacía si target no es alcanzable.
+        """
+        start_node = self._node(start)
+        goal_node = self._node(target)
+        if start_node is None or goal_node is None:
+            return []
+        path = self._nodes_path(start_node, goal_node)
+        if path is None:
+            return []
+
+        # Solo los puntos donde cambia la dirección
+        waypoints = []
+        for k in range(1, len(path) - 1):
+            a, b, c = path[k - 1], path[k], path[k + 1]
+            if b - a != c - b:
+                waypoints.append(self._center(b, start.get('y', target.get('y', 0.0))))
+        waypoints.append(dict(target))
+        return waypoints
@@ -0,0 +1,266 @@
+import cv2
+import numpy as np
+import threading
+import time
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+#this code is called PreviewServer.py and is in the folder pycodes
+#it serves the camera feeds as MJPEG over HTTP so they can be watched from another machine
+#the receivers only publish references to their frames, the encoding happens on the viewer side
+
+logger = logging.getLogger(__name__)
+
+BOUNDARY = 'frame'
+
+
+class _Stream:
+    """Último frame publicado para una cámara"""
+    __slots__ = ('raw', 'frame', 'version', 'encoded', 'encoded_version')
+
+    def __init__(self):
+        self.raw = None
+        self.frame = None
+        self.version = 0
+        self.encoded = None
+        self.encoded_version = -1
+
+
+class PreviewServer:
+    """
+    Servidor MJPEG/HTTP para la vista previa de las cámaras.
+
+    Rutas:
+        /                     indice con los streams disponibles
+        /stream/<id>          MJPEG de una cámara (con anotaciones)
+        /stream/<id>?raw=1    MJPEG con los bytes JPEG recibidos, sin recodificar
+        /grid                 MJPEG con todas las cámaras en una cuadrícula
+        /snapshot/<id>        un solo JPEG de la cámara
+
+    Solo se codifica cuando hay al menos un espectador conectado, y cada
+    frame se codifica una vez sin importar cuántos espectadores haya.
+    """
+
+    def __init__(self, host='0.0.0.0', port=8080, max_fps=10, cols=2,
+                 cell_size=(640, 480), jpeg_quality=75):
+        self.host = host
+        self.port = port
+        self.frame_interval = 1.0 / max_fps
+        self.cols = cols
+        self.cell_width, self.cell_height = cell_size
+        self.jpeg_quality = jpeg_quality
+
+        self.running = False
+        self.streams = {}
+        self.version = 0
+        self.viewers = 0
+        self.condition = threading.Condition()
+        self._grid_key = None
+        self._grid_jpeg = None
+
+        self.server = None
+        self.thread = None
+
+    @property
+    def has_viewers(self):
+        return self.viewers > 0
+
+    def publish(self, stream_id, jpeg=None, frame=None):
+        """
+        Publica el último frame de una cámara. Solo guarda referencias,
+        el que llama no debe modificar el frame después de publicarlo.
+        """
+        with self.condition:
+            stream = self.streams.get(stream_id)
+            if stream is None:
+                stream = self.streams[stream_id] = _Stream()
+            stream.raw = jpeg
+            stream.frame = frame
+            stream.version += 1
+            self.version += 1
+            if self.viewers:
+                self.condition.notify_all()
+
+    def start(self):
+        preview = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                preview._handle_request(self)
+
+            def log_message(self, format, *args):
+                logger.debug(f"Preview {self.address_string()} - {format % args}")
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        self.running = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="PreviewServer")
+        self.thread.daemon = True
+        self.thread.start()
+        logger.info(f"Preview server started on http://{self.host}:{self.port}")
+
+    def stop(self):
+        self.running = False
+        with self.condition:
+            self.condition.notify_all()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def _handle_request(self, handler):
+        url = urlparse(handler.path)
+        parts = [p for p in url.path.split('/') if p]
+        query = parse_qs(url.query)
+        raw = query.get('raw', ['0'])[0] in ('1', 'true', 'yes')
+
+        try:
+            if not parts:
+                self._send_index(handler)
+            elif parts[0] == 'grid':
+                self._serve_mjpeg(handler, self._grid_jpeg_bytes)
+            elif parts[0] in ('stream', 'snapshot') and len(parts) == 2:
+                stream_id = int(parts[1])
+                if stream_id not in self.streams:
+                    handler.send_error(404, f"Unknown stream {stream_id}")
+                elif parts[0] == 'stream':
+                    self._serve_mjpeg(handler, lambda: self._stream_jpeg(stream_id, raw))
+                else:
+                    self._send_snapshot(handler, stream_id, raw)
+            else:
+                handler.send_error(404)
+        except ValueError:
+            handler.send_error(400, "Stream id must be an integer")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _send_index(self, handler):
+        with self.condition:
+            stream_ids = sorted(self.streams)
+        links = ''.join(
+            f'<li><a href="/stream/{i}">stream {i}</a> '
+            f'(<a href="/stream/{i}?raw=1">raw</a>)</li>'
+            for i in stream_ids
+        )
+        body = (f'<html><body><h3>Camera preview</h3>'
+                f'<p><a href="/grid">grid</a></p><ul>{links}</ul></body></html>').encode()
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'text/html')
+        handler.send_header('Content-Length', str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _send_snapshot(self, handler, stream_id, raw):
+        data, _ = self._stream_jpeg(stream_id, raw)
+        if data is None:
+            handler.send_error(503, "No frame yet")
+            return
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'image/jpeg')
+        handler.send_header('Content-Length', str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def _serve_mjpeg(self, handler, next_jpeg):
+        """Envía frames como multipart/x-mixed-replace limitado a max_fps"""
+        handler.send_response(200)
+        handler.send_header('Content-Type', f'multipart/x-mixed-replace; boundary={BOUNDARY}')
+        handler.send_header('Cache-Control', 'no-cache')
+        handler.end_headers()
+
+        with self.condition:
+            self.viewers += 1
+        logger.info(f"Preview viewer connected ({self.viewers} total)")
+
+        last_key = None
+        seen_version = -1
+        try:
+            while self.running:
+                started = time.time()
+                with self.condition:
+                    self.condition.wait_for(
+                        lambda: self.version != seen_version or not self.running,
+                        timeout=1.0
+                    )
+                    seen_version = self.version
+
+                data, key = next_jpeg()
+                if data is not None and key != last_key:
+                    handler.wfile.write(
+                        f'--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n'
+                        f'Content-Length: {len(data)}\r\n\r\n'.encode()
+                    )
+                    handler.wfile.write(data)
+                    handler.wfile.write(b'\r\n')
+                    last_key = key
+
+                # Limitar fps de la vista previa independientemente del procesamiento
+                elapsed = time.time() - started
+                if elapsed < self.frame_interval:
+                    time.sleep(self.frame_interval - elapsed)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with self.condition:
+                self.viewers -= 1
+            logger.info(f"Preview viewer disconnected ({self.viewers} remaining)")
+
+    def _encode(self, frame):
+        ok, buf = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        return buf.tobytes() if ok else None
+
+    def _stream_jpeg(self, stream_id, raw):
+        """Devuelve (jpeg, version), codificando solo si el frame cambió"""
+        with self.condition:
+            stream = self.streams.get(stream_id)
+            if stream is None:
+                return None, None
+            version = stream.version
+            # Los bytes recibidos se reenvían tal cual, sin recodificar
+            if (raw or stream.frame is None) and stream.raw is not None:
+                return stream.raw, version
+            if stream.encoded_version == version:
+                return stream.encoded, version
+            frame = stream.frame
+
+        if frame is None:
+            return None, version
+        data = self._encode(frame)
+
+        with self.condition:
+            if stream.version == version:
+                stream.encoded = data
+                stream.encoded_version = version
+        return data, version
+
+    def _grid_jpeg_bytes(self):
+        with self.condition:
+            key = tuple((i, s.version) for i, s in sorted(self.streams.items()))
+            if key == self._grid_key:
+                return self._grid_jpeg, key
+            frames = {i: s.frame for i, s in self.streams.items()}
+            raws = {i: s.raw for i, s in self.streams.items()}
+
+        if not frames:
+            return None, key
+
+        rows = (max(frames) // self.cols) + 1
+        grid = np.zeros((self.cell_height * rows, self.cell_width * self.cols, 3), dtype=np.uint8)
+        for stream_id, frame in frames.items():
+            if frame is None and raws[stream_id] is not None:
+                frame = cv2.imdecode(np.frombuffer(raws[stream_id], np.uint8), cv2.IMREAD_COLOR)
+            if frame is None:
+                continue
+            i = stream_id // self.cols
+            j = stream_id % self.cols
+            cell = grid[i*self.cell_height:(i+1)*self.cell_height,
+                        j*self.cell_width:(j+1)*self.cell_width]
+            if frame.shape[:2] != cell.shape[:2]:
+                frame = cv2.resize(frame, (self.cell_width, self.cell_height))
+            cell[:] = frame
+
+        data = self._encode(grid)
+        with self.condition:
+            self._grid_key = key
+            self._grid_jpeg = data
+        return data, key
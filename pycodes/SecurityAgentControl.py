@@ -4,9 +4,16 @@ import logging
 import signal
 import sys
 import time
+from ServiceMetrics import counter, gauge, histogram, start_metrics_server
+
+CONNECTED_CLIENTS = gauge('command_server_connected_clients', 'Connected clients', ['kind'])
+BROADCASTS = counter('command_server_broadcasts_total', 'Commands broadcast to the drones')
+BROADCAST_SECONDS = histogram('command_server_broadcast_seconds', 'Time to send a command to all drones')
+BROADCAST_FAILURES = counter('command_server_broadcast_failures_total', 'Drones dropped while broadcasting')
+ALARMS = counter('command_server_alarms_total', 'Human detection alarms received from the drones')
 
 class DroneCommandServer:
-    def __init__(self, host='127.0.0.1', port=5782):
+    def __init__(self, host='127.0.0.1', port=5782, metrics_port=None):
         self.host = host
         self.port = port
         self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -22,6 +29,12 @@ class DroneCommandServer:
             format='%(asctime)s - %(levelname)s - %(message)s'
         )
         self.logger = logging.getLogger(__name__)
+        
+        # Métricas en http://127.0.0.1:<metrics_port>/metrics
+        if metrics_port is not None:
+            CONNECTED_CLIENTS.labels('drone').set_function(lambda: len(self.drone_clients))
+            CONNECTED_CLIENTS.labels('unity').set_function(lambda: len(self.clients))
+            start_metrics_server(metrics_port)
 
     def start(self):
         try:
@@ -120,6 +133,7 @@ class DroneCommandServer:
                         break
                     
                     if data.startswith("HUMAN_DETECTED:"):
+                        ALARMS.inc()
                         self.logger.warning("¡Alarma activada!")
                         # Aquí podrías agregar más acciones cuando se detecta una persona
                     
@@ -138,7 +152,8 @@ class DroneCommandServer:
             
     def broadcast_to_drones(self, command):
         """Envía un comando a todos los drones conectados"""
-        with self.drone_clients_lock:
+        BROADCASTS.inc()
+        with BROADCAST_SECONDS.time(), self.drone_clients_lock:
             disconnected_drones = set()
             for drone_socket in self.drone_clients:
                 try:
@@ -147,6 +162,7 @@ class DroneCommandServer:
                     disconnected_drones.add(drone_socket)
             
             # Limpia las conexiones muertas
+            BROADCAST_FAILURES.inc(len(disconnected_drones))
             for drone_socket in disconnected_drones:
                 self.drone_clients.remove(drone_socket)
                 drone_socket.close()
@@ -188,7 +204,7 @@ if __name__ == "__main__":
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
     
-    server = DroneCommandServer()
+    server = DroneCommandServer(metrics_port=9104)  # Métricas en http://127.0.0.1:9104/metrics
     try:
         server.start()
     except Exception as e:
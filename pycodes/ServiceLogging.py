@@ -0,0 +1,220 @@
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+import json
+import os
+import atexit
+#this code is called ServiceLogging.py and is in the folder pycodes
+#it sets up the logging of the python services so that writing the logs never blocks the request threads
+#records go through a queue to a background thread, and noisy messages are sampled or rate limited
+
+_PRIMITIVES = (str, int, float, bool, type(None))
+
+DEFAULT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+class KeyValueFormatter(logging.Formatter):
+    """Agrega los campos estructurados del record (extra={'fields': {...}}) como key=value"""
+
+    def format(self, record):
+        message = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            message += ' ' + ' '.join(f"{key}={value}" for key, value in fields.items())
+        return message
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Limita los mensajes por clase. La clase de un record es su 'event'
+    (ver log_event) o, si no tiene, el template del mensaje sin formatear.
+
+    rates: {clase: mensajes por segundo} (token bucket, ráfaga de 1 segundo)
+    sample: {clase: N} deja pasar 1 de cada N
+    Los mensajes descartados se cuentan y se reportan en el siguiente que pase.
+    """
+
+    def __init__(self, rates=None, sample=None):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.configure(rates, sample)
+
+    def configure(self, rates=None, sample=None):
+        with self.lock:
+            self.rates = dict(rates or {})
+            self.sample = dict(sample or {})
+            self.buckets = {}
+            self.counters = {}
+            self.suppressed = {}
+
+    def filter(self, record):
+        key = getattr(record, 'event', record.msg)
+        rate = self.rates.get(key)
+        every = self.sample.get(key)
+        if rate is None and every is None:
+            return True
+
+        with self.lock:
+            if every is not None:
+                count = self.counters.get(key, 0)
+                self.counters[key] = count + 1
+                if count % every:
+                    self.suppressed[key] = self.suppressed.get(key, 0) + 1
+                    return False
+
+            if rate is not None:
+                now = time.monotonic()
+                tokens, last = self.buckets.get(key, (rate, now))
+                tokens = min(rate, tokens + (now - last) * rate)
+                if tokens < 1:
+                    self.buckets[key] = (tokens, now)
+                    self.suppressed[key] = self.suppressed.get(key, 0) + 1
+                    return False
+                self.buckets[key] = (tokens - 1, now)
+
+            suppressed = self.suppressed.pop(key, 0)
+        if suppressed:
+            fields = dict(getattr(record, 'fields', None) or {})
+            fields['suppressed'] = suppressed
+            record.fields = fields
+        return True
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler que no formatea en el hilo que loguea: el formato se hace
+    en el hilo del QueueListener. Solo se formatea antes si los argumentos
+    o los fields de log_event son mutables (podrían cambiar antes de escribirse).
+    """
+
+    def prepare(self, record):
+        args = record.args
+        if isinstance(args, dict):
+            args = args.values()
+        if args and not all(isinstance(arg, _PRIMITIVES) for arg in args):
+            record.msg = record.getMessage()
+            record.args = None
+        fields = getattr(record, 'fields', None)
+        if fields:
+            # Mismo texto que escribiría KeyValueFormatter, pero tomado ahora
+            record.fields = {key: value if isinstance(value, _PRIMITIVES) else str(value)
+                             for key, value in fields.items()}
+        if record.exc_info:
+            # El traceback no se puede pasar tal cual a otro hilo de forma segura
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_listener = None
+_rate_filter = RateLimitFilter()
+_watched = {}  # path -> hilo que lo relee
+_watched_lock = threading.Lock()
+
+
+def setup_logging(level=logging.INFO, fmt=DEFAULT_FORMAT, datefmt='%Y-%m-%d %H:%M:%S',
+                  filename=None, rates=None, sample=None, levels=None, config_file=None):
+    """
+    Reemplaza a logging.basicConfig para los servicios.
+
+    El root logger solo encola los records; un QueueListener los formatea y
+    escribe (consola y opcionalmente archivo). rates/sample configuran el
+    RateLimitFilter, levels ajusta el nivel por módulo y config_file es un
+    JSON que se vuelve a leer cuando cambia (ver watch_config).
+    """
+    global _listener
+
+    formatter = KeyValueFormatter(fmt, datefmt)
+    outputs = [logging.StreamHandler()]
+    if filename:
+        outputs.append(logging.FileHandler(filename))
+    for handler in outputs:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = LazyQueueHandler(log_queue)
+    queue_handler.addFilter(_rate_filter)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    if _listener is not None:
+        _listener.stop()
+    else:
+        atexit.register(shutdown)
+    _listener = logging.handlers.QueueListener(log_queue, *outputs, respect_handler_level=True)
+    _listener.start()
+
+    configure(rates=rates, sample=sample, levels=levels)
+    if config_file:
+        watch_config(config_file)
+    return _listener
+
+
+def configure(rates=None, sample=None, levels=None):
+    """Cambia límites y niveles por módulo en tiempo de ejecución"""
+    if rates is not None or sample is not None:
+        _rate_filter.configure(rates if rates is not None else _rate_filter.rates,
+                               sample if sample is not None else _rate_filter.sample)
+    for name, module_level in (levels or {}).items():
+        logging.getLogger(name).setLevel(module_level)
+
+
+def watch_config(path, interval=2.0):
+    """
+    Relee un JSON {"levels": {...}, "rates": {...}, "sample": {...}}
+    cada vez que cambia su fecha de modificación. Un solo hilo por archivo.
+    """
+    path = os.path.abspath(path)
+    with _watched_lock:
+        if path in _watched:
+            return _watched[path]
+
+    def watch():
+        last_mtime = None
+        while True:
+            try:
+                mtime = os.path.getmtime(path)
+                if mtime != last_mtime:
+                    last_mtime = mtime
+                    with open(path) as f:
+                        config = json.load(f)
+                    configure(rates=config.get('rates'), sample=config.get('sample'),
+                              levels=config.get('levels'))
+                    logging.getLogger(__name__).info(f"Logging configuration loaded from {path}")
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logging.getLogger(__name__).error(f"Error loading logging configuration: {e}")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=watch, name="LoggingConfigWatcher")
+    thread.daemon = True
+    with _watched_lock:
+        if path in _watched:
+            return _watched[path]
+        _watched[path] = thread
+    thread.start()
+    return thread
+
+
+def log_event(logger, level, event, **fields):
+    """
+    Record estructurado: 'event' es la clase del mensaje (para el rate limit)
+    y fields se escriben como key=value. No hace nada si el nivel está apagado.
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={'event': event, 'fields': fields})
+
+
+def shutdown():
+    """Vacía la cola antes de salir"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
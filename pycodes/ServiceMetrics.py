@@ -0,0 +1,300 @@
+import threading
+import time
+import bisect
+import logging
+import functools
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+#this code is called ServiceMetrics.py and is in the folder pycodes
+#it has counters, gauges and histograms for the python services and serves them in the prometheus text format
+#on a local http port per process (http://127.0.0.1:<port>/metrics)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class _ThreadCells:
+    """
+    Un valor por hilo: cada hilo solo escribe su propia celda, así que no hace
+    falta lock para actualizar (la asignación en un dict es atómica con el GIL).
+    Leer suma todas las celdas.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.cells = {}
+
+    def cell(self):
+        ident = threading.get_ident()
+        cell = self.cells.get(ident)
+        if cell is None:
+            cell = self.cells[ident] = self.factory()
+        return ident, cell
+
+    def values(self):
+        return list(self.cells.values())
+
+
+class Counter:
+    """Contador que solo sube"""
+
+    def __init__(self):
+        self._cells = _ThreadCells(float)
+
+    def inc(self, amount=1):
+        ident, value = self._cells.cell()
+        self._cells.cells[ident] = value + amount
+
+    @property
+    def value(self):
+        return sum(self._cells.values())
+
+    def samples(self, name, labels):
+        return [(name, labels, self.value)]
+
+
+class Gauge:
+    """
+    Valor que sube y baja. Usar set() o inc()/dec(), no las dos cosas en la
+    misma métrica. set_function() lo calcula al momento de leerlo.
+    """
+
+    def __init__(self):
+        self._cells = _ThreadCells(float)
+        self._value = 0.0
+        self._function = None
+
+    def set(self, value):
+        self._value = value
+
+    def inc(self, amount=1):
+        ident, value = self._cells.cell()
+        self._cells.cells[ident] = value + amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set_function(self, function):
+        self._function = function
+
+    @property
+    def value(self):
+        if self._function is not None:
+            return self._function()
+        return self._value + sum(self._cells.values())
+
+    def samples(self, name, labels):
+        return [(name, labels, self.value)]
+
+
+class Histogram:
+    """Histograma con buckets fijos (límites superiores en segundos por defecto)"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        # Por hilo: [conteo por bucket..., +Inf, suma]
+        self._cells = _ThreadCells(lambda: [0] * (len(self.buckets) + 1) + [0.0])
+
+    def observe(self, value):
+        _, cell = self._cells.cell()
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    def time(self):
+        return _Timer(self)
+
+    def samples(self, name, labels):
+        totals = [0] * (len(self.buckets) + 2)
+        for cell in self._cells.values():
+            for i, value in enumerate(cell):
+                totals[i] += value
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), totals[:-1]):
+            cumulative += count
+            samples.append((name + '_bucket', labels + (('le', _format_value(bound)),), cumulative))
+        samples.append((name + '_sum', labels, totals[-1]))
+        samples.append((name + '_count', labels, cumulative))
+        return samples
+
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+    def __call__(self, function):
+        # También sirve como decorador: @histogram.time()
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with _Timer(self.histogram):
+                return function(*args, **kwargs)
+        return wrapper
+
+
+class Metric:
+    """Métrica con nombre y etiquetas; labels(...) devuelve la serie de esos valores"""
+
+    def __init__(self, kind, name, documentation, label_names=(), **kwargs):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.kwargs = kwargs
+        self.children = {}
+        self.lock = threading.Lock()
+        if not self.label_names:
+            self._default = self._new()
+
+    def _new(self):
+        return _KINDS[self.kind](**self.kwargs)
+
+    def labels(self, *values, **named):
+        if named:
+            values = tuple(named[name] for name in self.label_names)
+        key = tuple(str(value) for value in values)
+        child = self.children.get(key)
+        if child is None:
+            with self.lock:
+                child = self.children.get(key)
+                if child is None:
+                    child = self.children[key] = self._new()
+        return child
+
+    def __getattr__(self, attribute):
+        # Métricas sin etiquetas: counter.inc(), histogram.time(), ...
+        if attribute.startswith('_') or self.label_names:
+            raise AttributeError(attribute)
+        return getattr(self._default, attribute)
+
+    def collect(self):
+        if not self.label_names:
+            return self._default.samples(self.name, ())
+        samples = []
+        for key, child in list(self.children.items()):
+            samples.extend(child.samples(self.name, tuple(zip(self.label_names, key))))
+        return samples
+
+
+_KINDS = {'counter': Counter, 'gauge': Gauge, 'histogram': Histogram}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _register(self, kind, name, documentation, labels, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = Metric(kind, name, documentation, labels, **kwargs)
+            elif metric.kind != kind:
+                raise ValueError(f"Metric {name} already registered as {metric.kind}")
+            return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self._register('counter', name, documentation, labels)
+
+    def gauge(self, name, documentation, labels=()):
+        return self._register('gauge', name, documentation, labels)
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register('histogram', name, documentation, labels, buckets=buckets)
+
+    def generate_text(self):
+        """Formato de texto de Prometheus"""
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.collect():
+                if labels:
+                    label_text = ','.join(f'{key}="{_escape(label_value)}"' for key, label_value in labels)
+                    lines.append(f"{name}{{{label_text}}} {_format_value(value)}")
+                else:
+                    lines.append(f"{name} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+# Registro por proceso que usan todos los servicios
+REGISTRY = MetricsRegistry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+
+# Rutas extra del servidor de métricas (por ejemplo /profile de ServiceProfiler)
+_routes = {}
+
+
+def register_route(path, function):
+    """function(query) -> texto; query es el dict de parse_qs. ValueError responde 400"""
+    _routes[path] = function
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path in ('/', '/metrics'):
+            body = self.registry.generate_text().encode('utf-8')
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        elif url.path in _routes:
+            try:
+                body = _routes[url.path](parse_qs(url.query)).encode('utf-8')
+            except ValueError as e:
+                # Parámetros inválidos en la query
+                self.send_error(400, str(e))
+                return
+            except Exception as e:
+                self.send_error(500, str(e))
+                return
+            content_type = 'text/plain; charset=utf-8'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port, host='127.0.0.1', registry=REGISTRY):
+    """Sirve las métricas en http://host:port/metrics desde un hilo aparte"""
+    handler = type('MetricsHandler', (_MetricsHandler,), {'registry': registry})
+    try:
+        server = ThreadingHTTPServer((host, port), handler)
+    except OSError as e:
+        logger.error(f"Could not start metrics server on {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="MetricsServer")
+    thread.daemon = True
+    thread.start()
+    logger.info(f"Metrics available on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,145 @@
+import sys
+import os
+import math
+import time
+import signal
+import threading
+import functools
+import logging
+from collections import Counter
+from ServiceMetrics import histogram, register_route
+#this code is called ServiceProfiler.py and is in the folder pycodes
+#it lets us profile a running service without restarting it: a signal (SIGUSR1) or the /profile
+#endpoint of the metrics server samples the stacks of all the threads for some seconds and writes
+#them as collapsed stacks (one line per stack, the format of flamegraph.pl and speedscope)
+
+logger = logging.getLogger(__name__)
+
+STAGE_SECONDS = histogram('service_stage_seconds', 'Time per pipeline stage while stage timing is on', ['stage'])
+
+_stage_timing = os.environ.get('SERVICE_STAGE_TIMING') == '1'
+_profile_lock = threading.Lock()
+
+# Límites de GET /profile?seconds=N
+MIN_ROUTE_SECONDS = 1.0
+MAX_ROUTE_SECONDS = 60.0
+
+
+def enable_stage_timing(enabled=True):
+    global _stage_timing
+    _stage_timing = enabled
+
+
+def timed(stage):
+    """
+    Decorador para medir una etapa (process_frame, make_decision, ...).
+    Apagado solo cuesta revisar una variable; encendido registra el tiempo
+    en service_stage_seconds{stage=...}.
+    """
+    def decorator(function):
+        series = STAGE_SECONDS.labels(stage)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _stage_timing:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                series.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_stacks(seconds=10.0, interval=0.005):
+    """
+    Toma muestras de las pilas de todos los hilos cada interval segundos
+    durante seconds segundos. Devuelve un Counter {pila colapsada: muestras}
+    donde la pila empieza con el nombre del hilo.
+    """
+    own_ident = threading.get_ident()
+    stacks = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            parts = []
+            while frame is not None:
+                parts.append(_frame_name(frame))
+                frame = frame.f_back
+            parts.append(names.get(ident, f"thread-{ident}"))
+            stacks[';'.join(reversed(parts))] += 1
+        time.sleep(interval)
+    return stacks
+
+
+def collapsed_text(stacks):
+    return ''.join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def profile(seconds=10.0, interval=0.005, output_dir='profiles'):
+    """
+    Perfila el proceso (con la medición por etapas encendida mientras dura)
+    y guarda profiles/<pid>_<fecha>.folded. Devuelve (ruta, texto colapsado).
+    Solo corre un perfil a la vez.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise RuntimeError("A profile is already running")
+    previous_timing = _stage_timing
+    try:
+        enable_stage_timing(True)
+        logger.info(f"Profiling all threads for {seconds}s")
+        text = collapsed_text(sample_stacks(seconds, interval))
+    finally:
+        enable_stage_timing(previous_timing)
+        _profile_lock.release()
+
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"{os.getpid()}_{time.strftime('%Y%m%d_%H%M%S')}.folded")
+    with open(path, 'w') as f:
+        f.write(text)
+    logger.info(f"Profile written to {path} (flamegraph.pl {path} > flame.svg)")
+    return path, text
+
+
+def _profile_in_background(seconds, interval, output_dir):
+    def run():
+        try:
+            profile(seconds, interval, output_dir)
+        except Exception as e:
+            logger.error(f"Profiling failed: {e}")
+    thread = threading.Thread(target=run, name="Profiler")
+    thread.daemon = True
+    thread.start()
+
+
+def enable_profiling(seconds=10.0, interval=0.005, output_dir='profiles'):
+    """
+    Activa los disparadores del profiler:
+      - kill -USR1 <pid> perfila seconds segundos en segundo plano
+      - GET /profile?seconds=N en el servidor de métricas devuelve las pilas colapsadas
+    """
+    def handle_signal(signum, frame):
+        _profile_in_background(seconds, interval, output_dir)
+
+    if hasattr(signal, 'SIGUSR1') and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGUSR1, handle_signal)
+
+    def handle_route(query):
+        # ValueError -> 400 en el servidor de métricas
+        duration = float(query.get('seconds', [seconds])[0])
+        if not math.isfinite(duration):
+            raise ValueError(f"seconds must be a number, got {duration}")
+        # Acotado: el pedido ocupa un hilo del servidor y el lock del profiler mientras dura
+        duration = min(max(duration, MIN_ROUTE_SECONDS), MAX_ROUTE_SECONDS)
+        return profile(duration, interval, output_dir)[1]
+
+    register_route('/profile', handle_route)
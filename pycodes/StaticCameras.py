@@ -8,165 +8,210 @@ import logging
 from ultralytics import YOLO
 import torch
 import json
-from collections import defaultdict
+from PreviewServer import PreviewServer
+from FrameDecoder import FrameDecoder
+from ModelServer import ModelClient
+from TrackingEngine import MultiStreamTracker
+from DetectionValidation import DetectionValidator
+from DetectorCache import DetectorCache
+from ServiceMetrics import counter, histogram, start_metrics_server
+from ServiceProfiler import timed, enable_profiling
+from FrameHub import HubSubscriber
 #this code is called staticCameras.py and is in the folder pycodes in the assets folder
 #this code is for the static cameras that are in the environment, they are 4 cameras that are in the corners of the environment
 #this detect the people in the environment and send the data to the unity app
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+FRAMES_RECEIVED = counter('static_camera_frames_received_total', 'Datagrams received per camera', ['camera'])
+FRAMES_DECODED = counter('static_camera_frames_decoded_total', 'Frames decoded per camera', ['camera'])
+FRAMES_DROPPED = counter('static_camera_frames_dropped_total', 'Datagrams dropped per camera', ['camera', 'reason'])
+INFERENCE_SECONDS = histogram('static_camera_inference_seconds', 'Detector time per frame', ['camera'])
+CACHE_HITS = counter('static_camera_detector_cache_hits_total', 'Frames answered from the detector cache', ['camera'])
+DETECTIONS_CONFIRMED = counter('static_camera_detections_confirmed_total', 'Confirmed detections per camera', ['camera'])
+DETECTIONS_SENT = counter('static_camera_detections_sent_total', 'Detections sent to the controller')
+SEND_ERRORS = counter('static_camera_send_errors_total', 'Errors sending detections to the controller')
+
+# _detect cuando el ModelServer no respondió (distinto de None, que es "sin detecciones")
+DETECTOR_FAILED = object()
+
 class SecurityCameraSystem:
-    def __init__(self, num_cameras=4, base_port=5123):
+    def __init__(self, num_cameras=4, base_port=5123, show_window=True, preview_port=None, preview_fps=10,
+                 model_server=None, conf_threshold=0.5, min_detection_time=0.1, max_position_change=1000,
+                 detector_cache_size=256, perceptual_cache=False, metrics_port=None,
+                 camera_ids=None, detection_address=('127.0.0.1', 5556), node_id=None, hub_name=None):
         self.num_cameras = num_cameras
         self.base_port = base_port
+        # Con hub_name los frames se leen de FrameHub.py (memoria compartida) en vez de los puertos
+        self.hub_name = hub_name
+        # Cámaras que atiende este proceso; en modo shard (CameraSharding.py) las asigna el coordinador
+        self.camera_ids = list(range(num_cameras)) if camera_ids is None else list(camera_ids)
+        self.active_cameras = {}  # camera_id -> token del hilo que la atiende
+        self.camera_threads = {}
+        # Modo hub: un solo lector del ring deja el último datagrama de cada cámara a su hilo
+        self.hub_thread = None
+        self.hub_frames = {}  # camera_id -> bytes del último datagrama sin procesar
+        self.hub_events = {}  # camera_id -> Event que avisa al hilo de la cámara
+        self.node_id = node_id
         self.running = True
         self.frame_buffer = {}
         self.lock = threading.Lock()
+        self.show_window = show_window
         
-        # Tracking temporal de detecciones
-        self.detection_history = defaultdict(lambda: defaultdict(dict))
-        self.MIN_DETECTION_TIME = 0.1 # Tiempo mínimo de detección continua (segundos)
-        self.MAX_POSITION_CHANGE = 1000  # Cambio máximo permitido en posición normalizada entre frames
-        self.CLEANUP_INTERVAL = 5.0  # Intervalo para limpiar detecciones antiguas
-        
-        # Cargar modelo YOLOv8
-        self.model = YOLO('yolov8n.pt')
-        self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        self.model.to(self.device)
-        
-        # Socket para enviar datos de detección
-        self.unity_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.unity_detection_port = 5556
+        # Métricas en http://127.0.0.1:<metrics_port>/metrics
+        if metrics_port is not None:
+            start_metrics_server(metrics_port)
         
-        # Último tiempo de limpieza
-        self.last_cleanup_time = time.time()
+        # Vista previa remota por HTTP (MJPEG), solo codifica si hay espectadores
+        self.preview = None
+        if preview_port is not None:
+            self.preview = PreviewServer(port=preview_port, max_fps=preview_fps,
+                                         cols=2, cell_size=(640, 480))
         
-    def _is_valid_detection(self, camera_id, track_id, position, current_time):
-        """
-        Verifica si una detección es válida basada en su historia temporal y movimiento
-        """
-        history = self.detection_history[camera_id][track_id]
+        # Tracking temporal de detecciones (se puede evaluar offline con DetectionEvaluation.py)
+        self.conf_threshold = conf_threshold
+        self.validator = DetectionValidator(min_detection_time=min_detection_time,
+                                            max_position_change=max_position_change,
+                                            cleanup_interval=5.0)
         
-        # Si es una nueva detección
-        if not history:
-            history['first_seen'] = current_time
-            history['last_seen'] = current_time
-            history['positions'] = [position]
-            history['confirmed'] = False
-            return False
+        # Cargar modelo YOLOv8, o usar el ModelServer compartido con CameraController
+        self.model = None
+        self.model_client = None
+        if model_server is not None:
+            self.model_client = ModelClient('static_cameras', address=model_server,
+                                            model='yolov8n', priority=0, quota=self.num_cameras)
+        else:
+            self.model = YOLO('yolov8n.pt')
+            self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+            self.model.to(self.device)
+        # El modelo se comparte entre los hilos de las cámaras y no es thread-safe
+        self.model_lock = threading.Lock()
         
-        # Actualizar último tiempo visto
-        history['last_seen'] = current_time
+        # Frames repetidos (escena estática) reutilizan la salida del detector; 0 lo desactiva
+        self.detector_cache = None
+        if detector_cache_size > 0:
+            self.detector_cache = DetectorCache(max_entries=detector_cache_size, perceptual=perceptual_cache)
         
-        # Verificar si el movimiento es realista
-        if history['positions']:
-            last_position = history['positions'][-1]
-            position_change = np.sqrt(
-                (position['x'] - last_position['x'])**2 + 
-                (position['y'] - last_position['y'])**2
-            )
-            
-            # Si el cambio de posición es muy grande, podría ser un falso positivo
-            if position_change > self.MAX_POSITION_CHANGE:
-                history['positions'] = [position]  # Reiniciar tracking
-                history['first_seen'] = current_time
-                history['confirmed'] = False
-                return False
+        # Tracking separado por cámara (los ids no se mezclan entre cámaras)
+        self.tracker = MultiStreamTracker(iou_threshold=0.3, high_conf=0.5, max_age=1.0)
         
-        # Actualizar historial de posiciones
-        history['positions'].append(position)
-        if len(history['positions']) > 10:  # Mantener solo las últimas 10 posiciones
-            history['positions'].pop(0)
+        # Socket para enviar datos de detección (al controlador, o al coordinador en modo shard)
+        self.unity_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.detection_address = detection_address
         
-        # Verificar tiempo mínimo de detección
-        detection_duration = current_time - history['first_seen']
+    def _detect(self, frame):
+        """
+        Ejecuta el detector de personas. Devuelve (boxes, confidences),
+        None si no hay detecciones o DETECTOR_FAILED si el ModelServer falló
+        (descartado, timeout o error).
+        """
+        if self.model_client:
+            detections = self.model_client.predict(frame, conf=0.25, classes=[0])
+            if detections is None:
+                return DETECTOR_FAILED
+            if len(detections.boxes) == 0:
+                return None
+            return detections.boxes, detections.confidences
         
-        # Si ya está confirmada, mantener la confirmación
-        if history['confirmed']:
-            return True
+        # Ejecutar detección con YOLOv8
+        with self.model_lock:
+            results = self.model.predict(frame, classes=[0], verbose=False)
         
-        # Si cumple el tiempo mínimo, confirmar la detección
-        if detection_duration >= self.MIN_DETECTION_TIME:
-            history['confirmed'] = True
-            return True
+        if results and len(results) > 0:
+            result = results[0]
             
-        return False
+            if hasattr(result, 'boxes') and len(result.boxes) > 0:
+                boxes = result.boxes.xyxy.cpu().numpy()
+                confidences = result.boxes.conf.cpu().numpy()
+                return boxes, confidences
+        
+        return None
     
-    def _cleanup_old_detections(self, current_time):
+    @timed('static_camera.detect')
+    def _detect_cached(self, frame, camera_id, frame_key):
         """
-        Limpia detecciones antiguas que ya no están activas
+        _detect con el cache por contenido del frame. En un acierto se devuelven
+        las mismas detecciones; el tracker y la validación igual avanzan con el
+        tiempo actual, así que un frame repetido cuenta como una observación más.
+        Una falla del detector no se guarda: el frame se descarta y el
+        siguiente igual vuelve a pasar por el detector.
         """
-        if current_time - self.last_cleanup_time < self.CLEANUP_INTERVAL:
-            return
-            
-        self.last_cleanup_time = current_time
-        
-        for camera_id in list(self.detection_history.keys()):
-            for track_id in list(self.detection_history[camera_id].keys()):
-                history = self.detection_history[camera_id][track_id]
-                if current_time - history['last_seen'] > self.MIN_DETECTION_TIME:
-                    del self.detection_history[camera_id][track_id]
+        hit = False
+        if self.detector_cache is not None and frame_key is not None:
+            hit, detections = self.detector_cache.get(camera_id, frame_key)
+        if hit:
+            CACHE_HITS.labels(camera_id).inc()
+            return detections
+        with INFERENCE_SECONDS.labels(camera_id).time():
+            detections = self._detect(frame)
+        if detections is DETECTOR_FAILED:
+            FRAMES_DROPPED.labels(camera_id, 'detector_error').inc()
+            return None
+        if self.detector_cache is not None and frame_key is not None:
+            self.detector_cache.put(camera_id, frame_key, detections)
+        return detections
     
-    def process_frame(self, frame, camera_id):
+    @timed('static_camera.process_frame')
+    def process_frame(self, frame, camera_id, frame_key=None):
         try:
             current_time = time.time()
-            self._cleanup_old_detections(current_time)
+            self.validator.cleanup(current_time)
             
-            # Ejecutar detección con YOLOv8
-            results = self.model.track(frame, persist=True, classes=[0])
+            detections = self._detect_cached(frame, camera_id, frame_key)
             
-            if results and len(results) > 0:
-                result = results[0]
+            if detections is not None:
+                # Procesar detecciones
+                boxes, confidences = detections
+                track_ids = self.tracker.update_stream(camera_id, boxes, confidences, current_time)
                 
-                if hasattr(result, 'boxes') and len(result.boxes) > 0:
-                    # Procesar detecciones
-                    boxes = result.boxes.xyxy.cpu().numpy()
-                    confidences = result.boxes.conf.cpu().numpy()
-                    track_ids = result.boxes.id.cpu().numpy() if result.boxes.id is not None else None
-                    
-                    # Dibujar detecciones
-                    annotated_frame = frame.copy()
-                    
-                    for i, box in enumerate(boxes):
-                        if confidences[i] > 0.5:  # Umbral de confianza
-                            x1, y1, x2, y2 = map(int, box)
-                            track_id = int(track_ids[i]) if track_ids is not None else i
+                # Dibujar detecciones
+                annotated_frame = frame.copy()
+                
+                for i, box in enumerate(boxes):
+                    if confidences[i] > self.conf_threshold and track_ids[i] >= 0:  # Umbral de confianza
+                        x1, y1, x2, y2 = map(int, box)
+                        # (camera_id, track_id) identifica al track de forma estable
+                        track_id = int(track_ids[i])
+                        
+                        # Calcular posición central normalizada
+                        position = {
+                            'x': (x1 + x2) / (2 * frame.shape[1]),
+                            'y': (y1 + y2) / (2 * frame.shape[0])
+                        }
+                        
+                        # Verificar si la detección es válida
+                        if self.validator.is_valid(camera_id, track_id, position, current_time):
+                            # Dibujar bbox en verde para detecciones confirmadas
+                            cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
                             
-                            # Calcular posición central normalizada
-                            position = {
-                                'x': (x1 + x2) / (2 * frame.shape[1]),
-                                'y': (y1 + y2) / (2 * frame.shape[0])
-                            }
+                            # Añadir texto de tiempo de tracking
+                            tracking_time = self.validator.tracking_time(camera_id, track_id, current_time)
+                            cv2.putText(annotated_frame, 
+                                      f"ID: {track_id} Time: {tracking_time:.1f}s",
+                                      (x1, y1 - 10),
+                                      cv2.FONT_HERSHEY_SIMPLEX,
+                                      0.5,
+                                      (0, 255, 0),
+                                      2)
                             
-                            # Verificar si la detección es válida
-                            if self._is_valid_detection(camera_id, track_id, position, current_time):
-                                # Dibujar bbox en verde para detecciones confirmadas
-                                cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                                
-                                # Añadir texto de tiempo de tracking
-                                tracking_time = current_time - self.detection_history[camera_id][track_id]['first_seen']
-                                cv2.putText(annotated_frame, 
-                                          f"ID: {track_id} Time: {tracking_time:.1f}s",
-                                          (x1, y1 - 10),
-                                          cv2.FONT_HERSHEY_SIMPLEX,
-                                          0.5,
-                                          (0, 255, 0),
-                                          2)
-                                
-                                # Enviar datos solo de detecciones confirmadas
-                                detection_data = {
-                                    'camera_id': camera_id,
-                                    'track_id': track_id,
-                                    'position': position,
-                                    'confidence': float(confidences[i]),
-                                    'tracking_time': tracking_time
-                                }
-                                self._send_detection_to_unity(detection_data)
-                            else:
-                                # Dibujar bbox en rojo para detecciones no confirmadas
-                                cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
-                    
-                    return annotated_frame
+                            DETECTIONS_CONFIRMED.labels(camera_id).inc()
+                            
+                            # Enviar datos solo de detecciones confirmadas
+                            detection_data = {
+                                'camera_id': camera_id,
+                                'track_id': track_id,
+                                'position': position,
+                                'confidence': float(confidences[i]),
+                                'tracking_time': tracking_time
+                            }
+                            if self.node_id is not None:
+                                detection_data['node_id'] = self.node_id
+                            self._send_detection_to_unity(detection_data)
+                        else:
+                            # Dibujar bbox en rojo para detecciones no confirmadas
+                            cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
+                
+                return annotated_frame
             
             return frame
         
@@ -177,70 +222,200 @@ class SecurityCameraSystem:
     def _send_detection_to_unity(self, detection_data):
         try:
             data_str = json.dumps(detection_data)
-            self.unity_socket.sendto(data_str.encode(), ('127.0.0.1', self.unity_detection_port))
+            self.unity_socket.sendto(data_str.encode(), self.detection_address)
+            DETECTIONS_SENT.inc()
         except Exception as e:
+            SEND_ERRORS.inc()
             logger.error(f"Error sending detection to Unity: {e}")
     
-    def _receive_camera_stream(self, camera_id):
+    def add_camera(self, camera_id):
+        """Empieza a recibir la cámara (puerto base_port + camera_id)"""
+        token = object()
+        with self.lock:
+            if camera_id in self.active_cameras:
+                return
+            self.active_cameras[camera_id] = token
+            previous = self.camera_threads.get(camera_id)
+            if self.hub_name is not None:
+                self.hub_events.setdefault(camera_id, threading.Event())
+                if self.hub_thread is None:
+                    self.hub_thread = threading.Thread(target=self._read_hub, name="FrameHubReader")
+                    self.hub_thread.daemon = True
+                    self.hub_thread.start()
+        # Si la cámara se acaba de quitar, esperar a que su hilo suelte el puerto
+        if previous is not None and previous.is_alive():
+            previous.join(timeout=2.0)
+        thread = threading.Thread(
+            target=self._receive_camera_stream,
+            args=(camera_id, token),
+            name=f"Camera-{camera_id}"
+        )
+        thread.daemon = True
+        with self.lock:
+            self.camera_threads[camera_id] = thread
+        thread.start()
+    
+    def remove_camera(self, camera_id):
+        """Deja de recibir la cámara; su hilo termina en menos de un segundo"""
+        with self.lock:
+            self.active_cameras.pop(camera_id, None)
+            self.frame_buffer.pop(camera_id, None)
+            self.hub_frames.pop(camera_id, None)
+    
+    def _is_active(self, camera_id, token):
+        return self.running and self.active_cameras.get(camera_id) is token
+    
+    def _receive_camera_stream(self, camera_id, token):
+        # Decodificar directamente a escala reducida (entrada de YOLO es 640),
+        # las posiciones enviadas a Unity son normalizadas así que no hace falta resize
+        decoder = FrameDecoder(target_size=(640, 480), resize=False)
+        if self.hub_name is not None:
+            self._receive_from_hub(camera_id, token, decoder)
+            return
+        
         port = self.base_port + camera_id
         sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         
-        try:
-            sock.bind(('0.0.0.0', port))
-            sock.settimeout(1.0)
-            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 65536)
-        except Exception as e:
-            logger.error(f"Error setting up socket for camera {camera_id}: {e}")
-            return
+        # Al reasignar cámaras entre nodos el puerto puede seguir ocupado un momento
+        while self._is_active(camera_id, token):
+            try:
+                sock.bind(('0.0.0.0', port))
+                sock.settimeout(1.0)
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 65536)
+                break
+            except OSError as e:
+                logger.error(f"Error setting up socket for camera {camera_id}: {e}")
+                time.sleep(0.5)
         
-        while self.running:
+        while self._is_active(camera_id, token):
             try:
                 data, _ = sock.recvfrom(65535)
-                
-                if len(data) < 4:
+                self._handle_datagram(camera_id, token, data, decoder)
+            except socket.timeout:
+                continue
+            except Exception as e:
+                logger.error(f"Error in reception for camera {camera_id}: {e}")
+                continue
+        
+        sock.close()
+    
+    def _read_hub(self):
+        """
+        Único lector del ring de FrameHub en este proceso. Copia el datagrama
+        de cada cámara activa y lo deja como el último de esa cámara; si su
+        hilo todavía no tomó el anterior, ese se cuenta como saltado.
+        """
+        subscriber = None
+        while self.running and subscriber is None:
+            try:
+                # Los frames que se pierden por atraso se cuentan al momento
+                subscriber = HubSubscriber(self.hub_name, on_skip=self._count_hub_skip)
+            except FileNotFoundError:
+                logger.error(f"Frame hub '{self.hub_name}' not running, retrying")
+                time.sleep(1.0)
+        
+        while self.running:
+            try:
+                frame = subscriber.next(timeout=1.0)
+                if frame is None or frame.camera_id not in self.active_cameras:
                     continue
-                
-                received_camera_id = struct.unpack('i', data[:4])[0]
-                if received_camera_id != camera_id:
+                # Copia antes de que el hub recicle el slot; el JPEG es chico
+                data = bytes(frame.data)
+                if not subscriber.valid(frame):
+                    FRAMES_DROPPED.labels(frame.camera_id, 'overwritten').inc()
                     continue
-                
-                img_data = data[4:]
-                nparr = np.frombuffer(img_data, np.uint8)
-                frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                
-                if frame is not None:
-                    processed_frame = self.process_frame(frame, camera_id)
-                    with self.lock:
-                        self.frame_buffer[camera_id] = processed_frame
-            
-            except socket.timeout:
+                with self.lock:
+                    if frame.camera_id not in self.active_cameras:
+                        continue
+                    if frame.camera_id in self.hub_frames:
+                        FRAMES_DROPPED.labels(frame.camera_id, 'skipped').inc()
+                    self.hub_frames[frame.camera_id] = data
+                    self.hub_events[frame.camera_id].set()
+            except Exception as e:
+                logger.error(f"Error reading frame hub: {e}")
                 continue
+        
+        if subscriber is not None:
+            subscriber.close()
+    
+    def _receive_from_hub(self, camera_id, token, decoder):
+        """Procesa el último datagrama que _read_hub dejó para la cámara"""
+        ready = self.hub_events[camera_id]
+        while self._is_active(camera_id, token):
+            try:
+                if not ready.wait(timeout=1.0):
+                    continue
+                with self.lock:
+                    ready.clear()
+                    data = self.hub_frames.pop(camera_id, None)
+                if data is not None:
+                    self._handle_datagram(camera_id, token, data, decoder)
             except Exception as e:
                 logger.error(f"Error in reception for camera {camera_id}: {e}")
                 continue
     
+    def _count_hub_skip(self, camera_id, count):
+        # None: sobrescrito antes de leer su header, puede ser de cualquier cámara y no se cuenta
+        if camera_id in self.active_cameras:
+            FRAMES_DROPPED.labels(camera_id, 'skipped').inc(count)
+    
+    def _handle_datagram(self, camera_id, token, data, decoder):
+        FRAMES_RECEIVED.labels(camera_id).inc()
+        
+        if len(data) < 4:
+            FRAMES_DROPPED.labels(camera_id, 'short').inc()
+            return
+        
+        received_camera_id = struct.unpack('i', data[:4])[0]
+        if received_camera_id != camera_id:
+            FRAMES_DROPPED.labels(camera_id, 'wrong_camera').inc()
+            return
+        
+        img_data = data[4:]
+        frame = decoder.decode(img_data)
+        
+        if frame is None:
+            FRAMES_DROPPED.labels(camera_id, 'decode_error').inc()
+            return
+        
+        frame_key = None
+        if self.detector_cache:
+            frame_key = self.detector_cache.key(data=img_data, frame=frame)
+        FRAMES_DECODED.labels(camera_id).inc()
+        processed_frame = self.process_frame(frame, camera_id, frame_key)
+        with self.lock:
+            if self.active_cameras.get(camera_id) is token:
+                self.frame_buffer[camera_id] = processed_frame
+        if self.preview:
+            self.preview.publish(camera_id, jpeg=img_data, frame=processed_frame)
+    
     def start(self):
         logger.info("Starting Security Camera System")
         
         # Iniciar hilos para cada cámara
-        threads = []
-        for i in range(self.num_cameras):
-            thread = threading.Thread(
-                target=self._receive_camera_stream,
-                args=(i,),
-                name=f"Camera-{i}"
-            )
-            thread.daemon = True
-            thread.start()
-            threads.append(thread)
+        for camera_id in self.camera_ids:
+            self.add_camera(camera_id)
+        
+        if self.preview:
+            self.preview.start()
         
         # Iniciar visualización
-        self._display_feeds()
+        if self.show_window:
+            self._display_feeds()
+        else:
+            self._wait_until_stopped()
         
         # Limpieza
         self.running = False
-        for thread in threads:
+        for thread in list(self.camera_threads.values()):
             thread.join()
+        if self.hub_thread is not None:
+            self.hub_thread.join()
+        
+    def _wait_until_stopped(self):
+        """Modo sin ventana: la vista previa se sirve solo por HTTP"""
+        while self.running:
+            time.sleep(0.5)
         
     def _display_feeds(self):
         cv2.namedWindow('Security Camera Feeds', cv2.WINDOW_NORMAL)
@@ -251,16 +426,16 @@ class SecurityCameraSystem:
                     frames = self.frame_buffer.copy()
                 
                 if frames:
-                    # Crear grid de 2x2 para las 4 cámaras
+                    # Crear grid de 2x2 para las primeras 4 cámaras de este proceso
                     rows = 2
                     cols = 2
                     cell_height = 480
                     cell_width = 640
                     grid = np.zeros((cell_height * rows, cell_width * cols, 3), dtype=np.uint8)
                     
-                    for camera_id, frame in frames.items():
-                        i = camera_id // cols
-                        j = camera_id % cols
+                    for index, (camera_id, frame) in enumerate(sorted(frames.items())[:rows * cols]):
+                        i = index // cols
+                        j = index % cols
                         frame_resized = cv2.resize(frame, (cell_width, cell_height))
                         grid[i*cell_height:(i+1)*cell_height, 
                              j*cell_width:(j+1)*cell_width] = frame_resized
@@ -285,14 +460,28 @@ class SecurityCameraSystem:
         """Detener el sistema y limpiar recursos"""
         logger.info("Stopping Security Camera System")
         self.running = False
+        if self.detector_cache:
+            for camera_id, stats in self.detector_cache.stats().items():
+                logger.info(f"Detector cache camera {camera_id}: {stats['hits']} hits, "
+                            f"{stats['misses']} misses ({stats['hit_rate']:.0%})")
+        if self.preview:
+            self.preview.stop()
+        if self.model_client:
+            self.model_client.close()
         cv2.destroyAllWindows()
         self.unity_socket.close()
 
 if __name__ == "__main__":
+    # kill -USR1 <pid> o http://127.0.0.1:9100/profile?seconds=10 para perfilar en vivo
+    enable_profiling()
     try:
         system = SecurityCameraSystem(
             num_cameras=4,  # Número de cámaras de seguridad
-            base_port=5124  # Puerto base para la comunicación
+            base_port=5124,  # Puerto base para la comunicación
+            preview_port=8080,  # Vista previa MJPEG en http://<host>:8080/grid
+            metrics_port=9100,  # Métricas en http://127.0.0.1:9100/metrics
+            hub_name=None,  # 'camera_hub' para leer de FrameHub.py y compartir los puertos con otros procesos
+            model_server=None  # ('127.0.0.1', 5600) para usar el modelo compartido de ModelServer.py
         )
         system.start()
     except KeyboardInterrupt:
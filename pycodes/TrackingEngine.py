@@ -0,0 +1,153 @@
+import numpy as np
+import threading
+import logging
+#this code is called TrackingEngine.py and is in the folder pycodes
+#it keeps the tracks of every camera separated, so the same model can detect for all the cameras
+#without mixing ids between feeds (the ultralytics tracker keeps a single state per model)
+
+logger = logging.getLogger(__name__)
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """IoU entre todas las cajas xyxy de boxes_a (N, 4) y boxes_b (M, 4)"""
+    if len(boxes_a) == 0 or len(boxes_b) == 0:
+        return np.zeros((len(boxes_a), len(boxes_b)), dtype=np.float32)
+    a = boxes_a[:, None, :]
+    b = boxes_b[None, :, :]
+    inter_w = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    inter_h = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = inter_w * inter_h
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return inter / np.maximum(area_a + area_b - inter, 1e-6)
+
+
+def greedy_match(scores, threshold):
+    """
+    Empareja filas y columnas por mayor puntaje primero.
+    Devuelve (filas, columnas) de los pares con puntaje >= threshold.
+    """
+    rows, cols = np.nonzero(scores >= threshold)
+    if len(rows) == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    order = np.argsort(-scores[rows, cols], kind='stable')
+    used_rows = set()
+    used_cols = set()
+    matched_rows = []
+    matched_cols = []
+    for r, c in zip(rows[order], cols[order]):
+        if r in used_rows or c in used_cols:
+            continue
+        used_rows.add(r)
+        used_cols.add(c)
+        matched_rows.append(r)
+        matched_cols.append(c)
+    return np.array(matched_rows, dtype=int), np.array(matched_cols, dtype=int)
+
+
+class MultiStreamTracker:
+    """
+    Tracker por IoU con estado independiente para cada stream (cámara o dron).
+
+    Sigue la idea de ByteTrack: primero se asocian las detecciones de alta
+    confianza, luego las de baja confianza con los tracks que quedaron libres,
+    y solo las de alta confianza crean tracks nuevos. Los tracks de todos los
+    streams viven en los mismos arrays, y la asociación de un batch con varios
+    streams se hace en una sola matriz de IoU donde los pares de streams
+    distintos se anulan. Los ids son únicos dentro de cada stream, así que la
+    llave estable de un track es (stream_id, track_id).
+    """
+
+    def __init__(self, iou_threshold=0.3, high_conf=0.5, max_age=1.0):
+        self.iou_threshold = iou_threshold
+        self.high_conf = high_conf
+        self.max_age = max_age  # segundos sin verse antes de borrar un track
+
+        self.lock = threading.Lock()
+        self.streams = np.zeros(0, dtype=np.int64)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.boxes = np.zeros((0, 4), dtype=np.float32)
+        self.velocities = np.zeros((0, 4), dtype=np.float32)
+        self.last_seen = np.zeros(0, dtype=np.float64)
+        self.next_id = {}
+
+    def update_stream(self, stream_id, boxes, confidences, current_time):
+        """Atajo para un solo stream, devuelve los ids alineados con boxes"""
+        return self.update({stream_id: (boxes, confidences)}, current_time)[stream_id]
+
+    def update(self, batch, current_time):
+        """
+        batch: {stream_id: (boxes (N, 4) xyxy, confidences (N,))}
+        Devuelve {stream_id: track_ids (N,)}; -1 para detecciones de baja
+        confianza que no se asociaron a ningún track.
+        """
+        stream_ids = list(batch)
+        det_boxes = [np.asarray(batch[s][0], dtype=np.float32).reshape(-1, 4) for s in stream_ids]
+        det_conf = [np.asarray(batch[s][1], dtype=np.float32).reshape(-1) for s in stream_ids]
+        counts = [len(b) for b in det_boxes]
+        det_streams = np.repeat(np.array(stream_ids, dtype=np.int64), counts)
+        det_boxes = np.concatenate(det_boxes) if det_boxes else np.zeros((0, 4), dtype=np.float32)
+        det_conf = np.concatenate(det_conf) if det_conf else np.zeros(0, dtype=np.float32)
+        det_ids = np.full(len(det_boxes), -1, dtype=np.int64)
+
+        with self.lock:
+            self._prune(current_time)
+
+            # Solo los tracks de los streams de este batch participan
+            active = np.nonzero(np.isin(self.streams, det_streams))[0]
+            dt = (current_time - self.last_seen[active])[:, None]
+            predicted = self.boxes[active] + self.velocities[active] * dt
+
+            scores = iou_matrix(predicted, det_boxes)
+            scores[self.streams[active][:, None] != det_streams[None, :]] = 0
+
+            high = det_conf >= self.high_conf
+            free_tracks = np.ones(len(active), dtype=bool)
+            for stage in (high, ~high):
+                stage_scores = scores * free_tracks[:, None] * stage[None, :]
+                rows, cols = greedy_match(stage_scores, self.iou_threshold)
+                free_tracks[rows] = False
+                self._refresh(active[rows], det_boxes[cols], current_time)
+                det_ids[cols] = self.ids[active[rows]]
+
+            new = np.nonzero(high & (det_ids < 0))[0]
+            if len(new):
+                det_ids[new] = self._create(det_streams[new], det_boxes[new], current_time)
+
+        result = {}
+        start = 0
+        for stream_id, count in zip(stream_ids, counts):
+            result[stream_id] = det_ids[start:start + count]
+            start += count
+        return result
+
+    def _refresh(self, indices, boxes, current_time):
+        if len(indices) == 0:
+            return
+        dt = np.maximum(current_time - self.last_seen[indices], 1e-3)[:, None]
+        velocity = (boxes - self.boxes[indices]) / dt
+        self.velocities[indices] = 0.5 * self.velocities[indices] + 0.5 * velocity
+        self.boxes[indices] = boxes
+        self.last_seen[indices] = current_time
+
+    def _create(self, streams, boxes, current_time):
+        ids = np.empty(len(streams), dtype=np.int64)
+        for i, stream_id in enumerate(streams.tolist()):
+            ids[i] = self.next_id.get(stream_id, 1)
+            self.next_id[stream_id] = ids[i] + 1
+        self.streams = np.concatenate([self.streams, streams])
+        self.ids = np.concatenate([self.ids, ids])
+        self.boxes = np.concatenate([self.boxes, boxes])
+        self.velocities = np.concatenate([self.velocities, np.zeros_like(boxes)])
+        self.last_seen = np.concatenate([self.last_seen, np.full(len(streams), current_time)])
+        return ids
+
+    def _prune(self, current_time):
+        alive = (current_time - self.last_seen) <= self.max_age
+        if alive.all():
+            return
+        self.streams = self.streams[alive]
+        self.ids = self.ids[alive]
+        self.boxes = self.boxes[alive]
+        self.velocities = self.velocities[alive]
+        self.last_seen = self.last_seen[alive]
@@ -10,11 +10,15 @@ import numpy as np
 # Import os utilities
 import os
 import signal
+import json
 
 # Importing flask module for a WSGI application
 # Additionally, importing json and request utilities
 from flask import Flask, jsonify, request
 
+# Binary transport of agent arrays (JSON is still the default)
+from BinaryTransport import is_binary_request, wants_binary, read_array, array_response
+
 #########################################################
 #                   Flask Server                        #
 #########################################################
@@ -45,17 +49,34 @@ def step():
     method. Finally, it sends a JSON response with all next 
     actions of the agents.
     """
-    # Converts the list of wealths into an AttrIter (list of atributes)
-    # and updates the wealth of all agents
-    model.agents.wealth = ap.AttrIter(eval(request.form['wealthList']))
+    # Parses the list of wealths (without eval) and updates the
+    # wealth of all agents. It can come as a raw buffer of int32
+    # (Content-Type: application/octet-stream) or as a form field.
+    # If the client does not send it (e.g. a population too large
+    # to render), the model applies the previous actions by itself.
+    try:
+        if is_binary_request(request):
+            wealth = read_array(request, '<i4')
+            if len(wealth) != model.p.agents:
+                raise ValueError(f"Expected {model.p.agents} wealths, got {len(wealth)}")
+            model.set_wealth(wealth)
+        elif 'wealthList' in request.form:
+            model.set_wealth(parse_wealth_list(request.form['wealthList'], model.p.agents))
+        elif model.engine is not None:
+            model.engine.apply(model.actions)
+    except ValueError as e:
+        return jsonify({'error' : str(e)}), 400
     # Executes model's step() manually (this is 'model.sim_step()', 
     # instead of model.step()) (See more in the agentpy's documentation)
     model.sim_step()
     # Calls model's update()
     model.update()
-    # Send a JSON response with the list of next actions 
-    # (see the class WealthModel)
-    return jsonify({'actions' : model.actions})
+    # Send a response with the list of next actions 
+    # (see the class WealthModel), as int32 if the client asked
+    # for binary, otherwise as JSON
+    if wants_binary(request):
+        return array_response(model.actions, '<i4')
+    return jsonify({'actions' : np.asarray(model.actions).tolist()})
     # else:
     """
     If the simulation is not running, then kill the server.
@@ -81,6 +102,9 @@ def setup():
     """
     # Send JSON response about number of agents, and initial wealth,
     # taken from model parameters (model.p)
+    # (binary: two int32 values [agents, wealths])
+    if wants_binary(request):
+        return array_response([model.p.agents, model.p.wealths], '<i4')
     return jsonify({'agents' : model.p.agents, 'wealths' : model.p.wealths})
 
 
@@ -92,12 +116,138 @@ def setup():
 def gini(x):
 
     """ Calculate Gini Coefficient """
-    # By Warren Weckesser https://stackoverflow.com/a/39513799
+    # Same value as half the relative mean absolute difference
+    # (Warren Weckesser https://stackoverflow.com/a/39513799), but from the
+    # sorted values in O(n log n) instead of building an n x n matrix:
+    # G = sum((2i - n - 1) * x_i) / (n * sum(x)), i = 1..n over sorted x
+
+    x = np.sort(np.asarray(x, dtype=np.float64))
+    n = len(x)
+    index = np.arange(1, n + 1)
+    return np.sum((2 * index - n - 1) * x) / (n * np.sum(x))
+
+
+def parse_wealth_list(text, n_agents):
+
+    """
+    Parse the list of wealths sent by the client, e.g. "[1, 0, 2]",
+    straight into a numpy array (instead of eval'ing it).
+    """
+
+    # Strict: a trailing comma or a non-integer is an error, not a 0.
+    # The brackets are optional (eval also accepted "1, 0, 2")
+    body = text.strip()
+    if not body.startswith('['):
+        body = '[' + body + ']'
+    values = json.loads(body)
+    if not isinstance(values, list) or not all(type(v) is int for v in values):
+        raise ValueError("wealthList must be a flat list of integers")
+    wealth = np.asarray(values, dtype=np.int64)
+    if len(wealth) != n_agents:
+        raise ValueError(f"Expected {n_agents} wealths, got {len(wealth)}")
+    return wealth
+
+
+class WealthEngine:
+
+    """
+    Vectorized version of the WealthAgents' step.
+
+    Holds the wealth of all agents in a numpy array and produces the
+    actions of a whole step at once: the partners are drawn in a single
+    RNG call (the same draw WealthModel does for the agentpy path, so
+    both paths give the same actions for the same seed), and the
+    actions are returned as an array [giver, receiver, ...] of agent
+    ids (starting at 1, like agentpy).
+    """
+
+    def __init__(self, n_agents, initial_wealth, rng):
+        self.n_agents = n_agents
+        self.rng = rng
+        self.wealth = np.full(n_agents, initial_wealth, dtype=np.int64)
+
+    def step(self):
+
+        # One partner per agent, in one call
+        partners = self.rng.integers(0, self.n_agents, size=self.n_agents)
+
+        # Only the agents with wealth give a coin
+        givers = np.nonzero(self.wealth > 0)[0]
+        actions = np.empty(2 * len(givers), dtype=np.int64)
+        actions[0::2] = givers + 1
+        actions[1::2] = partners[givers] + 1
+        return actions
+
+    def apply(self, actions):
+
+        # Execute the actions here instead of on the client
+        actions = np.asarray(actions, dtype=np.int64)
+        np.add.at(self.wealth, actions[0::2] - 1, -1)
+        np.add.at(self.wealth, actions[1::2] - 1, 1)
+
+
+class IncrementalGini:
+
+    """
+    Gini Coefficient updated from the coin transfers of each step.
+
+    Keeps the wealth of every agent and a histogram of how many agents
+    have each (integer) wealth. Applying a step's transfers only touches
+    the agents that gave or received a coin, and the coefficient is then
+    computed from the histogram in O(max wealth), without sorting all
+    the agents again.
+    """
+
+    def __init__(self, wealth):
+        self.reset(wealth)
+
+    def reset(self, wealth):
+
+        # Rebuild the state from a full list of wealths
+        self.wealth = np.asarray(wealth, dtype=np.int64).copy()
+        self.histogram = np.bincount(self.wealth)
+
+    def apply_transfers(self, actions):
+
+        """
+        Apply a list of actions in the WealthModel format:
+        [giver, receiver, giver, receiver, ...] (agent ids start at 1)
+        """
+
+        actions = np.asarray(actions, dtype=np.int64)
+        if len(actions) == 0:
+            return
+
+        # Net change of wealth for every agent that took part
+        ids = actions - 1
+        signs = np.tile([-1, 1], len(actions) // 2)
+        agents, inverse = np.unique(ids, return_inverse=True)
+        delta = np.bincount(inverse, weights=signs).astype(np.int64)
+        changed = delta != 0
+        agents, delta = agents[changed], delta[changed]
+
+        old = self.wealth[agents]
+        new = old + delta
+        self.wealth[agents] = new
+
+        # Move those agents between histogram bins
+        if new.max() >= len(self.histogram):
+            self.histogram = np.pad(self.histogram, (0, new.max() + 1 - len(self.histogram)))
+        np.subtract.at(self.histogram, old, 1)
+        np.add.at(self.histogram, new, 1)
+
+    @property
+    def value(self):
+
+        # A block of c agents with wealth v, after r poorer agents, adds
+        # v * c * (2r + c - n) to the sorted Gini sum
+        counts = self.histogram
+        values = np.arange(len(counts))
+        before = np.cumsum(counts) - counts
+        n = counts.sum()
+        total = np.sum(values * counts)
+        return np.sum(values * counts * (2 * before + counts - n)) / (n * total)
 
-    x = np.array(x)
-    mad = np.abs(np.subtract.outer(x, x)).mean()  # Mean absolute difference
-    rmad = mad / np.mean(x)  # Relative mean absolute difference
-    return 0.5 * rmad
 
 class WealthModel(ap.Model):
 
@@ -114,15 +264,63 @@ class WealthModel(ap.Model):
         # Define a list of next actions from all agents  
         self.actions = []
 
-        # Instantiate all agents (WealthAgents)
-        self.agents = ap.AgentList(self,self.p.agents,WealthAgent)
+        if self.p.get('vectorized', False):
+            # Large populations: keep the wealths in a numpy array
+            # instead of one WealthAgent per agent
+            self.engine = WealthEngine(self.p.agents, self.p.wealths, self.nprandom)
+            self.agents = None
+        else:
+            self.engine = None
+            # Instantiate all agents (WealthAgents)
+            self.agents = ap.AgentList(self,self.p.agents,WealthAgent)
+
+        # Optionally, track the Gini Coefficient from the transfers
+        # instead of recomputing it from all the wealths every step
+        self.gini_tracker = None
+        if self.p.get('incremental_gini', False):
+            self.gini_tracker = IncrementalGini(self.wealth)
+            self.applied_actions = []
+            # Step whose transfers the tracker already has (update() can
+            # be called more than once per step, e.g. from /step)
+            self.tracked_step = self.t
+
+
+    @property
+    def wealth(self):
+
+        # Wealth of all agents, ordered by agent id
+        if self.engine is not None:
+            return self.engine.wealth
+        return np.asarray(list(self.agents.wealth))
+
+
+    def set_wealth(self, wealth):
+
+        # Update the wealth of all agents (from the client)
+        if self.engine is not None:
+            self.engine.wealth[:] = wealth
+        else:
+            self.agents.wealth = ap.AttrIter(wealth.tolist())
+
+        # The client's wealths already include the pending actions,
+        # rebuild the tracker from them instead of applying those again
+        if self.gini_tracker is not None:
+            self.gini_tracker.reset(wealth)
+            self.applied_actions = []
         
 
     def step(self):
 
+        if self.engine is not None:
+            self.actions = self.engine.step()
+            return
+
         # Reset the list of next actions
         self.actions = []
 
+        # Draw every partner at once (the same draw as WealthEngine)
+        self.partners = self.nprandom.integers(0, self.p.agents, size=self.p.agents)
+
         # Call agents' step()
         self.agents.step()
         
@@ -130,7 +328,22 @@ class WealthModel(ap.Model):
     def update(self):
 
         # Record agents' Gini Coefficient
-        self.record('Gini Coefficient', gini(self.agents.wealth))
+        if self.gini_tracker is not None:
+            # The current wealths are the result of the actions sent
+            # on the previous step: apply them once per step
+            if self.tracked_step != self.t:
+                self.gini_tracker.apply_transfers(self.applied_actions)
+                self.applied_actions = self.actions
+                self.tracked_step = self.t
+            self.record('Gini Coefficient', self.gini_tracker.value)
+            # Optionally, verify it against the full computation
+            if self.p.get('check_gini', False):
+                exact = gini(self.wealth)
+                if not np.isclose(self.gini_tracker.value, exact):
+                    raise RuntimeError(f"Incremental Gini {self.gini_tracker.value} "
+                                       f"differs from {exact} on step {self.t}")
+        else:
+            self.record('Gini Coefficient', gini(self.wealth))
 
         # If the simulation has reached max steps then stop simulation
         if self.t >= self._steps:
@@ -140,7 +353,10 @@ class WealthModel(ap.Model):
     def end(self):
 
         # Reccord final wealth of all agents
-        self.agents.record('wealth')
+        if self.engine is not None:
+            self.final_wealth = self.engine.wealth.copy()
+        else:
+            self.agents.record('wealth')
 
         # End of simulation message
         print(f"\nModel ended on step {self.t}\n")
@@ -174,9 +390,9 @@ class WealthAgent(ap.Agent):
 
         if self.wealth > 0:
 
-            # Select a random partner 
-            # (and deconvert it from the AgentIter class)
-            partner = self.model.agents.random().to_list()[0]
+            # Select a random partner
+            # (drawn by the model for all agents at once)
+            partner = self.model.agents[self.model.partners[self.id - 1]]
 
             # Save the 'action' of 'From whom give a coin'
             # by agent's id
@@ -209,7 +425,10 @@ def simStop():
     plt.show()
 
     # Visualize agent wealth accumulation
-    sns.histplot(data=results.variables.WealthAgent, binwidth=1)
+    if model.engine is not None:
+        sns.histplot(data=model.final_wealth, binwidth=1)
+    else:
+        sns.histplot(data=results.variables.WealthAgent, binwidth=1)
     plt.show()
 
 
@@ -227,7 +446,16 @@ if __name__ == '__main__':
     parameters = {
         'agents' : 100,
         'steps' : 100,
-        'wealths' : 1
+        'wealths' : 1,
+        # For large populations: update the Gini Coefficient from
+        # the coin transfers, and step all agents as numpy arrays
+        'incremental_gini' : False,
+        # Compare the incremental Gini with gini() on every step
+        'check_gini' : False,
+        'vectorized' : False,
+        # Set a seed to reproduce a run (both paths give the
+        # same actions for the same seed)
+        'seed' : None
     }
 
     # Create model with parameters
@@ -6,6 +6,7 @@ import json
 import threading
 import logging
 import time
+import EnvironmentConfig
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -41,9 +42,9 @@ class DroneAgent(ap.Agent):
         if current_time - self.last_detection_time < self.detection_cooldown:
             return False
 
-        if 'confidence' in detection and detection['confidence'] > 0.6:
+        if 'confidence' in detection and detection['confidence'] > self.p.get('target_confidence', 0.6):
             self.current_target = (
-                self.p.camera_positions[detection['camera_id']]
+                EnvironmentConfig.current().camera_position(detection['camera_id'])
                 if 'camera_id' in detection
                 else detection.get('position')
             )
@@ -98,13 +99,8 @@ class DroneEnvironment(ap.Environment):
     """Environment managing drone agents and their interactions"""
     
     def setup(self):
-        # Environment configuration
-        self.camera_positions = {
-            0: {'x': -2.833347, 'y': 2.0, 'z': 16.74295},
-            1: {'x': -37.0, 'y': 4.0, 'z': 51.0},
-            2: {'x': 36.0, 'y': 2.0, 'z': -35.0},
-            3: {'x': 28.24, 'y': 4.0, 'z': -104.0}
-        }
+        # Cámaras desde environment_config.json (compartido con controller4.py y Controller2.py)
+        EnvironmentConfig.watch()
         
         # Setup communication sockets
         self.detection_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
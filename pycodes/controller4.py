@@ -5,10 +5,23 @@ import json
 import threading
 import logging
 import time
+import EnvironmentConfig
+from DetectionFusion import DetectionFusion, load_calibrations
+from ExplorationPlanner import ExplorationPlanner
+from PathPlanner import NavigationGraph, DEFAULT_PATH as NAVIGATION_PATH
+from ServiceLogging import setup_logging, log_event
+from ServiceMetrics import counter, gauge, histogram, start_metrics_server
+from ServiceProfiler import timed, enable_profiling
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+DETECTIONS_RECEIVED = counter('drone_controller_detections_received_total', 'Detections received', ['source'])
+INTRUDER_EVENTS = counter('drone_controller_intruder_events_total', 'Fused intruder events delivered to the drones')
+DECISIONS = counter('drone_controller_decisions_total', 'Decisions returned to Unity', ['decision'])
+DECISION_SECONDS = histogram('drone_controller_decision_seconds', 'Time to answer /get_decisions')
+EXPLORATION_COVERAGE = gauge('drone_controller_exploration_coverage', 'Fraction of the map covered recently')
+SECURITY_CONNECTED = gauge('drone_controller_security_connected', '1 while connected to the security server')
+
 app = Flask(__name__)
 
 class DroneAgent(ap.Agent):
@@ -19,26 +32,31 @@ class DroneAgent(ap.Agent):
     def setup(self):
         # Agent state variables
         self.security_socket = None
-        self.connect_to_security_server()
+        if not self.model.headless:
+            self.connect_to_security_server()
 
         self.landing_commanded_executed = False
         self.position = {'x': 0, 'y': 0, 'z': 0}
         self.current_target = None
         self.last_target_time = 0
-        self.target_timeout = 10.0
+        self.target_timeout = self.p.get('target_timeout', 10.0)
         self.wait_because_see_human = False
         self.last_human_detection_time = 0
-        self.human_detection_timeout = 5.0
+        self.human_detection_timeout = self.p.get('human_detection_timeout', 5.0)
         self.exploring = False
+        self.explore_target = None
         self.last_explore_time = 0
-        self.explore_cooldown = 10.0
+        self.explore_cooldown = self.p.get('explore_cooldown', 10.0)
         self.starting = True
         
         self.landing_commanded = False
 
         # Detection timing
         self.last_detection_time = 0
-        self.detection_cooldown = 3.0
+        self.detection_cooldown = self.p.get('detection_cooldown', 3.0)
+        # Confianza mínima para ir a una detección y para alertar al servidor de seguridad
+        self.target_confidence = self.p.get('target_confidence', 0.8)
+        self.alert_confidence = self.p.get('alert_confidence', 0.9)
 
     def connect_to_security_server(self):
         try:
@@ -54,12 +72,12 @@ class DroneAgent(ap.Agent):
         """Update the agent's position"""
         self.position = new_position
 
-    def process_detection(self, detection, current_time, camera_positions=None):
+    def process_detection(self, detection, current_time, environment=None):
         """Process incoming detection data"""
         if current_time - self.last_detection_time < self.detection_cooldown:
             return False
 
-        if 'confidence' in detection and detection['confidence'] > 0.9 and detection.get('type') == 'human':
+        if 'confidence' in detection and detection['confidence'] > self.alert_confidence and detection.get('type') == 'human':
             # Enviar alerta al servidor de seguridad
             if self.security_socket:
                 try:
@@ -70,12 +88,15 @@ class DroneAgent(ap.Agent):
                     # Intentar reconectar si falla el envío
                     self.connect_to_security_server()
 
-        if 'confidence' in detection and detection['confidence'] > 0.8:
-            if 'camera_id' in detection and camera_positions:
-                self.current_target = camera_positions[detection['camera_id']]
+        if 'confidence' in detection and detection['confidence'] > self.target_confidence:
+            if 'camera_id' in detection and environment:
+                self.current_target = environment.camera_position(detection['camera_id'])
                 logger.info(f"new detection in camera {detection['camera_id']} with confidence {detection['confidence']}")
             elif 'position' in detection:
                 self.current_target = detection['position']
+                if detection.get('type') == 'intruder':
+                    logger.info(f"new intruder track {detection['track_id']} at {detection['position']} "
+                                f"seen by cameras {detection['cameras']}")
             self.last_target_time = current_time
             self.last_detection_time = current_time
             self.exploring = False
@@ -87,6 +108,7 @@ class DroneAgent(ap.Agent):
             return True
         return False
 
+    @timed('drone_controller.make_decision')
     def make_decision(self, current_time):
         """Determine next action based on current state"""
         # Check human detection timeout
@@ -102,6 +124,7 @@ class DroneAgent(ap.Agent):
         if self.landing_commanded:
             self.landing_commanded_executed = True
             self.landing_commanded = False
+            self._stop_exploring()
             logger.info("Executing landing command")
             return {
                 "decision": "land",
@@ -109,7 +132,8 @@ class DroneAgent(ap.Agent):
             }
 
         if self.landing_commanded_executed:
-            logger.info("Landed or so, doing nothing")
+            self._stop_exploring()
+            log_event(logger, logging.INFO, 'decision', decision='do_nothing_aterrizing')
             return {
                 "decision": "do_nothing_aterrizing",
                 "target": None
@@ -122,7 +146,9 @@ class DroneAgent(ap.Agent):
                 logger.info("Human detection timeout reached, resuming normal operation")
                 self.wait_because_see_human = False
             else:
-                logger.info("Waiting because of human detection")
+                self._stop_exploring()
+                log_event(logger, logging.INFO, 'decision', decision='move_to_target_human',
+                          reason='waiting because of human detection')
                 return {
                     "decision": "move_to_target_human",
                     "target": self.position
@@ -130,60 +156,121 @@ class DroneAgent(ap.Agent):
 
         # Handle active target
         if self.current_target and (current_time - self.last_target_time) < self.target_timeout:
-            self.exploring = False
-            logger.info(f"Moving to camera target {self.current_target}")
-            return {
-                "decision": "move_to_target",
-                "target": self.current_target
-            }
+            self._stop_exploring()
+            log_event(logger, logging.INFO, 'decision', decision='move_to_target',
+                      target=self.current_target)
+            return self._route("move_to_target", self.current_target)
 
         # Handle exploration
         self.current_target = None
-        if not self.exploring or (current_time - self.last_explore_time) >= self.explore_cooldown:
+        explorer = self.model.explorer
+        if (not self.exploring or (current_time - self.last_explore_time) >= self.explore_cooldown
+                or (explorer and explorer.reached(self.id, self.position))):
             self.exploring = True
             self.last_explore_time = current_time
+            # Con el planificador cada drone va a la zona menos vista que no tenga otro drone
+            self.explore_target = explorer.assign(self.id, self.position, current_time) if explorer else None
+            if self.explore_target is not None:
+                logger.info(f"Exploring towards {self.explore_target}")
+                return self._route("explore_waypoint", self.explore_target)
             logger.info("Exploring")
             return {
                 "decision": "explore",
                 "target": None
             }
         
-        logger.info("Continuing exploration")
+        if self.explore_target is not None:
+            # Camino actualizado desde la posición actual hasta el waypoint de exploración
+            log_event(logger, logging.INFO, 'decision', decision='explore_waypoint')
+            return self._route("explore_waypoint", self.explore_target)
+        
+        log_event(logger, logging.INFO, 'decision', decision='continue')
         return {
             "decision": "continue",
             "target": None
         }
 
+    def _stop_exploring(self):
+        """Suelta el waypoint reclamado en el planificador para que lo tome otro drone"""
+        if self.exploring and self.model.explorer:
+            self.model.explorer.release(self.id)
+        self.exploring = False
+        self.explore_target = None
+
+    def _route(self, decision, target):
+        """Decisión con el target final y los waypoints del camino (el primero es el siguiente)"""
+        # Las detecciones de drones traen posición en la imagen (x, y), sin z: no hay camino que planear
+        waypoints = self.model.navigation.plan(self.position, target) if 'z' in target else []
+        return {
+            "decision": decision,
+            "target": target,
+            "waypoints": waypoints
+        }
+
 class DroneModel(ap.Model):
     """Main model coordinating the drone system"""
     
+    # En DroneSimulation.py: sin sockets ni hilos, y el reloj es simulado
+    headless = False
+    
     def setup(self):
-        # Environment configuration
-        self.camera_positions = {
-            0: {'x': -2.833347, 'y': 2.0, 'z': 16.74295},
-            1: {'x': -37.0, 'y': 4.0, 'z': 51.0},
-            2: {'x': 36.0, 'y': 2.0, 'z': -35.0},
-            3: {'x': 28.24, 'y': 4.0, 'z': -104.0}
-        }
+        self.headless = self.p.get('headless', self.headless)
+        # Reloj de las detecciones y decisiones (DroneSimulation.py lo reemplaza por uno simulado)
+        self.clock = time.time
+        
+        # Cámaras desde environment_config.json, se recarga sola cuando cambia el archivo.
+        # En modo headless cada corrida usa un solo snapshot de principio a fin (determinista)
+        environment_file = self.p.get('environment_file', EnvironmentConfig.DEFAULT_PATH)
+        if self.headless:
+            environment = EnvironmentConfig.current(environment_file)
+        else:
+            environment = EnvironmentConfig.watch(environment_file)
+        self.environment = environment
+        
+        # Fusión de detecciones entre cámaras: un track por intruso en coordenadas del mundo.
+        # Las cámaras sin calibración en camera_calibration.json usan su posición fija
+        self.fusion = DetectionFusion(self._load_calibrations(environment))
+        if not self.headless:
+            EnvironmentConfig.subscribe(self._on_environment_change)
+        
+        # Grafo de navegación del dungeon (navigation_map.json), con los caminos a las cámaras precalculados
+        self.navigation = self._load_navigation(environment)
+        
+        # Planificador de exploración sobre el grid de cobertura ('exploration': None lo desactiva)
+        self.explorer = None
+        if self.p.get('exploration', {}) is not None:
+            self.explorer = ExplorationPlanner(self.navigation.bounds, cell_size=self.navigation.cell_size,
+                                               free=self.navigation.free, **self.p.get('exploration', {}))
+            EXPLORATION_COVERAGE.set_function(self.explorer.coverage)
         
         # Create agents
         n_drones = self.p.get('n_drones', 1)
         self.agents = ap.AgentList(self, n_drones, DroneAgent)
         
+        # Sin sockets ni hilos en modo headless (simulación): las detecciones llegan por ingest_*
+        self.running = True
+        self.detection_socket = self.dron_detection_socket = None
+        self.command_socket = self.security_socket = None
+        if not self.headless:
+            self._setup_io()
+
+    def _setup_io(self):
         # Setup communication sockets
         self.detection_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.detection_socket.bind(('0.0.0.0', 5556))
+        self.detection_socket.bind(('0.0.0.0', self.p.get('detection_port', 5556)))
         self.detection_socket.settimeout(1.0)
 
         self.dron_detection_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.dron_detection_socket.bind(('0.0.0.0', 5557))
+        self.dron_detection_socket.bind(('0.0.0.0', self.p.get('dron_detection_port', 5557)))
         self.dron_detection_socket.settimeout(1.0)
 
-        # New command socket for receiving landing commands
-        self.command_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.command_socket.bind(('0.0.0.0', 5782))
-        self.command_socket.listen(1)
-        self.command_socket.settimeout(1.0)
+        # New command socket for receiving landing commands (None en los workers de DronePartitions.py)
+        self.command_socket = None
+        if self.p.get('command_port', 5782) is not None:
+            self.command_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.command_socket.bind(('0.0.0.0', self.p.get('command_port', 5782)))
+            self.command_socket.listen(1)
+            self.command_socket.settimeout(1.0)
 
         # Modificar la conexión al servidor de seguridad
         self.security_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -198,12 +285,29 @@ class DroneModel(ap.Model):
 
 
 
+        if self.p.get('metrics_port') is not None:
+            SECURITY_CONNECTED.set_function(lambda: 1 if self.security_socket else 0)
+            start_metrics_server(self.p['metrics_port'])
+
         # Start detection threads
-        self.running = True
         self.start_detection_threads()
         self.start_security_thread()
 
 
+    def _load_calibrations(self, environment):
+        return load_calibrations(environment.camera_positions,
+                                 self.p.get('calibration_file', 'camera_calibration.json'))
+
+    def _load_navigation(self, environment):
+        return NavigationGraph.load(environment, self.p.get('navigation_file', NAVIGATION_PATH))
+
+    def _on_environment_change(self, environment):
+        self.environment = environment
+        # Cámaras nuevas o movidas: se reemplaza el dict entero, update() ve uno u otro
+        self.fusion.calibrations = self._load_calibrations(environment)
+        # Igual con el grafo: los caminos precalculados son hacia las cámaras
+        self.navigation = self._load_navigation(environment)
+
     def start_security_thread(self):
         """Start thread for receiving from security agent"""
         self.security_thread = threading.Thread(target=self._handle_security_commands)
@@ -252,10 +356,7 @@ class DroneModel(ap.Model):
             try:
                 data, _ = self.detection_socket.recvfrom(65535)
                 detection = json.loads(data.decode())
-                current_time = time.time()
-                
-                for agent in self.agents:
-                    agent.process_detection(detection, current_time, self.camera_positions)
+                self.ingest_static_detection(detection, self.clock())
                     
             except socket.timeout:
                 continue
@@ -268,16 +369,28 @@ class DroneModel(ap.Model):
             try:
                 data, _ = self.dron_detection_socket.recvfrom(65535)
                 detection = json.loads(data.decode())
-                current_time = time.time()
-                
-                for agent in self.agents:
-                    agent.process_detection(detection, current_time)
+                self.ingest_drone_detection(detection, self.clock())
                     
             except socket.timeout:
                 continue
             except Exception as e:
                 logger.error(f"Drone detection processing error: {e}")
 
+    def ingest_static_detection(self, detection, current_time):
+        """Detección de una cámara estática (formato de StaticCameras.py)"""
+        DETECTIONS_RECEIVED.labels('static_camera').inc()
+        # Solo llega un evento por intruso, con su posición en el mundo
+        for event in self.fusion.update([detection], current_time):
+            INTRUDER_EVENTS.inc()
+            for agent in self.agents:
+                agent.process_detection(event, current_time, self.environment)
+
+    def ingest_drone_detection(self, detection, current_time):
+        """Detección de la cámara de un drone (formato de CameraController.py)"""
+        DETECTIONS_RECEIVED.labels('drone').inc()
+        for agent in self.agents:
+            agent.process_detection(detection, current_time)
+
     def step(self):
         """Model step - not used in this real-time system"""
         pass
@@ -285,29 +398,55 @@ class DroneModel(ap.Model):
     def end(self):
         """Clean shutdown"""
         self.running = False
-        self.detection_socket.close()
-        self.dron_detection_socket.close()
+        # La lista de EnvironmentConfig no debe mantener vivo al modelo
+        EnvironmentConfig.unsubscribe(self._on_environment_change)
+        if self.detection_socket:
+            self.detection_socket.close()
+        if self.dron_detection_socket:
+            self.dron_detection_socket.close()
+        if self.command_socket:
+            self.command_socket.close()
         if self.security_socket:
             self.security_socket.close()
 
-# Global model instance
-drone_model = DroneModel({'n_drones': 1})
-drone_model.setup()
+# Global model instance, se crea con create_model (aquí abajo o en DronePartitions.py)
+drone_model = None
+
+def create_model(params):
+    """Modelo del servicio (controller4.py o un worker de DronePartitions.py)"""
+    global drone_model
+    # El logging se configura aquí y no al importar: DroneSimulation y ExperimentRunner
+    # importan este módulo y configuran el suyo.
+    # make_decision se llama en cada request de Unity: sus mensajes repetidos se limitan por segundo
+    setup_logging(
+        level=logging.INFO,
+        rates={'decision': 1},
+        config_file='logging_config.json'
+    )
+    drone_model = DroneModel(params)
+    drone_model.setup()
+    return drone_model
+
+def decide(model, agent_states, current_time):
+    """Decisiones de los agentes en el orden de agent_states"""
+    decisions = []
+    for idx, agent_state in enumerate(agent_states):
+        if idx < len(model.agents):
+            agent = model.agents[idx]
+            agent.update_position(agent_state['state']['position'])
+            if model.explorer:
+                model.explorer.update(agent.id, agent.position, current_time)
+            decision = agent.make_decision(current_time)
+            DECISIONS.labels(decision['decision']).inc()
+            decisions.append(decision)
+    return decisions
 
 @app.route('/get_decisions', methods=['POST'])
+@DECISION_SECONDS.time()
 def get_decisions():
     try:
         world_state = request.get_json()
-        decisions = []
-        current_time = time.time()
-        
-        for idx, agent_state in enumerate(world_state['agentStates']):
-            if idx < len(drone_model.agents):
-                agent = drone_model.agents[idx]
-                agent.update_position(agent_state['state']['position'])
-                decision = agent.make_decision(current_time)
-                decisions.append(decision)
-        
+        decisions = decide(drone_model, world_state['agentStates'], drone_model.clock())
         return jsonify({"decisions": decisions})
     
     except Exception as e:
@@ -315,6 +454,9 @@ def get_decisions():
         return jsonify({"error": str(e)}), 500
 
 if __name__ == "__main__":
+    # kill -USR1 <pid> o http://127.0.0.1:9102/profile?seconds=10 para perfilar en vivo
+    enable_profiling()
+    create_model({'n_drones': 1, 'metrics_port': 9102})  # Métricas en http://127.0.0.1:9102/metrics
     try:
         app.run(host='0.0.0.0', port=5000)
     except KeyboardInterrupt:
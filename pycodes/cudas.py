@@ -6,6 +6,7 @@ import struct
 import time
 import logging
 import torch
+from FrameDecoder import FrameDecoder
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -85,6 +86,9 @@ class AgentVisionReceiver:
         except Exception as e:
             logger.error(f"Error al configurar socket para agente {agent_id}: {e}")
             return
+        
+        # Decodificar directo a 320x240 con escalado DCT en lugar de decodificar completo y redimensionar
+        decoder = FrameDecoder(target_size=(320, 240))
             
         while self.running:
             try:
@@ -101,8 +105,7 @@ class AgentVisionReceiver:
                     continue
                 
                 img_data = data[4:]
-                nparr = np.frombuffer(img_data, np.uint8)
-                frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+                frame = decoder.decode(img_data)
                 
                 if frame is None:
                     logger.warning("Usando frame de prueba debido a error de decodificación")
@@ -110,8 +113,6 @@ class AgentVisionReceiver:
                     cv2.putText(frame, f"Agent {agent_id} - No Data", (10, 120),
                               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
                 else:
-                    # Redimensionar si es necesario
-                    frame = cv2.resize(frame, (320, 240))
                     # Procesar frame con YOLO
                     frame = self.process_frame_yolo(frame)
                     